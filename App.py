@@ -1,14 +1,78 @@
+from __future__ import annotations  # keeps pd/np annotations from importing them early
+
+import time
+SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
 import sqlite3
-import pandas as pd
 import datetime
-import requests
-from streamlit_lottie import st_lottie
-import plotly.express as px
-import plotly.graph_objects as go
 from io import BytesIO
-import numpy as np
 import streamlit.components.v1 as components
+import importlib
+import importlib.util
+import os
+import queue
+import sys
+import threading
+import json
+import re
+import gzip
+import socket
+import uuid
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager, suppress
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# -----------------------------------------------------------
+# Lazy Imports
+# -----------------------------------------------------------
+# Heavy libraries are imported on first attribute access, so a cold start on
+# a page that never charts (Settings, Add Tickets) does not pay for them.
+# Each first import is timed and attributed to the page that triggered it.
+@st.cache_resource
+def get_startup_report():
+    return {"imports": {}, "pages": {}, "lock": threading.Lock()}
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            name = self.__dict__["_name"]
+            already_loaded = name in sys.modules
+            started = time.perf_counter()
+            module = importlib.import_module(name)
+            if not already_loaded:
+                report = get_startup_report()
+                with report["lock"]:
+                    report["imports"].setdefault(name, {
+                        "seconds": time.perf_counter() - started,
+                        "page": st.session_state.get("active_page", "(startup)"),
+                    })
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
+pio = LazyModule("plotly.io")
+requests = LazyModule("requests")
+streamlit_lottie = LazyModule("streamlit_lottie")
+# Optional columnar analytics backend; only probed here, imported on first query
+duckdb = LazyModule("duckdb") if importlib.util.find_spec("duckdb") else None
+
+def st_lottie(*args, **kwargs):
+    return streamlit_lottie.st_lottie(*args, **kwargs)
 
 # -----------------------------------------------------------
 # Configuration
@@ -41,17 +105,17 @@ STATUS_LABELS = {
     "Cancelled": "Cancelled"
 }
 
+# Reverse lookup so UI label -> DB status is a dict hit instead of a scan
+STATUS_FROM_LABEL = {label: db_val for db_val, label in STATUS_LABELS.items()}
+
 def display_status(status_in_db: str) -> str:
     """Convert a DB status into a user-facing label."""
     return STATUS_LABELS.get(status_in_db, status_in_db)
 
 def get_db_status_from_display(ui_label: str) -> str:
     """Given the user-facing label, return the DB status key."""
-    for db_val, label in STATUS_LABELS.items():
-        if label == ui_label:
-            return db_val
     # Fallback: if not found in dictionary
-    return ui_label
+    return STATUS_FROM_LABEL.get(ui_label, ui_label)
 
 # -----------------------------------------------------------
 # Session State Initialization
@@ -66,6 +130,15 @@ if "dark_mode" not in st.session_state:
     st.session_state.dark_mode = False
 if "active_page" not in st.session_state:
     st.session_state.active_page = "Dashboard"  # default page
+if "analytics_backend" not in st.session_state:
+    st.session_state.analytics_backend = "Auto"  # "Auto" uses DuckDB when installed
+if "dashboard_cache" not in st.session_state:
+    st.session_state.dashboard_cache = {}  # last drawn dashboard data, see dashboard_changes()
+if "scan_session" not in st.session_state:
+    st.session_state.scan_session = None  # rapid scan buffer, see new_scan_session()
+if "profiling" not in st.session_state:
+    # ?profile=1 turns it on for a session; Settings > System toggles it too
+    st.session_state.profiling = st.query_params.get("profile", "").lower() in ("1", "true", "on")
 
 # -----------------------------------------------------------
 # Styling (Basic CSS to hide branding and set background)
@@ -100,6 +173,7 @@ load_css()
 # -----------------------------------------------------------
 # Lottie Animations
 # -----------------------------------------------------------
+@st.cache_data(show_spinner=False)
 def load_lottieurl(url: str):
     try:
         r = requests.get(url)
@@ -109,24 +183,794 @@ def load_lottieurl(url: str):
     except:
         return None
 
-animations = {
-    "tickets": load_lottieurl("https://assets9.lottiefiles.com/packages/lf20_mjlh3hcy.json"),
-    "dashboard": load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_qp1q7mct.json"),
-    "success": load_lottieurl("https://assets6.lottiefiles.com/packages/lf20_vi8cufn8.json"),
-    "money": load_lottieurl("https://assets7.lottiefiles.com/packages/lf20_SzPMKj.json"),
-    "settings": load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_ukrsqhcj.json")
+LOTTIE_URLS = {
+    "tickets": "https://assets9.lottiefiles.com/packages/lf20_mjlh3hcy.json",
+    "dashboard": "https://assets5.lottiefiles.com/packages/lf20_qp1q7mct.json",
+    "success": "https://assets6.lottiefiles.com/packages/lf20_vi8cufn8.json",
+    "money": "https://assets7.lottiefiles.com/packages/lf20_SzPMKj.json",
+    "settings": "https://assets5.lottiefiles.com/packages/lf20_ukrsqhcj.json"
 }
 
+class LazyAnimations(dict):
+    """Fetch an animation the first time a page asks for it instead of all of them on every run."""
+    def __missing__(self, name):
+        self[name] = load_lottieurl(LOTTIE_URLS[name])
+        return self[name]
+
+animations = LazyAnimations()
+
+# -----------------------------------------------------------
+# Schema Migrations (tracked with PRAGMA user_version)
+# -----------------------------------------------------------
+def migrate_status_codes(cur):
+    """Move status onto a small integer dimension (statuses.code -> tickets.status_code)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS statuses (
+        code INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        label TEXT NOT NULL
+    )
+    """)
+    cur.executemany(
+        "INSERT OR IGNORE INTO statuses (code, name, label) VALUES (?, ?, ?)",
+        [(i + 1, s, display_status(s)) for i, s in enumerate(AVAILABLE_STATUSES)]
+    )
+    # Statuses written by hand (Custom SQL, Excel restores) get their own codes
+    cur.execute("""
+    INSERT OR IGNORE INTO statuses (name, label)
+    SELECT DISTINCT status, status FROM tickets WHERE status IS NOT NULL
+    """)
+    cur.execute("ALTER TABLE tickets ADD COLUMN status_code INTEGER")
+    cur.execute("UPDATE tickets SET status_code = (SELECT code FROM statuses WHERE name = tickets.status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status_code ON tickets(status_code)")
+    # The text column stays writable for Custom SQL and Excel restores; these
+    # triggers keep the integer code in step with it on every insert/update.
+    for event in ("INSERT", "UPDATE OF status"):
+        name = "tickets_status_code_ai" if event == "INSERT" else "tickets_status_code_au"
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON tickets
+        BEGIN
+            INSERT OR IGNORE INTO statuses (name, label)
+            SELECT NEW.status, NEW.status WHERE NEW.status IS NOT NULL;
+            UPDATE tickets SET status_code = (SELECT code FROM statuses WHERE name = NEW.status)
+            WHERE id = NEW.id;
+        END
+        """)
+
+def migrate_epoch_timestamps(cur):
+    """Add indexed integer epoch created_at/updated_at columns backfilled from date/time."""
+    cur.execute("ALTER TABLE tickets ADD COLUMN created_at INTEGER")
+    cur.execute("ALTER TABLE tickets ADD COLUMN updated_at INTEGER")
+    # date/time are local wall-clock strings; 'utc' converts them to true epoch seconds
+    cur.execute("""
+    UPDATE tickets
+    SET created_at = CAST(strftime('%s', date || ' ' || COALESCE(time, '00:00:00'), 'utc') AS INTEGER)
+    """)
+    cur.execute("UPDATE tickets SET created_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE created_at IS NULL")
+    cur.execute("UPDATE tickets SET updated_at = created_at")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at)")
+    # Status views read "newest first within a status", so index that order directly
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status_code, created_at)")
+    cur.execute("DROP INDEX IF EXISTS idx_tickets_status_code")
+    # Rows inserted without timestamps (Custom SQL, Excel restores) derive them from date/time
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tickets_created_at_ai AFTER INSERT ON tickets
+    WHEN NEW.created_at IS NULL
+    BEGIN
+        UPDATE tickets
+        SET created_at = COALESCE(
+                CAST(strftime('%s', NEW.date || ' ' || COALESCE(NEW.time, '00:00:00'), 'utc') AS INTEGER),
+                CAST(strftime('%s', 'now') AS INTEGER)),
+            updated_at = COALESCE(NEW.updated_at, CAST(strftime('%s', 'now') AS INTEGER))
+        WHERE id = NEW.id;
+    END
+    """)
+    # Any update that does not set updated_at itself gets stamped here
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tickets_updated_at_au AFTER UPDATE ON tickets
+    WHEN NEW.updated_at IS OLD.updated_at
+    BEGIN
+        UPDATE tickets SET updated_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE id = NEW.id;
+    END
+    """)
+
+FTS_COLUMNS = ["ticket_number", "comments", "ticket_school", "ticket_day"]
+
+def migrate_ticket_search(cur):
+    """Add an external-content FTS5 index over ticket text columns, synced by triggers."""
+    columns = ", ".join(FTS_COLUMNS)
+    try:
+        # Trigram tokens match any 3+ character substring, so "5633" finds "125633"
+        cur.execute(f"""
+        CREATE VIRTUAL TABLE tickets_fts USING fts5(
+            {columns}, content='tickets', content_rowid='id', tokenize='trigram'
+        )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite < 3.34 has no trigram tokenizer; fall back to word prefixes
+        cur.execute(f"""
+        CREATE VIRTUAL TABLE tickets_fts USING fts5(
+            {columns}, content='tickets', content_rowid='id', prefix='1 2 3'
+        )
+        """)
+    new_values = ", ".join(f"NEW.{c}" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"OLD.{c}" for c in FTS_COLUMNS)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF {columns} ON tickets BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+        INSERT INTO tickets_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+    END
+    """)
+    cur.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+
+# Upper bounds (seconds) of the cycle-time histogram buckets; the last one is a catch-all
+CYCLE_TIME_BUCKETS = [
+    60, 300, 900, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 5 * 86400, 7 * 86400, 14 * 86400,
+    30 * 86400, 60 * 86400, 90 * 86400, 180 * 86400, 365 * 86400, 730 * 86400,
+    100 * 365 * 86400,
+]
+# from_code used for "time since the ticket was created" (lead time) histograms
+LEAD_TIME_FROM_CODE = 0
+
+def migrate_ticket_events(cur):
+    """Add the append-only status transition log and incremental cycle-time histograms."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id INTEGER NOT NULL,
+        ticket_number TEXT,
+        batch_name TEXT,
+        from_code INTEGER,          -- NULL: ticket created
+        to_code INTEGER,            -- NULL: ticket deleted
+        at INTEGER NOT NULL,        -- epoch seconds
+        stage_seconds INTEGER,      -- time spent in from_code
+        lead_seconds INTEGER        -- time since the ticket was created
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket ON ticket_events(ticket_id, at)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS cycle_time_buckets (
+        bucket INTEGER PRIMARY KEY,
+        upper_seconds INTEGER NOT NULL
+    )
+    """)
+    cur.executemany("INSERT OR IGNORE INTO cycle_time_buckets (bucket, upper_seconds) VALUES (?, ?)",
+                    list(enumerate(CYCLE_TIME_BUCKETS)))
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS cycle_time_hist (
+        scope TEXT NOT NULL,        -- 'all', 'batch' or 'day'
+        scope_key TEXT NOT NULL,
+        from_code INTEGER NOT NULL,
+        to_code INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (scope, scope_key, from_code, to_code, bucket)
+    ) WITHOUT ROWID
+    """)
+    # Existing tickets have no history; record their creation so later moves have a start
+    cur.execute("""
+    INSERT INTO ticket_events (ticket_id, ticket_number, batch_name, from_code, to_code, at)
+    SELECT id, ticket_number, batch_name, NULL, status_code, created_at FROM tickets
+    """)
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_events_ai AFTER INSERT ON tickets
+    WHEN NEW.status_code IS NOT NULL
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, ticket_number, batch_name, from_code, to_code, at)
+        VALUES (NEW.id, NEW.ticket_number, NEW.batch_name, NULL, NEW.status_code, COALESCE(NEW.created_at, {now}));
+    END
+    """)
+    # Fires for real transitions and for the status_code fill-in right after an insert
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_events_au AFTER UPDATE OF status_code ON tickets
+    WHEN OLD.status_code IS NOT NEW.status_code
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, ticket_number, batch_name, from_code, to_code, at,
+                                   stage_seconds, lead_seconds)
+        SELECT NEW.id, NEW.ticket_number, NEW.batch_name, OLD.status_code, NEW.status_code, {now},
+               CASE WHEN OLD.status_code IS NULL THEN NULL
+                    ELSE {now} - COALESCE((SELECT MAX(at) FROM ticket_events WHERE ticket_id = NEW.id), NEW.created_at, {now})
+               END,
+               CASE WHEN OLD.status_code IS NULL THEN NULL ELSE {now} - COALESCE(NEW.created_at, {now}) END;
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_events_ad AFTER DELETE ON tickets
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, ticket_number, batch_name, from_code, to_code, at)
+        VALUES (OLD.id, OLD.ticket_number, OLD.batch_name, OLD.status_code, NULL, {now});
+    END
+    """)
+    # Every transition bumps one bucket per (scope, metric), so percentiles never scan events
+    upserts = []
+    for scope, scope_key in (("all", "''"),
+                             ("batch", "COALESCE(NEW.batch_name, '')"),
+                             ("day", "date(NEW.at, 'unixepoch', 'localtime')")):
+        for from_code, seconds in (("NEW.from_code", "NEW.stage_seconds"),
+                                   (str(LEAD_TIME_FROM_CODE), "NEW.lead_seconds")):
+            upserts.append(f"""
+        INSERT INTO cycle_time_hist (scope, scope_key, from_code, to_code, bucket, n)
+        VALUES ('{scope}', {scope_key}, {from_code}, NEW.to_code,
+                (SELECT MIN(bucket) FROM cycle_time_buckets WHERE upper_seconds >= MAX({seconds}, 0)), 1)
+        ON CONFLICT (scope, scope_key, from_code, to_code, bucket) DO UPDATE SET n = n + 1;""")
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS ticket_events_hist_ai AFTER INSERT ON ticket_events
+    WHEN NEW.from_code IS NOT NULL AND NEW.to_code IS NOT NULL
+    BEGIN{"".join(upserts)}
+    END
+    """)
+
+def migrate_archive_catalog(cur):
+    """Track per-year archive files and keep archiving out of the deletion event log."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS archive_files (
+        year INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        min_created_at INTEGER,
+        max_created_at INTEGER,
+        row_count INTEGER DEFAULT 0
+    )
+    """)
+    # Rows present here change trigger behaviour for the writing transaction only
+    cur.execute("CREATE TABLE IF NOT EXISTS maintenance_flags (name TEXT PRIMARY KEY)")
+    cur.execute("DROP TRIGGER IF EXISTS tickets_events_ad")
+    cur.execute("""
+    CREATE TRIGGER tickets_events_ad AFTER DELETE ON tickets
+    WHEN NOT EXISTS (SELECT 1 FROM maintenance_flags WHERE name = 'archiving')
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, ticket_number, batch_name, from_code, to_code, at)
+        VALUES (OLD.id, OLD.ticket_number, OLD.batch_name, OLD.status_code, NULL, CAST(strftime('%s', 'now') AS INTEGER));
+    END
+    """)
+
+def migrate_jobs(cur):
+    """Persist background jobs so their outcome outlives the session that started them."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        description TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress REAL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        cancel_requested INTEGER DEFAULT 0,
+        created_at INTEGER,
+        started_at INTEGER,
+        finished_at INTEGER
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)")
+
+def migrate_incremental_vacuum(cur):
+    """
+    Switch the file to incremental auto-vacuum so deleted pages can be handed
+    back to the OS. The new mode only takes effect after a full VACUUM, which
+    cannot run inside this transaction, so finish_vacuum_switch() does it.
+    """
+    cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('vacuum_pending')")
+
+def migrate_change_tracking(cur):
+    """Index the timestamps the live dashboard uses to find what changed since its last look."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_updated_at ON tickets(updated_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ticket_events_at ON ticket_events(at)")
+
+def migrate_batch_lookup(cur):
+    """Index batch names (with recency) for prefix search and per-batch reads."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_batch_created ON tickets(batch_name, created_at)")
+
+def ledger_amount_sql(row: str) -> str:
+    """A ticket's value in integer cents, so running balances never drift."""
+    return f"CAST(ROUND(COALESCE({row}.num_sub_tickets, 0) * COALESCE({row}.pay, 0) * 100) AS INTEGER)"
+
+def posting_date_sql(row: str) -> str:
+    """The local day a ticket is booked under, even for rows written without a date."""
+    return f"substr(COALESCE({row}.date, date({row}.created_at, 'unixepoch', 'localtime'), date('now', 'localtime')), 1, 10)"
+
+def ledger_posting_sql(row: str, sign: str, delivered: int, earned_guard: str = "") -> str:
+    """
+    Trigger body that adds (sign '+') or removes (sign '-') one ticket's
+    ledger entries. earned_guard is an extra condition on the earned side.
+    """
+    amount = ledger_amount_sql(row)
+    day = posting_date_sql(row)
+    earned_when = f"{row}.status_code = {delivered}" + (f" AND {earned_guard}" if earned_guard else "")
+    return f"""
+        UPDATE ledger_balance SET pending_cents = pending_cents {sign} {amount}
+        WHERE id = 1 AND {row}.status_code != {delivered};
+        UPDATE ledger_balance SET earned_cents = earned_cents {sign} {amount}
+        WHERE id = 1 AND {earned_when};
+        INSERT INTO ledger_daily (date, earned_cents, sub_tickets)
+        SELECT {day}, {sign}{amount}, {sign}COALESCE({row}.num_sub_tickets, 0)
+        WHERE {earned_when}
+        ON CONFLICT (date) DO UPDATE SET earned_cents = earned_cents + excluded.earned_cents,
+                                         sub_tickets = sub_tickets + excluded.sub_tickets;"""
+
+def close_ledger_periods(cur):
+    """Snapshot every finished month that has no closed period yet; returns how many were closed."""
+    month_start = datetime.date.today().replace(day=1).isoformat()
+    cur.execute("""
+        INSERT OR IGNORE INTO ledger_periods (month, earned_cents, sub_tickets, closed_at)
+        SELECT substr(date, 1, 7), SUM(earned_cents), SUM(sub_tickets), CAST(strftime('%s', 'now') AS INTEGER)
+        FROM ledger_daily
+        WHERE date < ?
+        GROUP BY 1
+    """, (month_start,))
+    return cur.rowcount
+
+def migrate_ledger(cur):
+    """
+    Keep income as a ledger instead of re-summing tickets: a running
+    pending/earned balance, earned totals per ticket date, and immutable
+    snapshots of closed months. Triggers post every insert, delete and
+    status/price/quantity change. Archived tickets stay earned; ATTACH
+    cannot run in this transaction, so finish_ledger_backfill() adds them.
+    """
+    delivered = cur.execute("SELECT code FROM statuses WHERE name = 'Delivered'").fetchone()[0]
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_balance (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        earned_cents INTEGER NOT NULL DEFAULT 0,
+        pending_cents INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_daily (
+        date TEXT PRIMARY KEY,
+        earned_cents INTEGER NOT NULL DEFAULT 0,
+        sub_tickets INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_periods (
+        month TEXT PRIMARY KEY,
+        earned_cents INTEGER NOT NULL,
+        sub_tickets INTEGER NOT NULL,
+        closed_at INTEGER NOT NULL
+    )
+    """)
+    for action in ("UPDATE", "DELETE"):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ledger_periods_no_{action.lower()} BEFORE {action} ON ledger_periods
+        BEGIN
+            SELECT RAISE(ABORT, 'closed ledger periods are immutable');
+        END
+        """)
+
+    amount = ledger_amount_sql("tickets")
+    cur.execute(f"""
+        INSERT OR REPLACE INTO ledger_balance (id, earned_cents, pending_cents)
+        SELECT 1,
+               COALESCE(SUM(CASE WHEN status_code = {delivered} THEN {amount} END), 0),
+               COALESCE(SUM(CASE WHEN status_code != {delivered} THEN {amount} END), 0)
+        FROM tickets
+    """)
+    cur.execute(f"""
+        INSERT INTO ledger_daily (date, earned_cents, sub_tickets)
+        SELECT substr(COALESCE(date, date(created_at, 'unixepoch', 'localtime')), 1, 10),
+               SUM({amount}), SUM(COALESCE(num_sub_tickets, 0))
+        FROM tickets
+        WHERE status_code = {delivered}
+        GROUP BY 1
+        ON CONFLICT (date) DO UPDATE SET earned_cents = earned_cents + excluded.earned_cents,
+                                         sub_tickets = sub_tickets + excluded.sub_tickets
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_ledger_ai AFTER INSERT ON tickets
+    BEGIN{ledger_posting_sql("NEW", "+", delivered)}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_ledger_au AFTER UPDATE OF status_code, num_sub_tickets, pay, date ON tickets
+    WHEN OLD.status_code IS NOT NEW.status_code OR OLD.num_sub_tickets IS NOT NEW.num_sub_tickets
+         OR OLD.pay IS NOT NEW.pay OR OLD.date IS NOT NEW.date
+    BEGIN{ledger_posting_sql("OLD", "-", delivered)}{ledger_posting_sql("NEW", "+", delivered)}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_ledger_ad AFTER DELETE ON tickets
+    -- Archiving takes a ticket out of pending but keeps what it earned on the books
+    BEGIN{ledger_posting_sql("OLD", "-", delivered,
+                             earned_guard="NOT EXISTS (SELECT 1 FROM maintenance_flags WHERE name = 'archiving')")}
+    END
+    """)
+    if cur.execute("SELECT 1 FROM archive_files LIMIT 1").fetchone():
+        # Months are closed once the archived earnings are in
+        cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('ledger_archive_backfill')")
+    else:
+        close_ledger_periods(cur)
+
+def migrate_change_feed(cur):
+    """
+    Give every row a version for multi-station sync: updated_at plus the
+    station that wrote it (origin), and local_changed_at for when this copy
+    last changed so merged rows are passed on by the next export. Deletes
+    and renumbers leave tombstones. Writes made while the 'syncing' flag is
+    set keep the versions the import supplies.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sync_station (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        station TEXT NOT NULL,
+        exported_until INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("INSERT OR IGNORE INTO sync_station (id, station) VALUES (1, ?)",
+                (f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}",))
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        station TEXT PRIMARY KEY,
+        imported_until INTEGER,
+        imported_at INTEGER,
+        rows_applied INTEGER DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_tombstones (
+        ticket_number TEXT PRIMARY KEY,
+        deleted_at INTEGER NOT NULL,
+        origin TEXT NOT NULL,
+        local_changed_at INTEGER NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_changed ON ticket_tombstones(local_changed_at)")
+    cur.execute("ALTER TABLE tickets ADD COLUMN origin TEXT")
+    cur.execute("ALTER TABLE tickets ADD COLUMN local_changed_at INTEGER")
+    # Drop the stamping trigger first, or the backfill would mark every row as updated now
+    cur.execute("DROP TRIGGER IF EXISTS tickets_updated_at_au")
+    cur.execute("UPDATE tickets SET origin = (SELECT station FROM sync_station), local_changed_at = updated_at")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_local_changed ON tickets(local_changed_at)")
+
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    station = "(SELECT station FROM sync_station WHERE id = 1)"
+    not_syncing = "NOT EXISTS (SELECT 1 FROM maintenance_flags WHERE name = 'syncing')"
+    cur.execute(f"""
+    CREATE TRIGGER tickets_updated_at_au AFTER UPDATE ON tickets
+    WHEN NEW.updated_at IS OLD.updated_at AND {not_syncing}
+    BEGIN
+        UPDATE tickets SET updated_at = {now}, origin = {station}, local_changed_at = {now} WHERE id = NEW.id;
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_sync_ai AFTER INSERT ON tickets
+    BEGIN
+        DELETE FROM ticket_tombstones WHERE ticket_number = NEW.ticket_number;
+        UPDATE tickets SET origin = {station}, local_changed_at = {now}
+        WHERE id = NEW.id AND {not_syncing};
+    END
+    """)
+    tombstone = f"""
+        INSERT OR REPLACE INTO ticket_tombstones (ticket_number, deleted_at, origin, local_changed_at)
+        VALUES (OLD.ticket_number, {now}, {station}, {now});"""
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_sync_ad AFTER DELETE ON tickets
+    WHEN OLD.ticket_number IS NOT NULL AND {not_syncing}
+         AND NOT EXISTS (SELECT 1 FROM maintenance_flags WHERE name = 'archiving')
+    BEGIN{tombstone}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_sync_renumber_au AFTER UPDATE OF ticket_number ON tickets
+    WHEN OLD.ticket_number IS NOT NULL AND OLD.ticket_number IS NOT NEW.ticket_number AND {not_syncing}
+    BEGIN{tombstone}
+    END
+    """)
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def school_posting_sql(row: str, sign: str, delivered: int) -> str:
+    """Trigger body that adds (sign '+') or removes (sign '-') one ticket from school_daily."""
+    amount = ledger_amount_sql(row)
+    subs = f"COALESCE({row}.num_sub_tickets, 0)"
+    return f"""
+        INSERT INTO school_daily (school, date, tickets, sub_tickets, delivered_sub_tickets, earned_cents)
+        VALUES (COALESCE({row}.ticket_school, ''), {posting_date_sql(row)}, {sign}1, {sign}{subs},
+                {sign}CASE WHEN {row}.status_code = {delivered} THEN {subs} ELSE 0 END,
+                {sign}CASE WHEN {row}.status_code = {delivered} THEN {amount} ELSE 0 END)
+        ON CONFLICT (school, date) DO UPDATE SET
+            tickets = tickets + excluded.tickets,
+            sub_tickets = sub_tickets + excluded.sub_tickets,
+            delivered_sub_tickets = delivered_sub_tickets + excluded.delivered_sub_tickets,
+            earned_cents = earned_cents + excluded.earned_cents;"""
+
+def migrate_school_breakdown(cur):
+    """
+    Per-school, per-day totals kept by triggers (archived tickets stay
+    counted; finish_school_backfill() adds the ones archived before this
+    migration), a table for the generated school report, and the weekday
+    of every existing ticket in ticket_day.
+    """
+    delivered = cur.execute("SELECT code FROM statuses WHERE name = 'Delivered'").fetchone()[0]
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS school_daily (
+        school TEXT NOT NULL,
+        date TEXT NOT NULL,
+        tickets INTEGER NOT NULL DEFAULT 0,
+        sub_tickets INTEGER NOT NULL DEFAULT 0,
+        delivered_sub_tickets INTEGER NOT NULL DEFAULT 0,
+        earned_cents INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (school, date)
+    ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_school_daily_date ON school_daily(date)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS school_report (
+        school TEXT PRIMARY KEY,
+        tickets INTEGER,
+        sub_tickets INTEGER,
+        delivered_sub_tickets INTEGER,
+        delivery_rate REAL,
+        income REAL,
+        weekly_trend REAL,
+        first_date TEXT,
+        last_date TEXT,
+        generated_at INTEGER
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_school_created ON tickets(ticket_school, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_day ON tickets(ticket_day)")
+
+    # strftime('%w') counts from Sunday = 0
+    weekday = " ".join(f"WHEN '{n}' THEN '{WEEKDAYS[(n + 6) % 7]}'" for n in range(7))
+    # Derived data, not an edit: keep updated_at/origin as they are
+    cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('syncing')")
+    cur.execute(f"""
+        UPDATE tickets SET ticket_day = CASE strftime('%w', date) {weekday} END
+        WHERE ticket_day IS NULL AND date IS NOT NULL
+    """)
+    cur.execute("DELETE FROM maintenance_flags WHERE name = 'syncing'")
+
+    amount = ledger_amount_sql("tickets")
+    cur.execute(f"""
+        INSERT INTO school_daily (school, date, tickets, sub_tickets, delivered_sub_tickets, earned_cents)
+        SELECT COALESCE(ticket_school, ''),
+               substr(COALESCE(date, date(created_at, 'unixepoch', 'localtime')), 1, 10),
+               COUNT(*), SUM(COALESCE(num_sub_tickets, 0)),
+               SUM(CASE WHEN status_code = {delivered} THEN COALESCE(num_sub_tickets, 0) ELSE 0 END),
+               SUM(CASE WHEN status_code = {delivered} THEN {amount} ELSE 0 END)
+        FROM tickets
+        GROUP BY 1, 2
+        ON CONFLICT (school, date) DO NOTHING
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_school_ai AFTER INSERT ON tickets
+    BEGIN{school_posting_sql("NEW", "+", delivered)}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_school_au
+    AFTER UPDATE OF ticket_school, date, status_code, num_sub_tickets, pay ON tickets
+    WHEN OLD.ticket_school IS NOT NEW.ticket_school OR OLD.date IS NOT NEW.date
+         OR OLD.status_code IS NOT NEW.status_code OR OLD.num_sub_tickets IS NOT NEW.num_sub_tickets
+         OR OLD.pay IS NOT NEW.pay
+    BEGIN{school_posting_sql("OLD", "-", delivered)}{school_posting_sql("NEW", "+", delivered)}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tickets_school_ad AFTER DELETE ON tickets
+    WHEN NOT EXISTS (SELECT 1 FROM maintenance_flags WHERE name = 'archiving')
+    BEGIN{school_posting_sql("OLD", "-", delivered)}
+    END
+    """)
+
+def migrate_archive_sync_columns(cur):
+    """Archive files predate origin/local_changed_at; finish_archive_columns adds them (it needs ATTACH)."""
+    if cur.execute("SELECT 1 FROM archive_files LIMIT 1").fetchone():
+        cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('archive_columns_upgrade')")
+
+def migrate_job_owners(cur):
+    """Record which runner owns a job and when it last checked in, so only orphaned jobs are failed."""
+    cur.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+    cur.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at INTEGER")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+def migrate_school_archive_backfill(cur):
+    """Archived tickets are missing from school_daily; finish_school_backfill rebuilds it (it needs ATTACH)."""
+    if cur.execute("SELECT 1 FROM archive_files LIMIT 1").fetchone():
+        cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('school_archive_backfill')")
+
+def migrate_station_file(cur):
+    """Remember which database file the station id was issued to; claim_station() fills it in."""
+    cur.execute("ALTER TABLE sync_station ADD COLUMN file_id TEXT")
+
+# Append new migrations to the end; never reorder or edit shipped ones.
+MIGRATIONS = [
+    migrate_status_codes,
+    migrate_epoch_timestamps,
+    migrate_ticket_search,
+    migrate_ticket_events,
+    migrate_archive_catalog,
+    migrate_jobs,
+    migrate_incremental_vacuum,
+    migrate_change_tracking,
+    migrate_batch_lookup,
+    migrate_ledger,
+    migrate_change_feed,
+    migrate_school_breakdown,
+    migrate_archive_sync_columns,
+    migrate_job_owners,
+    migrate_school_archive_backfill,
+    migrate_station_file,
+]
+
+def apply_migrations(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock in case another process migrated first
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def finish_vacuum_switch(conn):
+    """Run the one-off VACUUM that migrate_incremental_vacuum scheduled."""
+    if conn.execute("SELECT 1 FROM maintenance_flags WHERE name = 'vacuum_pending'").fetchone() is None:
+        return
+    conn.commit()  # VACUUM refuses to run inside a transaction
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("DELETE FROM maintenance_flags WHERE name = 'vacuum_pending'")
+    conn.commit()
+
+def finish_ledger_backfill(conn):
+    """Post archived delivered tickets to the ledger, which migrate_ledger could not ATTACH."""
+    if conn.execute("SELECT 1 FROM maintenance_flags WHERE name = 'ledger_archive_backfill'").fetchone() is None:
+        return
+    delivered = conn.execute("SELECT code FROM statuses WHERE name = 'Delivered'").fetchone()[0]
+    archives = [path for (path,) in conn.execute("SELECT path FROM archive_files ORDER BY year")
+                if os.path.exists(path)]
+    amount = ledger_amount_sql("t")
+    conn.commit()  # ATTACH refuses to run inside a transaction
+    aliases = []
+    try:
+        for path in archives:
+            aliases.append(f"ledger_source_{len(aliases)}")
+            conn.execute(f"ATTACH DATABASE ? AS {aliases[-1]}", (path,))
+        # One transaction for every archive, so an interrupted backfill can simply rerun
+        with conn:
+            for alias in aliases:
+                conn.execute(f"""
+                    INSERT INTO ledger_daily (date, earned_cents, sub_tickets)
+                    SELECT substr(COALESCE(t.date, date(t.created_at, 'unixepoch', 'localtime')), 1, 10),
+                           SUM({amount}), SUM(COALESCE(t.num_sub_tickets, 0))
+                    FROM {alias}.tickets t
+                    WHERE t.status_code = {delivered}
+                    GROUP BY 1
+                    ON CONFLICT (date) DO UPDATE SET earned_cents = earned_cents + excluded.earned_cents,
+                                                     sub_tickets = sub_tickets + excluded.sub_tickets
+                """)
+                conn.execute(f"""
+                    UPDATE ledger_balance SET earned_cents = earned_cents + (
+                        SELECT COALESCE(SUM({amount}), 0) FROM {alias}.tickets t WHERE t.status_code = {delivered})
+                    WHERE id = 1
+                """)
+            close_ledger_periods(conn.cursor())
+            conn.execute("DELETE FROM maintenance_flags WHERE name = 'ledger_archive_backfill'")
+    finally:
+        for alias in aliases:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+def add_missing_archive_columns(cur, schema: str):
+    """Give {schema}.tickets every column the hot tickets table has gained since it was created."""
+    present = {row[1] for row in cur.execute(f"PRAGMA {schema}.table_info(tickets)")}
+    for _, name, column_type, *_ in cur.execute("PRAGMA main.table_info(tickets)").fetchall():
+        if name not in present:
+            cur.execute(f"ALTER TABLE {schema}.tickets ADD COLUMN {name} {column_type}")
+
+def finish_archive_columns(conn):
+    """Bring every archive file up to the hot table's columns, which migrations could not ATTACH for."""
+    if conn.execute("SELECT 1 FROM maintenance_flags WHERE name = 'archive_columns_upgrade'").fetchone() is None:
+        return
+    archives = [path for (path,) in conn.execute("SELECT path FROM archive_files ORDER BY year")
+                if os.path.exists(path)]
+    conn.commit()  # ATTACH refuses to run inside a transaction
+    for path in archives:
+        conn.execute("ATTACH DATABASE ? AS archive_upgrade", (path,))
+        try:
+            with conn:
+                add_missing_archive_columns(conn.cursor(), "archive_upgrade")
+        finally:
+            conn.execute("DETACH DATABASE archive_upgrade")
+    with conn:
+        conn.execute("DELETE FROM maintenance_flags WHERE name = 'archive_columns_upgrade'")
+
+def finish_school_backfill(conn):
+    """Rebuild school_daily from the hot table and every archive, which migrate_school_breakdown could not ATTACH."""
+    if conn.execute("SELECT 1 FROM maintenance_flags WHERE name = 'school_archive_backfill'").fetchone() is None:
+        return
+    delivered = conn.execute("SELECT code FROM statuses WHERE name = 'Delivered'").fetchone()[0]
+    archives = [path for (path,) in conn.execute("SELECT path FROM archive_files ORDER BY year")
+                if os.path.exists(path)]
+    amount = ledger_amount_sql("t")
+    conn.commit()  # ATTACH refuses to run inside a transaction
+    aliases = []
+    try:
+        for path in archives:
+            aliases.append(f"school_source_{len(aliases)}")
+            conn.execute(f"ATTACH DATABASE ? AS {aliases[-1]}", (path,))
+        columns = "ticket_school, date, created_at, status_code, num_sub_tickets, pay"
+        sources = " UNION ALL ".join(f"SELECT {columns} FROM {schema}.tickets" for schema in ["main", *aliases])
+        # Rebuilt rather than added to, so tickets archived since the migration are not counted twice
+        with conn:
+            conn.execute("DELETE FROM school_daily")
+            conn.execute(f"""
+                INSERT INTO school_daily (school, date, tickets, sub_tickets, delivered_sub_tickets, earned_cents)
+                SELECT COALESCE(t.ticket_school, ''), {posting_date_sql("t")},
+                       COUNT(*), SUM(COALESCE(t.num_sub_tickets, 0)),
+                       SUM(CASE WHEN t.status_code = {delivered} THEN COALESCE(t.num_sub_tickets, 0) ELSE 0 END),
+                       SUM(CASE WHEN t.status_code = {delivered} THEN {amount} ELSE 0 END)
+                FROM ({sources}) t
+                GROUP BY 1, 2
+            """)
+            conn.execute("DELETE FROM maintenance_flags WHERE name = 'school_archive_backfill'")
+    finally:
+        for alias in aliases:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+def database_file_id(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+def claim_station(conn, path: str) -> str:
+    """
+    Give a copied or restored database its own station id. The id is tied
+    to the file it was issued to, so a copy (a new file) or a restore from
+    another station's file exports under a fresh id instead of impersonating
+    the original. Restoring this station's own backup keeps its id.
+    """
+    file_id = database_file_id(path)
+    station, owner = conn.execute("SELECT station, file_id FROM sync_station WHERE id = 1").fetchone()
+    if owner == file_id:
+        return station
+    if owner is not None:
+        station = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+    with conn:
+        # Compare-and-set, so two processes starting on the same copy agree on one id.
+        # Nothing has been exported under a new id yet, so its export starts over.
+        conn.execute("UPDATE sync_station SET station = ?, file_id = ?, "
+                     "exported_until = CASE WHEN file_id IS NULL THEN exported_until ELSE 0 END "
+                     "WHERE id = 1 AND file_id IS ?", (station, file_id, owner))
+    return conn.execute("SELECT station FROM sync_station WHERE id = 1").fetchone()[0]
+
 # -----------------------------------------------------------
 # Database Setup
 # -----------------------------------------------------------
+DB_PATH = "ticket_management.db"
+
 def get_db_connection():
-    conn = sqlite3.connect("ticket_management.db", check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # Wait for the writer thread instead of failing with "database is locked"
+    conn.execute("PRAGMA busy_timeout = 5000")
     return conn
 
 def setup_database():
     conn = get_db_connection()
     cursor = conn.cursor()
+    # WAL lets readers keep going while the writer thread commits
+    cursor.execute("PRAGMA journal_mode = WAL")
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS tickets (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -144,11 +988,1435 @@ def setup_database():
     )
     ''')
     conn.commit()
+    apply_migrations(conn)
+    finish_vacuum_switch(conn)
+    finish_ledger_backfill(conn)
+    finish_archive_columns(conn)
+    finish_school_backfill(conn)
+    claim_station(conn, DB_PATH)
     return conn
 
 conn = setup_database()
 cursor = conn.cursor()
 
+# -----------------------------------------------------------
+# Status Dimension (integer codes <-> display labels)
+# -----------------------------------------------------------
+def load_status_dimension(conn):
+    """Read the statuses table into code lookups and a Categorical code map."""
+    rows = conn.execute("SELECT code, name, label FROM statuses ORDER BY code").fetchall()
+    codes = {name: code for code, name, _ in rows}
+    # Several DB statuses may share a label, so categories are de-duplicated
+    categories = list(dict.fromkeys(label for _, _, label in rows))
+    positions = [-1] * (max(codes.values(), default=0) + 1)
+    for code, _, label in rows:
+        positions[code] = categories.index(label)
+    return codes, categories, positions
+
+STATUS_CODES, STATUS_CATEGORIES, _STATUS_POSITIONS = load_status_dimension(conn)
+
+def status_categorical(codes) -> pd.Categorical:
+    """Map a column of status codes to display labels in one vectorized step."""
+    codes = pd.to_numeric(pd.Series(codes), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    lookup = np.asarray(_STATUS_POSITIONS, dtype=np.int16)
+    in_range = (codes >= 0) & (codes < len(lookup))
+    positions = np.where(in_range, lookup[np.clip(codes, 0, len(lookup) - 1)], -1)
+    return pd.Categorical.from_codes(positions, categories=STATUS_CATEGORIES)
+
+def with_status_labels(df: pd.DataFrame) -> pd.DataFrame:
+    """Replace the status/status_code columns with a categorical display label."""
+    df["status"] = status_categorical(df["status_code"])
+    return df.drop(columns="status_code")
+
+# -----------------------------------------------------------
+# Timestamps (integer epoch seconds)
+# -----------------------------------------------------------
+def ticket_timestamp():
+    """Return (date, time, epoch) for a new ticket, all taken from a single clock read."""
+    now = datetime.datetime.now()
+    return now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), int(now.timestamp())
+
+def epoch_range(start_date: datetime.date, end_date: datetime.date):
+    """Half-open epoch range [start, end) covering whole local days start_date..end_date."""
+    start = datetime.datetime.combine(start_date, datetime.time.min)
+    end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+    return int(start.timestamp()), int(end.timestamp())
+
+# -----------------------------------------------------------
+# Time Buckets & Downsampling
+# -----------------------------------------------------------
+# SQL expression that maps the local `date` column onto the start of its bucket
+TIME_BUCKETS = {
+    "Day": "date",
+    "Week": "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    "Month": "strftime('%Y-%m-01', date)",
+}
+BUCKET_FREQ = {"Day": "D", "Week": "W-MON", "Month": "MS"}
+BUCKET_ADJECTIVE = {"Day": "Daily", "Week": "Weekly", "Month": "Monthly"}
+MAX_LINE_POINTS = 400  # line traces above this are LTTB-downsampled
+
+def pick_resolution(start_date: datetime.date, end_date: datetime.date, choice: str = "Auto") -> str:
+    """Bucket size for a date span: days up to ~3 months, weeks up to ~18 months, then months."""
+    if choice != "Auto":
+        return choice
+    span = (end_date - start_date).days
+    if span <= 92:
+        return "Day"
+    if span <= 550:
+        return "Week"
+    return "Month"
+
+def resolution_picker(key: str) -> str:
+    return st.radio("Resolution", ["Auto", "Day", "Week", "Month"], horizontal=True, key=key)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the line's shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        nxt_lo, nxt_hi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        areas = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+def downsample_line(dates: pd.Series, values: pd.Series, max_points: int = MAX_LINE_POINTS):
+    """Return (dates, values) reduced with LTTB when there are more than max_points."""
+    if len(dates) <= max_points:
+        return dates, values
+    idx = lttb_indices(pd.to_datetime(dates).astype("int64").to_numpy(), values.to_numpy(), max_points)
+    return dates.iloc[idx], values.iloc[idx]
+
+# -----------------------------------------------------------
+# Typed Ticket Loading
+# -----------------------------------------------------------
+# Pages name the columns they show instead of SELECT *, and frames come back
+# with compact dtypes rather than pandas' object/int64/float64 defaults.
+TICKET_VIEW_COLUMNS = ["date", "time", "batch_name", "ticket_number", "num_sub_tickets", "status_code", "pay"]
+CATEGORY_COLUMNS = ("batch_name", "ticket_school", "ticket_day")
+TICKET_COLUMN_CONFIG = {"date": st.column_config.DateColumn("date", format="YYYY-MM-DD")}
+
+def tune_ticket_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """int32 counts, float32 pay, datetime64 dates, category for batch/school/day and status."""
+    if "num_sub_tickets" in df.columns:
+        df["num_sub_tickets"] = pd.to_numeric(df["num_sub_tickets"], errors="coerce").fillna(0).astype(np.int32)
+    if "pay" in df.columns:
+        df["pay"] = pd.to_numeric(df["pay"], errors="coerce").astype(np.float32)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    if "status_code" in df.columns:
+        df = with_status_labels(df)
+    return df
+
+def load_tickets(columns, where: str = "1 = 1", params=(), order_by: str = None, chunksize: int = None,
+                 tuned: bool = True, connection=None):
+    """
+    Read only the given ticket columns. With chunksize, returns an iterator of
+    frames so large reads can be streamed instead of held in memory at once.
+    """
+    sql = f"SELECT {', '.join(columns)} FROM tickets WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    result = pd.read_sql(sql, connection or conn, params=list(params), chunksize=chunksize)
+    if not tuned:
+        return result
+    if chunksize is None:
+        return tune_ticket_dtypes(result)
+    return (tune_ticket_dtypes(chunk) for chunk in result)
+
+# -----------------------------------------------------------
+# Hot/Cold Archive (closed tickets in per-year SQLite files)
+# -----------------------------------------------------------
+ARCHIVE_DIR = "archive"
+ARCHIVE_COLUMNS = [
+    "id", "date", "time", "batch_name", "ticket_number", "num_sub_tickets", "status", "pay",
+    "comments", "ticket_day", "ticket_school", "status_code", "created_at", "updated_at",
+    "origin", "local_changed_at",
+]
+CLOSED_STATUSES = ["Delivered", "Cancelled"]
+
+def archive_closed_tickets(cur, older_than_days: int) -> dict:
+    """
+    Move Delivered/Cancelled tickets untouched for older_than_days into
+    archive/tickets_<year>.db (by creation year). Runs outside the writer's
+    group transaction because ATTACH is not allowed inside one.
+    """
+    cutoff = int(time.time()) - older_than_days * 86400
+    closed_codes = [STATUS_CODES[s] for s in CLOSED_STATUSES if s in STATUS_CODES]
+    code_marks = ",".join("?" * len(closed_codes))
+    eligible = f"status_code IN ({code_marks}) AND updated_at < ?"
+    years = [row[0] for row in cur.execute(
+        f"SELECT DISTINCT CAST(strftime('%Y', created_at, 'unixepoch', 'localtime') AS INTEGER) "
+        f"FROM tickets WHERE {eligible}", closed_codes + [cutoff]
+    ).fetchall()]
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    moved = {}
+    for year in years:
+        path = os.path.join(ARCHIVE_DIR, f"tickets_{year}.db")
+        start, end = epoch_range(datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+        where = f"{eligible} AND created_at >= ? AND created_at < ?"
+        params = closed_codes + [cutoff, start, end]
+        cur.execute("ATTACH DATABASE ? AS archive_target", (path,))
+        try:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS archive_target.tickets AS SELECT {columns} FROM main.tickets WHERE 0")
+            add_missing_archive_columns(cur, "archive_target")
+            # Archived rows are keyed on the (AUTOINCREMENT) id: a ticket number can be
+            # re-entered after it was archived and closed again in the same year
+            cur.execute("DROP INDEX IF EXISTS archive_target.idx_archive_ticket_number")
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS archive_target.idx_archive_id ON tickets(id)")
+            cur.execute("CREATE INDEX IF NOT EXISTS archive_target.idx_archive_ticket ON tickets(ticket_number)")
+            cur.execute("CREATE INDEX IF NOT EXISTS archive_target.idx_archive_created_at ON tickets(created_at)")
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                collisions = cur.execute(f"""
+                    SELECT COUNT(*) FROM archive_target.tickets a JOIN main.tickets t ON t.id = a.id
+                    WHERE t.id IN (SELECT id FROM main.tickets WHERE {where})
+                      AND (a.ticket_number IS NOT t.ticket_number OR a.created_at IS NOT t.created_at)
+                """, params).fetchone()[0]
+                if collisions:
+                    raise RuntimeError(f"{collisions} ticket id(s) already belong to other rows in {path}; nothing was archived")
+                # Copy-then-delete is idempotent: a re-run after a crash refreshes the copied rows,
+                # and only rows that are in the archive get deleted
+                cur.execute(f"INSERT OR REPLACE INTO archive_target.tickets ({columns}) "
+                            f"SELECT {columns} FROM main.tickets WHERE {where}", params)
+                cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('archiving')")
+                count = cur.execute(f"DELETE FROM main.tickets WHERE {where} "
+                                    "AND id IN (SELECT id FROM archive_target.tickets)", params).rowcount
+                cur.execute("DELETE FROM maintenance_flags WHERE name = 'archiving'")
+                cur.execute("""
+                INSERT OR REPLACE INTO archive_files (year, path, min_created_at, max_created_at, row_count)
+                SELECT ?, ?, MIN(created_at), MAX(created_at), COUNT(*) FROM archive_target.tickets
+                """, (year, path))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        finally:
+            cur.execute("DETACH DATABASE archive_target")
+        moved[year] = count
+    return moved
+
+def tickets_source(conn, start_epoch: int, end_epoch: int) -> str:
+    """
+    Name of the relation to read for a created_at range: the hot table alone,
+    or a temp union view over it and every archive year the range reaches.
+    """
+    rows = conn.execute(
+        "SELECT year, path FROM archive_files WHERE min_created_at < ? AND max_created_at >= ? ORDER BY year",
+        (end_epoch, start_epoch)
+    ).fetchall()
+    if not rows:
+        return "tickets"
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    selects = [f"SELECT {columns} FROM main.tickets"]
+    for year, path in rows:
+        schema = f"archive_{year}"
+        if schema not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        selects.append(f"SELECT {columns} FROM {schema}.tickets")
+    view = "tickets_with_archive_" + "_".join(str(year) for year, _ in rows)
+    conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS {view} AS " + " UNION ALL ".join(selects))
+    return view
+
+# -----------------------------------------------------------
+# Ticket Search (FTS5)
+# -----------------------------------------------------------
+SEARCH_COLUMNS = "id, ticket_number, batch_name, status_code, date, ticket_school, ticket_day, comments"
+
+def fts_uses_trigram(conn) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'tickets_fts'").fetchone()
+    return bool(row) and "trigram" in row[0]
+
+FTS_TRIGRAM = fts_uses_trigram(conn)
+
+def build_fts_query(text: str, trigram: bool):
+    """Turn free text into an FTS5 MATCH expression (every term must match), or None."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    if trigram:
+        # Trigram can only match terms of 3+ characters
+        terms = [t for t in terms if len(t) >= 3]
+        return " AND ".join(f'"{t}"' for t in terms) or None
+    return " AND ".join(f'"{t}"*' for t in terms) or None
+
+def search_tickets(text: str, limit: int = 50) -> pd.DataFrame:
+    """Ranked ticket search across number, comments, school and day."""
+    text = text.strip()
+    if not text:
+        return pd.DataFrame()
+    match = build_fts_query(text, FTS_TRIGRAM)
+    if match is None:
+        # Too short for trigrams: prefix range on the unique ticket_number index
+        return pd.read_sql(
+            f"SELECT {SEARCH_COLUMNS} FROM tickets WHERE ticket_number >= ? AND ticket_number < ? "
+            "ORDER BY ticket_number LIMIT ?",
+            conn, params=(text, text + "\uffff", limit)
+        )
+    return pd.read_sql(
+        f"""
+        SELECT {", ".join("t." + c.strip() for c in SEARCH_COLUMNS.split(","))}
+        FROM tickets_fts f JOIN tickets t ON t.id = f.rowid
+        WHERE tickets_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+        """,
+        conn, params=(match, limit)
+    )
+
+# -----------------------------------------------------------
+# Write Queue (single writer thread with group commits)
+# -----------------------------------------------------------
+# Every mutation goes through one writer thread that owns its own connection.
+# Mutations that pile up while a commit is in flight are applied together and
+# committed once, so concurrent sessions stop fighting over the write lock.
+WRITE_TIMEOUT = 60  # seconds the UI waits for a queued mutation to commit
+
+class WriteQueue:
+    def __init__(self, db_path: str, max_batch: int = 256):
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        # The authorizer only sees a statement while it is prepared, so statement
+        # caching is off here to let it record the tables behind every write
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, cached_statements=0)
+        self._conn.execute("PRAGMA busy_timeout = 5000")
+        self._written = set()
+        self._commit_listeners = []
+        self._conn.set_authorizer(self._track_writes)
+        # data_version on a connection moves whenever *another* connection commits.
+        # The watch connection sees every commit; after each of ours the writer
+        # records what it saw, so any later move is somebody else's commit.
+        self._watch = sqlite3.connect(db_path, check_same_thread=False)
+        self._watch_lock = threading.Lock()
+        self._watch_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        self._own_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._external_generation = 0
+        self._metrics_lock = threading.Lock()
+        self._commit_latencies = deque(maxlen=500)
+        self._wait_latencies = deque(maxlen=500)
+        self._batch_sizes = deque(maxlen=500)
+        self.total_commits = 0
+        self.total_mutations = 0
+        self.total_failures = 0
+        self.listener_failures = 0
+        # Bumped after every commit that changed rows; readers key caches on it
+        self.data_version = 0
+        self._thread = threading.Thread(target=self._run, name="ticket-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, transactional: bool = True) -> Future:
+        """
+        Queue fn(cursor) for the writer thread and return a Future holding its
+        result once the group commit it belongs to has landed. Non-transactional
+        mutations (e.g. a backup restore) run on their own between groups.
+        """
+        future = Future()
+        self._queue.put((fn, transactional, future, time.perf_counter()))
+        return future
+
+    def execute(self, sql: str, params=()) -> Future:
+        """Queue a single statement; the Future resolves to its rowcount."""
+        return self.submit(lambda cur: cur.execute(sql, params).rowcount)
+
+    def executemany(self, sql: str, seq_of_params) -> Future:
+        """Queue one statement over many parameter sets; resolves to the rowcount."""
+        seq_of_params = list(seq_of_params)
+        return self.submit(lambda cur: cur.executemany(sql, seq_of_params).rowcount)
+
+    def add_commit_listener(self, fn):
+        """
+        Call fn(cursor, tables) on the writer thread after every commit, before
+        its Futures resolve, with the tables it wrote ("main.tickets", including
+        writes made by triggers), or None when the writes can't be known
+        (non-transactional mutations). A listener that raises is followed by a
+        call to every listener with None, so each must first drop its state there.
+        """
+        self._commit_listeners.append(fn)
+
+    def _track_writes(self, action, table, column, db_name, trigger):
+        if action in (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE):
+            self._written.add(f"{db_name}.{table}")
+        return sqlite3.SQLITE_OK
+
+    def external_generation(self) -> int:
+        """
+        A counter that moves whenever another connection or process (a second
+        server, load_test.py in process mode) has committed since the last call.
+        Caches fed by the commit listeners drop everything when it moves.
+        """
+        with self._watch_lock:
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._watch_version:
+                self._watch_version = version
+                self._external_generation += 1
+            return self._external_generation
+
+    def version(self) -> tuple:
+        """
+        (data_version, external_generation()): moves after every commit that
+        changed rows, whether it came from this writer or another process.
+        """
+        return self.data_version, self.external_generation()
+
+    def _notify_commit(self, tables):
+        self._written = set()
+        cur = self._conn.cursor()
+        with self._watch_lock:
+            # Watch first, then our own connection: a foreign commit between the two
+            # reads still shows up on ours, and one after them moves the watch again
+            self._watch_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            own_version = cur.execute("PRAGMA data_version").fetchone()[0]
+            if own_version != self._own_version:
+                self._own_version = own_version
+                self._external_generation += 1
+        failed = False
+        for fn in self._commit_listeners:
+            try:
+                fn(cur, tables)
+            except Exception:
+                failed = True
+                with self._metrics_lock:
+                    self.listener_failures += 1
+        if failed and tables is not None:
+            # A listener that missed this commit is out of date; tell every one of
+            # them the writes are unknown so they drop whatever they derived
+            for fn in self._commit_listeners:
+                try:
+                    fn(cur, None)
+                except Exception:
+                    pass
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            commit_ms = np.array(self._commit_latencies) * 1000
+            wait_ms = np.array(self._wait_latencies) * 1000
+            batch_sizes = list(self._batch_sizes)
+            totals = (self.total_commits, self.total_mutations, self.total_failures, self.listener_failures)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "commits": totals[0],
+            "mutations": totals[1],
+            "failures": totals[2],
+            "listener_failures": totals[3],
+            "avg_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+            "commit_ms_p50": float(np.percentile(commit_ms, 50)) if commit_ms.size else 0.0,
+            "commit_ms_p95": float(np.percentile(commit_ms, 95)) if commit_ms.size else 0.0,
+            "wait_ms_p95": float(np.percentile(wait_ms, 95)) if wait_ms.size else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Coalesce everything that queued up behind the first item
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            group = []
+            for item in batch:
+                if not item[2].set_running_or_notify_cancel():
+                    continue
+                if item[1]:
+                    group.append(item)
+                else:
+                    self._commit_group(group)
+                    group = []
+                    self._run_standalone(item)
+            self._commit_group(group)
+
+    def _run_standalone(self, item):
+        fn, _, future, queued_at = item
+        started = time.perf_counter()
+        try:
+            result = fn(self._conn.cursor())
+        except Exception as e:
+            self._notify_commit(None)
+            self._record(started, [queued_at], failed=1)
+            future.set_exception(e)
+            return
+        self._notify_commit(None)
+        self._record(started, [queued_at])
+        future.set_result(result)
+
+    def _commit_group(self, group):
+        if not group:
+            return
+        started = time.perf_counter()
+        cur = self._conn.cursor()
+        outcomes = []
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for fn, _, future, _ in group:
+                # A savepoint per mutation keeps one bad mutation from sinking the group
+                cur.execute("SAVEPOINT mutation")
+                try:
+                    outcomes.append((future, fn(cur), None))
+                    cur.execute("RELEASE mutation")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO mutation")
+                    cur.execute("RELEASE mutation")
+                    outcomes.append((future, None, e))
+            cur.execute("COMMIT")
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            self._written = set()
+            self._record(started, [item[3] for item in group], failed=len(group))
+            for _, _, future, _ in group:
+                future.set_exception(e)
+            return
+        self._notify_commit(self._written)
+        self._record(started, [item[3] for item in group],
+                     failed=sum(1 for _, _, error in outcomes if error is not None))
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _record(self, started, queued_times, failed=0):
+        finished = time.perf_counter()
+        changes = self._conn.total_changes
+        with self._metrics_lock:
+            if changes != getattr(self, "_last_total_changes", 0):
+                self._last_total_changes = changes
+                self.data_version += 1
+            self.total_commits += 1
+            self.total_mutations += len(queued_times)
+            self.total_failures += failed
+            self._commit_latencies.append(finished - started)
+            self._batch_sizes.append(len(queued_times))
+            self._wait_latencies.extend(started - queued_at for queued_at in queued_times)
+
+@st.cache_resource
+def get_write_queue():
+    # Cached as a resource so every session and rerun shares one writer thread
+    return WriteQueue(DB_PATH)
+
+write_queue = get_write_queue()
+
+# -----------------------------------------------------------
+# Figure Cache (serialized Plotly JSON, shared across sessions)
+# -----------------------------------------------------------
+class FigureCache:
+    """LRU cache of Plotly figures keyed by chart type, parameters and data version."""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, chart: str, params: dict, build):
+        """
+        Return the figures for (chart, params) at the current data version,
+        calling build() only on a miss. build returns a figure, a list of
+        figures, or None when there is nothing to plot.
+        """
+        key = (chart, json.dumps(params, sort_keys=True, default=str), write_queue.version())
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if payload is None:
+            figures = build()
+            payload = json.dumps(None if figures is None else
+                                 [f.to_json() for f in (figures if isinstance(figures, list) else [figures])])
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = payload
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return figures
+        decoded = json.loads(payload)
+        if decoded is None:
+            return None
+        figures = [pio.from_json(f) for f in decoded]
+        return figures if len(figures) > 1 else figures[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+# -----------------------------------------------------------
+# Query Cache (read-through, shared across sessions)
+# -----------------------------------------------------------
+# Every write in this process goes through write_queue, which reports the
+# tables each commit touched; entries reading any of them are dropped before
+# the writer's Futures resolve, so a session never reads back stale rows.
+VOLATILE_SQL_FUNCTIONS = {"random", "randomblob", "changes", "total_changes", "last_insert_rowid",
+                          "current_date", "current_time", "current_timestamp"}
+# Date/time functions only read the clock when given no time value, or 'now'
+CLOCK_SQL_FUNCTIONS = {"date", "time", "datetime", "julianday", "unixepoch", "strftime", "timediff"}
+CLOCK_SQL_CALL = re.compile(r"'now'|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)"
+                            r"|\bstrftime\s*\(\s*'(?:[^']|'')*'\s*\)", re.IGNORECASE)
+CACHEABLE_SQL_ACTIONS = (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE)
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals so reformatted query text shares an entry."""
+    return re.sub(r"('(?:[^']|'')*')|\s+", lambda m: m.group(1) or " ", sql).strip()
+
+class QueryCache:
+    """LRU cache of read_sql results keyed by normalized SQL and parameters."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (frame, tables, nbytes)
+        self._tables_read = {}  # normalized sql -> (tables it reads or None when not cacheable, takes clock params)
+        self._generations = {}  # table -> number of commits that wrote it
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Statements are only prepared here (EXPLAIN), to learn which tables they read
+        self._analyzer = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=0)
+        self._analyzer_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.invalidations = 0
+        self._external_generation = write_queue.external_generation()
+        write_queue.add_commit_listener(lambda cur, tables: self.invalidate(tables))
+
+    def _check_external(self) -> int:
+        """Drop everything once another connection or process has committed."""
+        generation = write_queue.external_generation()
+        if generation != self._external_generation:
+            self._external_generation = generation
+            self.invalidate(None)
+        return generation
+
+    def read_sql(self, connection, sql: str, params=()) -> pd.DataFrame:
+        """
+        pd.read_sql on the caller's connection: temp views and ATTACHes (archive
+        unions from tickets_source) only exist there, never on a shared one.
+        """
+        normalized = normalize_sql(sql)
+        key = (normalized, json.dumps(list(params), default=str))
+        external = self._check_external()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy()
+        tables, clock_params = self._dependencies(normalized, params)
+        if tables is None or (clock_params and any(str(p).strip().lower() == "now" for p in params)):
+            with self._lock:
+                self.uncacheable += 1
+            return pd.read_sql(sql, connection, params=list(params))
+        with self._lock:
+            self.misses += 1
+            generations = [self._generations.get(table, 0) for table in tables]
+        frame = pd.read_sql(sql, connection, params=list(params))
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        stale = self._check_external() != external
+        with self._lock:
+            # A commit landed while the query ran; its result may already be stale
+            if stale or generations != [self._generations.get(table, 0) for table in tables] or nbytes > self.max_bytes:
+                return frame
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (frame, tables, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][2]
+        return frame.copy()
+
+    def _dependencies(self, normalized: str, params):
+        """
+        (tables the statement reads, whether bound parameters reach a date/time
+        function). Tables is None for writes, pragmas, statements that call a
+        volatile function or read the clock, and reads of attached archives.
+        """
+        with self._lock:
+            if normalized in self._tables_read:
+                return self._tables_read[normalized]
+        tables, clock_functions, cacheable = set(), False, True
+
+        def record(action, arg1, arg2, db_name, trigger):
+            nonlocal cacheable, clock_functions
+            if action == sqlite3.SQLITE_READ:
+                # A bare COUNT(*) reports no schema; with nothing attached or temp
+                # here, an unqualified name can only be main
+                db_name = db_name or "main"
+                tables.add(f"{db_name}.{arg1}")
+                # Archive files change without a commit through the writer
+                cacheable &= db_name == "main"
+            elif action not in CACHEABLE_SQL_ACTIONS:
+                cacheable = False
+            elif action == sqlite3.SQLITE_FUNCTION:
+                name = (arg2 or "").lower()
+                if name in VOLATILE_SQL_FUNCTIONS:
+                    cacheable = False
+                clock_functions |= name in CLOCK_SQL_FUNCTIONS
+            return sqlite3.SQLITE_OK
+
+        with self._analyzer_lock:
+            self._analyzer.set_authorizer(record)
+            try:
+                self._analyzer.execute("EXPLAIN " + normalized, list(params)).fetchall()
+            except sqlite3.Error:
+                # e.g. archive tables attached only on the shared connection
+                cacheable = False
+            finally:
+                self._analyzer.set_authorizer(None)
+        if clock_functions and CLOCK_SQL_CALL.search(normalized):
+            cacheable = False
+        result = (frozenset(tables) if cacheable else None, clock_functions and "?" in normalized)
+        with self._lock:
+            self._tables_read[normalized] = result
+        return result
+
+    def invalidate(self, tables=None):
+        """Drop entries reading any of tables; None drops everything (and the dependency map)."""
+        with self._lock:
+            if tables is None:
+                for table in self._generations:
+                    self._generations[table] += 1
+                self._tables_read.clear()
+                stale = list(self._entries)
+            else:
+                if not tables:
+                    return
+                for table in tables:
+                    self._generations[table] = self._generations.get(table, 0) + 1
+                stale = [key for key, entry in self._entries.items() if not entry[1].isdisjoint(tables)]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[2]
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                    "uncacheable": self.uncacheable, "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache()
+
+query_cache = get_query_cache()
+
+def cached_read_sql(sql: str, params=()) -> pd.DataFrame:
+    """pd.read_sql on the shared connection, answered from query_cache when possible."""
+    return query_cache.read_sql(conn, sql, params)
+
+# -----------------------------------------------------------
+# Ticket Number Index (in-memory existence checks)
+# -----------------------------------------------------------
+# A sorted array of every live ticket number answers "which of these exist"
+# for a whole pasted list in one searchsorted call. Temp triggers on the
+# writer connection log each added/removed number into a temp table, which
+# shares the writer's transaction (a rolled-back mutation leaves no trace);
+# the log is folded into small delta sets after every commit and merged
+# into the array once it grows.
+TICKET_INDEX_MERGE_AT = 1024  # pending deltas before they are merged into the sorted array
+TICKET_INDEX_LOG_SQL = [
+    "CREATE TEMP TABLE IF NOT EXISTS ticket_index_log (added INTEGER NOT NULL, ticket_number TEXT)",
+    """CREATE TEMP TRIGGER IF NOT EXISTS ticket_index_ai AFTER INSERT ON main.tickets
+       BEGIN INSERT INTO ticket_index_log VALUES (1, NEW.ticket_number); END""",
+    """CREATE TEMP TRIGGER IF NOT EXISTS ticket_index_ad AFTER DELETE ON main.tickets
+       BEGIN INSERT INTO ticket_index_log VALUES (0, OLD.ticket_number); END""",
+    """CREATE TEMP TRIGGER IF NOT EXISTS ticket_index_au AFTER UPDATE OF ticket_number ON main.tickets
+       WHEN OLD.ticket_number IS NOT NEW.ticket_number
+       BEGIN
+           INSERT INTO ticket_index_log VALUES (0, OLD.ticket_number);
+           INSERT INTO ticket_index_log VALUES (1, NEW.ticket_number);
+       END""",
+]
+
+class TicketIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None  # sorted ticket numbers; None until (re)built
+        self._added = set()
+        self._removed = set()
+        self._generation = 0  # bumped when the delta log can't be trusted
+        self._external_generation = write_queue.external_generation()
+        self.last_build_ms = 0.0
+        write_queue.submit(self._install_log).result(timeout=WRITE_TIMEOUT)
+        write_queue.add_commit_listener(self._apply_log)
+        self._build()
+
+    def _install_log(self, cur):
+        for sql in TICKET_INDEX_LOG_SQL:
+            cur.execute(sql)
+
+    def _invalidate(self):
+        """Forget the array and deltas; the next lookup rebuilds from the table."""
+        with self._lock:
+            self._keys = None
+            self._added, self._removed = set(), set()
+            self._generation += 1
+
+    def _apply_log(self, cur, tables):
+        if tables is None:
+            # A restore or a raw SQL write may have replaced rows wholesale; rebuild on next use.
+            # Stale before touching the log, in case that fails too
+            self._invalidate()
+            self._install_log(cur)
+            cur.execute("DELETE FROM temp.ticket_index_log")
+            return
+        if "main.tickets" not in tables:
+            return
+        changes = cur.execute("SELECT added, ticket_number FROM temp.ticket_index_log "
+                              "WHERE ticket_number IS NOT NULL ORDER BY rowid").fetchall()
+        cur.execute("DELETE FROM temp.ticket_index_log")
+        with self._lock:
+            for added, ticket_number in changes:
+                if added:
+                    self._added.add(ticket_number)
+                    self._removed.discard(ticket_number)
+                else:
+                    self._removed.add(ticket_number)
+                    self._added.discard(ticket_number)
+            if self._keys is not None and len(self._added) + len(self._removed) > TICKET_INDEX_MERGE_AT:
+                self._keys = self._with_deltas(self._keys, list(self._added), list(self._removed))
+                self._added, self._removed = set(), set()
+
+    @staticmethod
+    def _with_deltas(keys, added, removed):
+        if removed:
+            keys = keys[~np.isin(keys, np.array(removed, dtype=str))]
+        if added:
+            keys = np.union1d(keys, np.array(added, dtype=str))
+        return keys
+
+    def _build(self):
+        with self._lock:
+            generation = self._generation
+        started = time.perf_counter()
+        # Read straight off the unique ticket_number index, already in order
+        keys = np.unique(np.array([str(n) for (n,) in conn.execute(
+            "SELECT ticket_number FROM tickets WHERE ticket_number IS NOT NULL ORDER BY ticket_number")], dtype=str))
+        with self._lock:
+            # Deltas logged meanwhile stay on top of the new array (last change per number wins)
+            if generation == self._generation:
+                self._keys = keys
+                self.last_build_ms = (time.perf_counter() - started) * 1000
+
+    def _snapshot(self):
+        # Commits from other connections never reach the temp triggers
+        generation = write_queue.external_generation()
+        if generation != self._external_generation:
+            self._external_generation = generation
+            self._invalidate()
+        while True:
+            with self._lock:
+                if self._keys is not None:
+                    return self._keys, list(self._added), list(self._removed)
+            self._build()
+
+    def contains(self, ticket_numbers) -> np.ndarray:
+        """Boolean array marking which of ticket_numbers are live tickets."""
+        candidates = np.asarray(ticket_numbers, dtype=str)
+        keys, added, removed = self._snapshot()
+        found = np.zeros(len(candidates), dtype=bool)
+        if len(keys):
+            positions = np.minimum(np.searchsorted(keys, candidates), len(keys) - 1)
+            found = keys[positions] == candidates
+        if added:
+            found |= np.isin(candidates, np.array(added, dtype=str))
+        if removed:
+            found &= ~np.isin(candidates, np.array(removed, dtype=str))
+        return found
+
+    def numbers(self) -> np.ndarray:
+        """Every live ticket number, sorted."""
+        return self._with_deltas(*self._snapshot())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"indexed": 0 if self._keys is None else len(self._keys),
+                    "pending": len(self._added) + len(self._removed), "build_ms": self.last_build_ms}
+
+@st.cache_resource
+def get_ticket_index():
+    return TicketIndex()
+
+ticket_index = get_ticket_index()
+
+def split_existing(ticket_numbers) -> tuple:
+    """(existing, new) ticket numbers, keeping the given order."""
+    exists = ticket_index.contains(ticket_numbers) if len(ticket_numbers) else np.zeros(0, dtype=bool)
+    return ([n for n, e in zip(ticket_numbers, exists) if e],
+            [n for n, e in zip(ticket_numbers, exists) if not e])
+
+# -----------------------------------------------------------
+# Analytics Engine (optional DuckDB columnar snapshot)
+# -----------------------------------------------------------
+# Heavy history-wide group-bys run against an in-memory DuckDB copy of the
+# tickets (hot table plus archives) instead of the OLTP SQLite file. The copy
+# is refreshed in the background once the data has changed and the snapshot
+# is older than refresh_seconds; SQLite remains the fallback.
+DUCKDB_TIME_BUCKETS = {
+    "Day": "date",
+    "Week": "date_trunc('week', date)",
+    "Month": "date_trunc('month', date)",
+}
+ANALYTICS_COLUMNS = ["date", "batch_name", "num_sub_tickets", "pay", "status_code", "created_at",
+                     "ticket_school", "ticket_day"]
+
+class AnalyticsEngine:
+    def __init__(self, db_path: str, refresh_seconds: int = 120):
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self._duck = None  # connected on first use so duckdb stays out of cold start
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.snapshot_version = None
+        self.snapshot_at = 0.0
+        self.snapshot_rows = 0
+        self.last_refresh_seconds = 0.0
+
+    def _connection(self):
+        with self._lock:
+            if self._duck is None:
+                self._duck = duckdb.connect(":memory:")
+            return self._duck
+
+    def refresh(self):
+        """Copy tickets (hot and archived) out of SQLite into a fresh DuckDB table."""
+        started = time.perf_counter()
+        version = write_queue.version()
+        source = get_db_connection()
+        try:
+            relation = tickets_source(source, 0, 2 ** 62)
+            df = pd.read_sql(f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM {relation}", source)
+        finally:
+            source.close()
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        cur = self._connection().cursor()
+        cur.register("tickets_snapshot", df)
+        # CREATE OR REPLACE swaps the table atomically for concurrent readers
+        cur.execute("CREATE OR REPLACE TABLE tickets AS SELECT * FROM tickets_snapshot")
+        cur.unregister("tickets_snapshot")
+        with self._lock:
+            self.snapshot_version = version
+            self.snapshot_at = time.time()
+            self.snapshot_rows = len(df)
+            self.last_refresh_seconds = time.perf_counter() - started
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            with self._lock:
+                self._refreshing = False
+
+    def ensure_fresh(self):
+        with self._lock:
+            if self.snapshot_version is None:
+                build_now = True
+            else:
+                build_now = False
+                stale = (self.snapshot_version != write_queue.version()
+                         and time.time() - self.snapshot_at >= self.refresh_seconds)
+                if stale and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, name="analytics-refresh",
+                                     daemon=True).start()
+        if build_now:
+            self.refresh()
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        self.ensure_fresh()
+        return self._connection().cursor().execute(sql, list(params)).df()
+
+@st.cache_resource
+def get_analytics_engine():
+    return AnalyticsEngine(DB_PATH) if duckdb is not None else None
+
+analytics_engine = get_analytics_engine()
+
+def analytics_source_key() -> dict:
+    """
+    Figure-cache parameters naming the data analytics_read_sql currently reads.
+    The DuckDB snapshot lags the database, so figures built from it are keyed
+    on the snapshot as well as on write_queue.version().
+    """
+    if analytics_engine is not None and st.session_state.analytics_backend == "Auto":
+        return {"backend": "duckdb", "snapshot": analytics_engine.snapshot_version,
+                "snapshot_at": analytics_engine.snapshot_at}
+    return {"backend": "sqlite"}
+
+def analytics_read_sql(template: str, params=(), resolution: str = None, epoch_span=(0, 2 ** 62)) -> pd.DataFrame:
+    """
+    Run a read-only analytics query. The template uses {tickets} for the source
+    relation and {bucket} for the time-bucket expression so one query text
+    serves both DuckDB and SQLite. On SQLite, archives are only attached when
+    epoch_span reaches them.
+    """
+    if analytics_engine is not None and st.session_state.analytics_backend == "Auto":
+        try:
+            sql = template.format(tickets="tickets", bucket=DUCKDB_TIME_BUCKETS.get(resolution, ""))
+            return analytics_engine.query(sql, params)
+        except Exception as e:
+            st.caption(f"Analytics engine unavailable, using SQLite ({e})")
+    sql = template.format(tickets=tickets_source(conn, *epoch_span), bucket=TIME_BUCKETS.get(resolution, ""))
+    return pd.read_sql(sql, conn, params=list(params))
+
+# -----------------------------------------------------------
+# Background Jobs
+# -----------------------------------------------------------
+# Long maintenance operations run on a small worker pool instead of the script
+# thread, so a rerun never kills them. Each job is a row in the jobs table;
+# live progress is kept in memory and the final outcome is written back.
+JOB_CHUNK_SIZE = 500  # rows per short write transaction inside a job
+EXPORT_DIR = "exports"
+ACTIVE_JOB_STATUSES = ("queued", "running")
+# Runners touch heartbeat_at on their active jobs and pick up cancel requests
+# made by other processes every JOB_HEARTBEAT_SECONDS; an active job whose
+# heartbeat is older than JOB_ORPHAN_SECONDS lost its runner and is failed.
+JOB_HEARTBEAT_SECONDS = 5
+JOB_ORPHAN_SECONDS = 60
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    def __init__(self, runner, job_id: int, cancel_event: threading.Event):
+        self.job_id = job_id
+        self._runner = runner
+        self._cancel_event = cancel_event
+
+    def progress(self, fraction: float, message: str = ""):
+        """Report progress and stop here if the user asked to cancel."""
+        self._runner._set_progress(self.job_id, fraction, message)
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+class JobRunner:
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._live = {}
+        self._cancel_events = {}
+        # Another server process, or an earlier runner in this one, may still be working on its jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.reap_orphans()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def reap_orphans(self) -> int:
+        """Fail active jobs whose runner stopped checking in (or that predate owners); returns how many."""
+        now = int(time.time())
+        return write_queue.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by restart', finished_at = ? "
+            "WHERE status IN ('queued', 'running') AND (owner IS NULL OR COALESCE(heartbeat_at, 0) < ?)",
+            (now, now - JOB_ORPHAN_SECONDS)
+        ).result(timeout=WRITE_TIMEOUT)
+
+    def heartbeat(self):
+        """Mark this runner's jobs alive and pass on cancel requests made from other processes."""
+        def beat(cur):
+            cur.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                        (int(time.time()), self.owner))
+            return [job_id for (job_id,) in cur.execute(
+                "SELECT id FROM jobs WHERE owner = ? AND cancel_requested = 1 AND status IN ('queued', 'running')",
+                (self.owner,))]
+        for job_id in write_queue.submit(beat).result(timeout=WRITE_TIMEOUT):
+            with self._lock:
+                event = self._cancel_events.get(job_id)
+            if event is not None:
+                event.set()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                self.heartbeat()
+                self.reap_orphans()
+            except Exception:
+                pass  # try again on the next beat
+
+    def submit(self, kind: str, description: str, fn) -> int:
+        """Record a job and run fn(job_context) on the pool; returns the job id."""
+        now = int(time.time())
+        job_id = write_queue.submit(lambda cur: cur.execute(
+            "INSERT INTO jobs (kind, description, status, message, created_at, owner, heartbeat_at) "
+            "VALUES (?, ?, 'queued', 'Queued', ?, ?, ?)",
+            (kind, description, now, self.owner, now)
+        ).lastrowid).result(timeout=WRITE_TIMEOUT)
+        with self._lock:
+            self._live[job_id] = {"progress": 0.0, "message": "Queued"}
+            self._cancel_events[job_id] = threading.Event()
+        self._pool.submit(self._run, job_id, fn)
+        return job_id
+
+    def cancel(self, job_id: int):
+        """Stop a job; one owned by another process stops at its next progress() after a heartbeat."""
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        write_queue.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')", (job_id,)
+        ).result(timeout=WRITE_TIMEOUT)
+
+    def live_progress(self, job_id: int):
+        with self._lock:
+            live = self._live.get(job_id)
+            return dict(live) if live else None
+
+    def _set_progress(self, job_id: int, fraction: float, message: str):
+        with self._lock:
+            self._live[job_id] = {"progress": max(0.0, min(1.0, fraction)), "message": message}
+
+    def _run(self, job_id: int, fn):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+        status, result, error = "succeeded", None, None
+        try:
+            # The flag may have been set from another process while the job was queued
+            if cancel_event.is_set() or not write_queue.execute(
+                "UPDATE jobs SET status = 'running', message = 'Running', started_at = ? "
+                "WHERE id = ? AND COALESCE(cancel_requested, 0) = 0",
+                (int(time.time()), job_id)
+            ).result(timeout=WRITE_TIMEOUT):
+                raise JobCancelled()
+            result = json.dumps(fn(JobContext(self, job_id, cancel_event)))
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", str(e)
+        with self._lock:
+            live = self._live.pop(job_id, {"progress": 0.0, "message": ""})
+            self._cancel_events.pop(job_id, None)
+        progress = 1.0 if status == "succeeded" else live["progress"]
+        write_queue.execute(
+            "UPDATE jobs SET status = ?, progress = ?, message = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, progress, live["message"], result, error, int(time.time()), job_id)
+        ).result(timeout=WRITE_TIMEOUT)
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+job_runner = get_job_runner()
+
+def delete_tickets_job(job, where_sql: str, params=()):
+    """Delete matching tickets in short id-chunked transactions so other writers interleave."""
+    reader = get_db_connection()
+    try:
+        ids = [row[0] for row in reader.execute(f"SELECT id FROM tickets WHERE {where_sql}", params)]
+    finally:
+        reader.close()
+    deleted = 0
+    for start in range(0, len(ids), JOB_CHUNK_SIZE):
+        chunk = ids[start:start + JOB_CHUNK_SIZE]
+        deleted += write_queue.execute(
+            f"DELETE FROM tickets WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        ).result(timeout=WRITE_TIMEOUT)
+        job.progress((start + len(chunk)) / len(ids), f"Deleted {deleted} of {len(ids)} tickets")
+    if deleted:
+        job.progress(1.0, f"Deleted {deleted} tickets; reclaiming free pages")
+        write_queue.submit(reclaim_free_pages, transactional=False).result(timeout=WRITE_TIMEOUT)
+    return {"deleted": deleted}
+
+# -----------------------------------------------------------
+# Database Maintenance
+# -----------------------------------------------------------
+# Both helpers run on the writer connection as non-transactional mutations:
+# executescript() commits first, which would break a group commit.
+MAINTENANCE_INTERVAL = 6 * 3600  # seconds between scheduled maintenance jobs
+MAINTENANCE_CHECK_SECONDS = 600
+VACUUM_PAGES_PER_RUN = 2000  # bounds how long one incremental_vacuum holds the lock
+
+def reclaim_free_pages(cur, max_pages: int = VACUUM_PAGES_PER_RUN) -> int:
+    before = cur.execute("PRAGMA freelist_count").fetchone()[0]
+    if before:
+        # execute() would step the pragma once and free a single page
+        cur.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+    return before - cur.execute("PRAGMA freelist_count").fetchone()[0]
+
+def refresh_statistics(cur):
+    # analysis_limit samples each index so ANALYZE stays cheap on big tables
+    cur.execute("PRAGMA analysis_limit = 1000")
+    cur.execute("ANALYZE")
+    cur.execute("PRAGMA optimize")
+
+def maintenance_job(job):
+    job.progress(0.1, "Reclaiming free pages")
+    freed = write_queue.submit(reclaim_free_pages, transactional=False).result(timeout=WRITE_TIMEOUT)
+    job.progress(0.5, "Refreshing query planner statistics")
+    write_queue.submit(refresh_statistics, transactional=False).result(timeout=WRITE_TIMEOUT)
+    job.progress(0.8, "Closing finished ledger months")
+    closed = write_queue.submit(close_ledger_periods).result(timeout=WRITE_TIMEOUT)
+    job.progress(1.0, f"Freed {freed} page(s), refreshed statistics and closed {closed} ledger month(s)")
+    return {"pages_freed": freed, "periods_closed": closed}
+
+def maintenance_loop():
+    while True:
+        try:
+            reader = get_db_connection()
+            try:
+                last_run, active = reader.execute(
+                    "SELECT MAX(CASE WHEN status = 'succeeded' THEN finished_at END), "
+                    "SUM(status IN ('queued', 'running')) FROM jobs WHERE kind = 'maintenance'"
+                ).fetchone()
+            finally:
+                reader.close()
+            if not active and (last_run is None or time.time() - last_run >= MAINTENANCE_INTERVAL):
+                job_runner.submit("maintenance", "Scheduled database maintenance", maintenance_job)
+        except Exception:
+            pass  # try again on the next tick
+        time.sleep(MAINTENANCE_CHECK_SECONDS)
+
+@st.cache_resource
+def start_maintenance_scheduler():
+    thread = threading.Thread(target=maintenance_loop, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+start_maintenance_scheduler()
+
+def update_tickets_job(job, assignments: str, values, key_column: str, keys):
+    """Apply "UPDATE tickets SET <assignments>" to each key, one chunk per transaction."""
+    keys = list(keys)
+    sql = f"UPDATE tickets SET {assignments} WHERE {key_column} = ?"
+    updated = 0
+    for start in range(0, len(keys), JOB_CHUNK_SIZE):
+        chunk = keys[start:start + JOB_CHUNK_SIZE]
+        updated += write_queue.executemany(sql, [(*values, key) for key in chunk]).result(timeout=WRITE_TIMEOUT)
+        job.progress((start + len(chunk)) / len(keys), f"Updated {updated} of {len(keys)} tickets")
+    return {"updated": updated}
+
+def restore_excel_job(job, data: bytes):
+    job.progress(0.05, "Reading Excel file")
+    df_restore = pd.read_excel(BytesIO(data))
+    required_columns = {"date", "time", "batch_name", "ticket_number", "num_sub_tickets", "status", "pay", "comments", "ticket_day", "ticket_school"}
+    if not required_columns.issubset(set(df_restore.columns)):
+        raise ValueError("Uploaded Excel file does not contain the required columns.")
+    # Files exported with sync versions restore them as they were; the rows still changed here just now
+    keep_versions = "origin" in df_restore.columns
+    if keep_versions:
+        df_restore["local_changed_at"] = int(time.time())
+    columns = list(df_restore.columns)
+    rows = df_restore.astype(object).where(df_restore.notna(), None).values.tolist()
+    insert_sql = f"INSERT INTO tickets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    job.progress(0.5, f"Replacing tickets with {len(rows)} rows")
+
+    def restore_tickets(cur):
+        cur.execute("DELETE FROM tickets")
+        if keep_versions:
+            # Triggers leave versions alone while this flag is set; the savepoint drops it on failure
+            cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('syncing')")
+        cur.executemany(insert_sql, rows)
+        cur.execute("DELETE FROM maintenance_flags WHERE name = 'syncing'")
+
+    # Delete and reload in one queued transaction so no session sees an empty table
+    write_queue.submit(restore_tickets).result(timeout=WRITE_TIMEOUT)
+    job.progress(1.0, f"Restored {len(rows)} tickets")
+    return {"restored": len(rows)}
+
+def export_excel_job(job):
+    """Stream the tickets table into an .xlsx under EXPORT_DIR chunk by chunk."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"tickets_backup_{job.job_id}.xlsx")
+    reader = get_db_connection()
+    try:
+        total = reader.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+        written = 0
+        with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+            # Every column, untouched, so the file restores exactly; ARCHIVE_COLUMNS is the full row
+            for chunk in load_tickets(ARCHIVE_COLUMNS, order_by="id", chunksize=JOB_CHUNK_SIZE * 10,
+                                      tuned=False, connection=reader):
+                chunk.to_excel(writer, index=False, sheet_name="Tickets",
+                               startrow=written + 1 if written else 0, header=not written)
+                written += len(chunk)
+                job.progress(written / max(total, 1), f"Exported {written} of {total} tickets")
+    except JobCancelled:
+        os.remove(path)
+        raise
+    finally:
+        reader.close()
+    return {"path": path, "rows": written}
+
+def latest_job_result(kind: str):
+    """Result dict of the most recent successful job of this kind, or None."""
+    row = conn.execute(
+        "SELECT result FROM jobs WHERE kind = ? AND status = 'succeeded' ORDER BY id DESC LIMIT 1", (kind,)
+    ).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+def job_submitted_notice(job_id: int):
+    st.info(f"Started background job #{job_id}. Follow it on the Jobs page; you can keep working meanwhile.")
+
+# -----------------------------------------------------------
+# Station Sync (change feed between intake stations)
+# -----------------------------------------------------------
+SYNC_FORMAT = "ticket-change-feed/1"
+SYNC_DIR = "sync"
+# Rows travel by ticket_number (ids differ per station) and status by name (codes may differ)
+SYNC_COLUMNS = [
+    "ticket_number", "date", "time", "batch_name", "num_sub_tickets", "status", "pay",
+    "comments", "ticket_day", "ticket_school", "created_at", "updated_at", "origin",
+]
+
+def local_station(connection=None) -> str:
+    return (connection or conn).execute("SELECT station FROM sync_station WHERE id = 1").fetchone()[0]
+
+def export_change_feed(since: int) -> tuple[str, dict]:
+    """
+    Write every row and tombstone that changed on this station at or after
+    `since` (epoch seconds) to a gzipped JSON file under SYNC_DIR. Returns
+    the path and a summary. Exports overlap by a second on purpose; imports
+    are idempotent.
+    """
+    reader = get_db_connection()
+    try:
+        select = ", ".join("s.name AS status" if c == "status" else f"t.{c}" for c in SYNC_COLUMNS)
+        rows = reader.execute(f"""
+            SELECT {select}, t.local_changed_at
+            FROM tickets t LEFT JOIN statuses s ON s.code = t.status_code
+            WHERE t.local_changed_at >= ? AND t.ticket_number IS NOT NULL
+            ORDER BY t.local_changed_at
+        """, (since,)).fetchall()
+        deletes = reader.execute("""
+            SELECT ticket_number, deleted_at, origin, local_changed_at
+            FROM ticket_tombstones WHERE local_changed_at >= ?
+            ORDER BY local_changed_at
+        """, (since,)).fetchall()
+        station = local_station(reader)
+    finally:
+        reader.close()
+    until = max([r[-1] for r in rows] + [d[-1] for d in deletes] + [since])
+    feed = {
+        "format": SYNC_FORMAT,
+        "station": station,
+        "since": since,
+        "until": until,
+        "columns": SYNC_COLUMNS,
+        "rows": [list(r[:-1]) for r in rows],
+        "deletes": [list(d[:-1]) for d in deletes],
+    }
+    os.makedirs(SYNC_DIR, exist_ok=True)
+    stamp = datetime.datetime.fromtimestamp(until).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(SYNC_DIR, f"changes_{station}_{stamp}.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(feed, f, separators=(",", ":"))
+    write_queue.execute("UPDATE sync_station SET exported_until = MAX(exported_until, ?) WHERE id = 1",
+                        (until,)).result(timeout=WRITE_TIMEOUT)
+    return path, {"rows": len(rows), "deletes": len(deletes), "until": until}
+
+def read_change_feed(data: bytes) -> dict:
+    feed = json.loads(gzip.decompress(data))
+    if feed.get("format") != SYNC_FORMAT:
+        raise ValueError(f"Not a {SYNC_FORMAT} file")
+    if feed["columns"] != SYNC_COLUMNS:
+        raise ValueError("The change feed was written by an incompatible version of the app")
+    return feed
+
+def sync_version(updated_at, origin) -> tuple:
+    """Last-writer-wins order: newest timestamp first, then the larger station id, so ties resolve the same everywhere."""
+    return (updated_at or 0, origin or "")
+
+def apply_change_feed(cur, feed: dict) -> dict:
+    """
+    Merge a change feed row by row with last-writer-wins. A remote row
+    replaces the local one (or a local tombstone) only when its version is
+    newer; a remote delete wins over a row of the same or older version.
+    """
+    if feed["station"] == local_station(cur.connection):
+        raise ValueError("This change feed was exported by this station")
+    numbers = [r[0] for r in feed["rows"]] + [d[0] for d in feed["deletes"]]
+    local, tombstones = {}, {}
+    for start in range(0, len(numbers), JOB_CHUNK_SIZE):
+        chunk = numbers[start:start + JOB_CHUNK_SIZE]
+        marks = ", ".join("?" * len(chunk))
+        for number, updated_at, origin in cur.execute(
+                f"SELECT ticket_number, updated_at, origin FROM tickets WHERE ticket_number IN ({marks})", chunk):
+            local[number] = sync_version(updated_at, origin)
+        for number, deleted_at, origin in cur.execute(
+                f"SELECT ticket_number, deleted_at, origin FROM ticket_tombstones WHERE ticket_number IN ({marks})", chunk):
+            tombstones[number] = sync_version(deleted_at, origin)
+
+    now = int(time.time())
+    counts = {"updated": 0, "inserted": 0, "deleted": 0, "skipped": 0}
+    assignments = ", ".join(f"{c} = ?" for c in SYNC_COLUMNS[1:])
+    insert_sql = (f"INSERT INTO tickets ({', '.join(SYNC_COLUMNS)}, local_changed_at) "
+                  f"VALUES ({', '.join('?' * (len(SYNC_COLUMNS) + 1))})")
+    updated_index, origin_index = SYNC_COLUMNS.index("updated_at"), SYNC_COLUMNS.index("origin")
+    # Triggers leave versions alone while this flag is set; the savepoint drops it on failure
+    cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('syncing')")
+    for row in feed["rows"]:
+        number, version = row[0], sync_version(row[updated_index], row[origin_index])
+        if number in local:
+            if version <= local[number]:
+                counts["skipped"] += 1
+                continue
+            cur.execute(f"UPDATE tickets SET {assignments}, local_changed_at = ? WHERE ticket_number = ?",
+                        row[1:] + [now, number])
+            counts["updated"] += 1
+        elif number in tombstones and version <= tombstones[number]:
+            counts["skipped"] += 1
+            continue
+        else:
+            cur.execute(insert_sql, row + [now])
+            tombstones.pop(number, None)
+            counts["inserted"] += 1
+        local[number] = version
+    for number, deleted_at, origin in feed["deletes"]:
+        version = sync_version(deleted_at, origin)
+        if number in local and version < local[number]:
+            counts["skipped"] += 1
+            continue
+        if number not in local and number in tombstones and version <= tombstones[number]:
+            counts["skipped"] += 1
+            continue
+        # Kept even when the row never existed here, so the delete travels on to other stations
+        cur.execute("""INSERT OR REPLACE INTO ticket_tombstones (ticket_number, deleted_at, origin, local_changed_at)
+                       VALUES (?, ?, ?, ?)""", (number, deleted_at, origin, now))
+        if number in local:
+            cur.execute("DELETE FROM tickets WHERE ticket_number = ?", (number,))
+            del local[number]
+            counts["deleted"] += 1
+        tombstones[number] = version
+    cur.execute("DELETE FROM maintenance_flags WHERE name = 'syncing'")
+    cur.execute("""
+        INSERT INTO sync_peers (station, imported_until, imported_at, rows_applied) VALUES (?, ?, ?, ?)
+        ON CONFLICT (station) DO UPDATE SET imported_until = MAX(imported_until, excluded.imported_until),
+                                            imported_at = excluded.imported_at,
+                                            rows_applied = rows_applied + excluded.rows_applied
+    """, (feed["station"], feed["until"], now, counts["updated"] + counts["inserted"] + counts["deleted"]))
+    return counts
+
+def import_changes_job(job, data: bytes):
+    job.progress(0.1, "Reading change feed")
+    feed = read_change_feed(data)
+    job.progress(0.3, f"Merging {len(feed['rows'])} row(s) and {len(feed['deletes'])} delete(s) "
+                      f"from station {feed['station']}")
+    counts = write_queue.submit(lambda cur: apply_change_feed(cur, feed)).result(timeout=WRITE_TIMEOUT)
+    job.progress(1.0, ", ".join(f"{count} {name}" for name, count in counts.items()))
+    return {"station": feed["station"], **counts}
+
 # -----------------------------------------------------------
 # Navigation (Add new pages to navigation)
 # -----------------------------------------------------------
@@ -162,7 +2430,10 @@ def render_navbar():
         "SQL Query Converter": "📝",
         "Income": "💰",
         "Batches": "🗂️",
+        "Schools": "🏫",
         "AI Analysis": "🤖",
+        "Cycle Times": "⏳",
+        "Jobs": "🧵",
         "Backup & Restore": "💾",
         "Settings": "⚙️"
     }
@@ -176,6 +2447,84 @@ def render_navbar():
         if cols[i].button(f"{icon} {page}"):
             st.session_state.active_page = page
 
+# -----------------------------------------------------------
+# Live Dashboard (change detection)
+# -----------------------------------------------------------
+# Polling costs one PRAGMA per tick. Only when it moves does the dashboard
+# ask which tickets changed, and each widget re-queries only if that change
+# can reach the data it shows.
+LIVE_INTERVALS = {"5 s": 5, "15 s": 15, "1 min": 60}
+
+@st.cache_resource
+def get_change_watcher():
+    # PRAGMA data_version only moves when *another* connection commits, so the
+    # watcher needs a long-lived connection of its own
+    return get_db_connection(), threading.Lock()
+
+def change_token() -> tuple:
+    watch_conn, lock = get_change_watcher()
+    with lock:
+        version = watch_conn.execute("PRAGMA data_version").fetchone()[0]
+    return version, write_queue.data_version
+
+def dashboard_changes():
+    """
+    Summarize ticket changes since this session last drew the dashboard.
+    Returns None when nothing was committed, otherwise a dict with "any",
+    "everything" (deletes, archiving or first draw) and the created_at span
+    of the rows that were inserted or updated.
+    """
+    cache = st.session_state.dashboard_cache
+    token = change_token()
+    if cache.get("token") == token:
+        return None
+    archived = conn.execute("SELECT TOTAL(row_count) FROM archive_files").fetchone()[0]
+    if cache.get("token") is None:
+        changes = {"any": True, "everything": True, "rows": 0, "min_created": None, "max_created": None}
+    else:
+        watermark = cache["watermark"]
+        # local_changed_at, not updated_at: rows merged from another station keep their remote updated_at
+        rows, min_created, max_created = conn.execute(
+            "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM tickets WHERE local_changed_at >= ?", (watermark,)
+        ).fetchone()
+        deletes = conn.execute(
+            "SELECT COUNT(*) FROM ticket_events WHERE at >= ? AND to_code IS NULL", (watermark,)
+        ).fetchone()[0]
+        everything = bool(deletes) or archived != cache["archived"]
+        changes = {"any": everything or bool(rows), "everything": everything, "rows": rows,
+                   "min_created": min_created, "max_created": max_created}
+    # local_changed_at has one-second resolution, so look back a second next time
+    cache.update(token=token, watermark=int(time.time()) - 1, archived=archived)
+    return changes
+
+def span_touched(changes, start_epoch, end_epoch=None) -> bool:
+    """Whether the changes can affect rows created in [start_epoch, end_epoch)."""
+    if changes is None or not changes["any"]:
+        return False
+    if changes["everything"]:
+        return True
+    return bool(changes["rows"]) and changes["max_created"] >= start_epoch and (
+        end_epoch is None or changes["min_created"] < end_epoch)
+
+def reuse_or_refresh(name: str, params: dict, touched: bool, load):
+    """Return this session's last value for a dashboard widget unless its data or params moved."""
+    cache = st.session_state.dashboard_cache
+    entry = cache.get(name)
+    if entry is not None and entry[0] == params and not touched:
+        return entry[1]
+    value = load()
+    cache[name] = (params, value)
+    return value
+
+def live_watcher(interval: int):
+    @st.fragment(run_every=interval)
+    def watch():
+        if change_token() != st.session_state.dashboard_cache.get("token"):
+            st.rerun()
+        st.caption(f"🟢 Live · checked {datetime.datetime.now():%H:%M:%S}")
+
+    watch()
+
 # -----------------------------------------------------------
 # Dashboard Page
 # -----------------------------------------------------------
@@ -188,16 +2537,27 @@ def dashboard_page():
     with col_title:
         st.markdown("## 📊 Real-Time Ticket Analytics")
         st.write("View and analyze your ticket performance and earnings at a glance.")
-    
-    # Totals are computed by summing num_sub_tickets
-    cursor.execute("SELECT SUM(num_sub_tickets) FROM tickets WHERE status='Intake'")
-    total_intake = cursor.fetchone()[0] or 0
-    cursor.execute("SELECT SUM(num_sub_tickets) FROM tickets WHERE status='Return'")
-    total_ready = cursor.fetchone()[0] or 0
-    cursor.execute("SELECT SUM(num_sub_tickets) FROM tickets WHERE status='Delivered'")
-    total_delivered = cursor.fetchone()[0] or 0
-    cursor.execute("SELECT SUM(num_sub_tickets) FROM tickets")
-    total_overall = cursor.fetchone()[0] or 0
+        col_live, col_interval = st.columns([1, 1])
+        live_mode = col_live.toggle("Live updates", key="dashboard_live",
+                                    help="Redraw automatically when tickets change")
+        if live_mode:
+            interval = col_interval.selectbox("Check every", list(LIVE_INTERVALS), key="dashboard_live_interval",
+                                              label_visibility="collapsed")
+            live_watcher(LIVE_INTERVALS[interval])
+
+    changes = dashboard_changes()
+    any_change = changes is not None and changes["any"]
+
+    def load_totals():
+        # Totals are computed by summing num_sub_tickets, grouped on the status code
+        df_totals = cached_read_sql("SELECT status_code, SUM(num_sub_tickets) AS total FROM tickets GROUP BY status_code")
+        return {code: total or 0 for code, total in zip(df_totals["status_code"], df_totals["total"].fillna(0))}
+
+    totals_by_code = reuse_or_refresh("totals", {}, any_change, load_totals)
+    total_intake = totals_by_code.get(STATUS_CODES["Intake"], 0)
+    total_ready = totals_by_code.get(STATUS_CODES["Return"], 0)
+    total_delivered = totals_by_code.get(STATUS_CODES["Delivered"], 0)
+    total_overall = sum(totals_by_code.values())
 
     estimated_earnings = total_intake * st.session_state.ticket_price
     actual_earnings = total_delivered * st.session_state.ticket_price
@@ -216,43 +2576,64 @@ def dashboard_page():
         start_date = st.date_input("Start Date", datetime.date.today() - datetime.timedelta(days=30))
     with col_date2:
         end_date = st.date_input("End Date", datetime.date.today())
+    resolution = pick_resolution(start_date, end_date, resolution_picker("dash_resolution"))
+    bucket_sql = TIME_BUCKETS[resolution]
     
-    query = """
-    SELECT date, 
-           SUM(CASE WHEN status='Delivered' THEN num_sub_tickets ELSE 0 END) as delivered,
-           SUM(CASE WHEN status='Return' THEN num_sub_tickets ELSE 0 END) as ready,
-           SUM(CASE WHEN status='Intake' THEN num_sub_tickets ELSE 0 END) as intake
-    FROM tickets
-    WHERE date BETWEEN ? AND ?
-    GROUP BY date
-    ORDER BY date
-    """
-    df_daily = pd.read_sql(query, conn, params=[start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")])
-    if not df_daily.empty:
+    ticket_price = st.session_state.ticket_price
+
+    # Query and figure building only run when the range, price or data changed
+    def build_daily_charts():
+        range_start, range_end = epoch_range(start_date, end_date)
+        query = f"""
+        SELECT {bucket_sql} as date, 
+               SUM(CASE WHEN status_code=? THEN num_sub_tickets ELSE 0 END) as delivered,
+               SUM(CASE WHEN status_code=? THEN num_sub_tickets ELSE 0 END) as ready,
+               SUM(CASE WHEN status_code=? THEN num_sub_tickets ELSE 0 END) as intake
+        FROM {tickets_source(conn, range_start, range_end)}
+        WHERE created_at >= ? AND created_at < ?
+        GROUP BY 1
+        ORDER BY 1
+        """
+        df_daily = cached_read_sql(query, params=[STATUS_CODES["Delivered"], STATUS_CODES["Return"], STATUS_CODES["Intake"],
+                                                    range_start, range_end])
+        if df_daily.empty:
+            return None
         df_daily['date'] = pd.to_datetime(df_daily['date'])
+        delivered_x, delivered_y = downsample_line(df_daily['date'], df_daily['delivered'])
+        ready_x, ready_y = downsample_line(df_daily['date'], df_daily['ready'])
+        intake_x, intake_y = downsample_line(df_daily['date'], df_daily['intake'])
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df_daily['date'], y=df_daily['delivered'],
+        fig.add_trace(go.Scatter(x=delivered_x, y=delivered_y,
                                  mode='lines+markers', name='Delivered',
                                  line=dict(width=3), fill='tozeroy'))
-        fig.add_trace(go.Scatter(x=df_daily['date'], y=df_daily['ready'],
+        fig.add_trace(go.Scatter(x=ready_x, y=ready_y,
                                  mode='lines+markers', name='Ready to Deliver',
                                  line=dict(width=3)))
-        fig.add_trace(go.Scatter(x=df_daily['date'], y=df_daily['intake'],
+        fig.add_trace(go.Scatter(x=intake_x, y=intake_y,
                                  mode='lines+markers', name='Intake',
                                  line=dict(width=3, dash='dot')))
-        fig.update_layout(title='Daily Ticket Activity', 
+        fig.update_layout(title=f'{BUCKET_ADJECTIVE[resolution]} Ticket Activity', 
                           xaxis_title='Date', 
                           yaxis_title='Number of Tickets',
                           hovermode='x unified', 
                           template='plotly_white', 
                           height=500)
-        st.plotly_chart(fig, use_container_width=True)
-        
-        df_daily['delivered_value'] = df_daily['delivered'] * st.session_state.ticket_price
+
+        df_daily['delivered_value'] = df_daily['delivered'] * ticket_price
         fig2 = px.bar(df_daily, x='date', y='delivered_value',
-                      title="Daily Delivery Earnings",
+                      title=f"{BUCKET_ADJECTIVE[resolution]} Delivery Earnings",
                       labels={'delivered_value': 'Earnings ($)', 'date': 'Date'})
         fig2.update_layout(height=400)
+        return [fig, fig2]
+
+    daily_params = {"start": start_date, "end": end_date, "price": ticket_price, "resolution": resolution}
+    daily_figures = reuse_or_refresh(
+        "daily", daily_params, span_touched(changes, *epoch_range(start_date, end_date)),
+        lambda: figure_cache.get_or_build("dashboard_daily", daily_params, build_daily_charts)
+    )
+    if daily_figures:
+        fig, fig2 = daily_figures
+        st.plotly_chart(fig, use_container_width=True)
         st.plotly_chart(fig2, use_container_width=True)
     else:
         st.info("No data available for selected date range")
@@ -263,43 +2644,213 @@ def dashboard_page():
     with col_stat1:
         total_intake = max(total_intake, 0)
         conversion_rate = (total_delivered / total_intake * 100) if total_intake > 0 else 0
-        fig_gauge = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=conversion_rate,
-            title={'text': "Delivery Rate"},
-            gauge={'axis': {'range': [0, 100]},
-                   'bar': {'color': "green"},
-                   'steps': [
-                       {'range': [0, 33], 'color': "lightgray"},
-                       {'range': [33, 66], 'color': "gray"},
-                       {'range': [66, 100], 'color': "darkgray"}
-                   ]}
-        ))
-        fig_gauge.update_layout(height=300)
+
+        def build_gauge():
+            fig_gauge = go.Figure(go.Indicator(
+                mode="gauge+number",
+                value=conversion_rate,
+                title={'text': "Delivery Rate"},
+                gauge={'axis': {'range': [0, 100]},
+                       'bar': {'color': "green"},
+                       'steps': [
+                           {'range': [0, 33], 'color': "lightgray"},
+                           {'range': [33, 66], 'color': "gray"},
+                           {'range': [66, 100], 'color': "darkgray"}
+                       ]}
+            ))
+            fig_gauge.update_layout(height=300)
+            return fig_gauge
+
+        fig_gauge = figure_cache.get_or_build("dashboard_gauge", {"value": conversion_rate}, build_gauge)
         st.plotly_chart(fig_gauge, use_container_width=True)
     with col_stat2:
-        query_status = "SELECT status, COUNT(*) as count FROM tickets GROUP BY status"
-        df_status = pd.read_sql(query_status, conn)
-        if not df_status.empty:
-            # Convert each DB status to display label
-            df_status['status_ui'] = df_status['status'].apply(display_status)
+        def build_status_pie():
+            query_status = "SELECT status_code, COUNT(*) as count FROM tickets GROUP BY status_code"
+            df_status = cached_read_sql(query_status)
+            if df_status.empty:
+                return None
+            # Convert each status code to its display label
+            df_status['status_ui'] = status_categorical(df_status['status_code'])
             fig_pie = px.pie(df_status, values='count', names='status_ui',
                              title="Ticket Status Distribution")
             fig_pie.update_traces(textposition='inside', textinfo='percent+label')
             fig_pie.update_layout(height=300)
+            return fig_pie
+
+        fig_pie = reuse_or_refresh("status_pie", {}, any_change,
+                                   lambda: figure_cache.get_or_build("dashboard_status_pie", {}, build_status_pie))
+        if fig_pie is not None:
             st.plotly_chart(fig_pie, use_container_width=True)
         else:
             st.info("No status data available")
     
     # Recent Activity Table
     st.subheader("⏱️ Recent Activity")
-    df_recent = pd.read_sql("SELECT date, ticket_number, status, num_sub_tickets FROM tickets ORDER BY date DESC, time DESC LIMIT 8", conn)
+    previous = st.session_state.dashboard_cache.get("recent")
+    oldest_shown = previous[1]["created_at"].min() if previous is not None and not previous[1].empty else 0
+    df_recent = reuse_or_refresh("recent", {}, span_touched(changes, oldest_shown), lambda: cached_read_sql(
+        "SELECT date, ticket_number, status_code, num_sub_tickets, created_at FROM tickets ORDER BY created_at DESC LIMIT 8"
+    ))
     if not df_recent.empty:
-        df_recent['status'] = df_recent['status'].apply(display_status)
+        df_recent = with_status_labels(df_recent.drop(columns="created_at"))
         st.dataframe(df_recent, use_container_width=True)
     else:
         st.info("No recent activity to display")
 
+# -----------------------------------------------------------
+# Ticket Line Parsing (school and weekday on ingest)
+# -----------------------------------------------------------
+def parse_ticket_line(line: str):
+    """
+    Split "125633 - Eastport-South Manor / Acer R752T" into the ticket
+    number and school; the part after " / " is the device. A line without
+    " - " is just a ticket number. Returns (ticket_number, school or None),
+    or None for a blank line.
+    """
+    line = line.strip()
+    if " - " in line:
+        number, description = line.split(" - ", 1)
+        school = description.split(" / ", 1)[0].strip()
+        return number.strip(), school or None
+    parts = line.split()
+    return (parts[0], None) if parts else None
+
+def parse_ticket_entries(text: str) -> list:
+    """Ticket numbers (with school) from pasted text: described lines, or space separated numbers."""
+    entries = []
+    for line in text.splitlines():
+        if " - " in line:
+            entries.append(parse_ticket_line(line))
+        else:
+            entries.extend((number, None) for number in line.split())
+    return entries
+
+def ticket_weekday(date: str):
+    return WEEKDAYS[datetime.date.fromisoformat(date[:10]).weekday()] if date else None
+
+# -----------------------------------------------------------
+# Rapid Scan Entry
+# -----------------------------------------------------------
+# Each scan only reruns the scanner fragment and lands in a session buffer;
+# the buffer is written as one queued transaction every SCAN_FLUSH_COUNT
+# scans or SCAN_FLUSH_SECONDS, without waiting for the commit.
+SCAN_FLUSH_COUNT = 10
+SCAN_FLUSH_SECONDS = 2
+# Writes that keep failing stop retrying and are listed as unsaved instead
+SCAN_MAX_ATTEMPTS = 3
+
+def insert_intake_tickets(cur, rows, batch_name: str, price: float):
+    """Insert (ticket_number, date, time, created_at, school) rows as Intake; returns (added, duplicate numbers)."""
+    added, failed = 0, []
+    for ticket_number, date, time_of_day, created_at, school in rows:
+        try:
+            cur.execute(
+                """INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay,
+                                        ticket_school, ticket_day, created_at, updated_at)
+                   VALUES(?,?,?,?,?,?,?,?,?,?,?)""",
+                (date, time_of_day, batch_name, ticket_number, 1, "Intake", price,
+                 school, ticket_weekday(date), created_at, created_at)
+            )
+            added += 1
+        except sqlite3.IntegrityError:
+            failed.append(ticket_number)
+    return added, failed
+
+def new_scan_session(batch_name: str) -> dict:
+    return {"batch_name": batch_name, "buffer": [], "pending": [], "failed": [], "seen": set(), "scans": 0,
+            "saved": 0, "duplicates": [], "error": None, "started": time.time(), "recent": deque(maxlen=8)}
+
+def queue_scan():
+    """on_change callback of the scan box: buffer the code and clear the box for the next scan."""
+    scan = st.session_state.scan_session
+    entry = parse_ticket_line(st.session_state.scan_input)
+    st.session_state.scan_input = ""
+    if entry is None:
+        return
+    ticket_number, school = entry
+    scan["scans"] += 1
+    if ticket_number in scan["seen"]:
+        scan["duplicates"].append(ticket_number)
+        scan["recent"].appendleft(f"⚠️ {ticket_number} (scanned twice)")
+        return
+    scan["seen"].add(ticket_number)
+    scan["buffer"].append((ticket_number, *ticket_timestamp(), school))
+    scan["recent"].appendleft(f"✅ {ticket_number}")
+
+def submit_scans(rows, batch_name: str, attempt: int = 1):
+    """Queue one transaction for rows; returns the (future, rows, batch_name, attempt) kept in "pending"."""
+    price = st.session_state.ticket_price
+    future = write_queue.submit(lambda cur: insert_intake_tickets(cur, rows, batch_name, price))
+    return future, rows, batch_name, attempt
+
+def flush_scans(force: bool = False):
+    """Queue the buffer when it is full, old enough or forced, and collect finished writes."""
+    scan = st.session_state.scan_session
+    buffer = scan["buffer"]
+    if buffer and (force or len(buffer) >= SCAN_FLUSH_COUNT or time.time() - buffer[0][3] >= SCAN_FLUSH_SECONDS):
+        scan["pending"].append(submit_scans(list(buffer), scan["batch_name"]))
+        buffer.clear()
+    still_pending = []
+    for future, rows, batch_name, attempt in scan["pending"]:
+        if not future.done():
+            still_pending.append((future, rows, batch_name, attempt))
+            continue
+        try:
+            added, failed = future.result()
+        except Exception as e:
+            # Keep the scans and send them again, under the batch they were scanned into
+            scan["error"] = str(e)
+            if attempt < SCAN_MAX_ATTEMPTS:
+                still_pending.append(submit_scans(rows, batch_name, attempt + 1))
+            else:
+                scan["failed"].append((rows, batch_name, str(e)))
+            continue
+        scan["saved"] += added
+        scan["duplicates"].extend(failed)
+    scan["pending"] = still_pending
+
+def rapid_scan_entry(batch_name: str):
+    if st.session_state.scan_session is None:
+        st.session_state.scan_session = new_scan_session(batch_name)
+
+    @st.fragment(run_every=SCAN_FLUSH_SECONDS)
+    def scanner():
+        scan = st.session_state.scan_session
+        st.text_input("Scan Ticket", key="scan_input", on_change=queue_scan,
+                      placeholder="Keep the cursor here and scan; each Enter queues one ticket")
+        col_save, col_new = st.columns(2)
+        save_now = col_save.button("Save Buffered Scans Now")
+        start_new = col_new.button("Start New Scan Session")
+        flush_scans(force=save_now or start_new)
+        if start_new:
+            # Writes still in flight belong to the old session's scans; the new one keeps collecting them
+            pending, failed = scan["pending"], scan["failed"]
+            st.session_state.scan_session = scan = new_scan_session(batch_name)
+            scan["pending"], scan["failed"] = pending, failed
+
+        elapsed = max(time.time() - scan["started"], 1)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Scanned", scan["scans"], f"{scan['scans'] / elapsed * 60:.0f}/min")
+        col2.metric("Waiting to Save", len(scan["buffer"]) + sum(len(rows) for _, rows, *_ in scan["pending"]))
+        col3.metric("Saved", scan["saved"])
+        col4.metric("Duplicates", len(scan["duplicates"]))
+        st.caption(f"Batch '{scan['batch_name']}' · saves every {SCAN_FLUSH_COUNT} scans or {SCAN_FLUSH_SECONDS} s")
+        if scan["error"] and scan["pending"]:
+            st.error(f"Last save failed, will retry: {scan['error']}")
+        if scan["failed"]:
+            unsaved = [row[0] for rows, _, _ in scan["failed"] for row in rows]
+            st.error(f"{len(unsaved)} scan(s) could not be saved after {SCAN_MAX_ATTEMPTS} attempts "
+                     f"({scan['failed'][-1][2]}): {', '.join(unsaved)}")
+            if st.button("Retry Unsaved Scans"):
+                scan["pending"].extend(submit_scans(rows, failed_batch) for rows, failed_batch, _ in scan["failed"])
+                scan["failed"] = []
+        if scan["recent"]:
+            st.markdown("  \n".join(scan["recent"]))
+        if scan["duplicates"]:
+            st.warning(f"Already in the system or scanned twice: {', '.join(scan['duplicates'][-5:])}")
+
+    scanner()
+
 # -----------------------------------------------------------
 # Add Tickets Page
 # -----------------------------------------------------------
@@ -316,9 +2867,7 @@ def add_tickets_page():
     col1, col2 = st.columns([2, 1])
     with col1:
         batch_name = st.text_input("Batch Name (optional)", placeholder="Enter a meaningful batch name")
-        ticket_input_type = st.radio("Ticket Input Type", ["Multiple/General", "Large Ticket"], horizontal=True)
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        current_time = datetime.datetime.now().strftime("%H:%M:%S")
+        ticket_input_type = st.radio("Ticket Input Type", ["Multiple/General", "Large Ticket", "Rapid Scan"], horizontal=True)
         if not batch_name.strip():
             cursor.execute("SELECT COUNT(DISTINCT batch_name) FROM tickets")
             batch_count = cursor.fetchone()[0] + 1
@@ -333,25 +2882,22 @@ def add_tickets_page():
         """)
     
     if ticket_input_type == "Multiple/General":
-        tickets_text = st.text_area("Enter Ticket Number(s)", placeholder="Space or newline separated ticket numbers")
+        tickets_text = st.text_area("Enter Ticket Number(s)",
+                                    placeholder="Space or newline separated ticket numbers, or lines like "
+                                                "\"125633 - School Name / Device\"")
         if st.button("Add Tickets"):
             if tickets_text.strip():
-                tickets_list = tickets_text.replace('\n', ' ').strip().split()
-                success_count = 0
-                failed_tickets = []
-                for t in tickets_list:
-                    t = t.strip()
-                    if t:
-                        try:
-                            cursor.execute(
-                                """INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay)
-                                   VALUES(?,?,?,?,?,?,?)""",
-                                (current_date, current_time, batch_name, t, 1, "Intake", st.session_state.ticket_price)
-                            )
-                            success_count += 1
-                        except sqlite3.IntegrityError:
-                            failed_tickets.append(t)
-                conn.commit()
+                price = st.session_state.ticket_price
+                timestamp = ticket_timestamp()
+                rows = [(number, *timestamp, school) for number, school in parse_ticket_entries(tickets_text)]
+                # Known duplicates never reach the writer; the insert still catches any race
+                duplicates, _ = split_existing([row[0] for row in rows])
+                known = set(duplicates)
+                rows = [row for row in rows if row[0] not in known]
+                success_count, failed_tickets = write_queue.submit(
+                    lambda cur: insert_intake_tickets(cur, rows, batch_name, price)
+                ).result(timeout=WRITE_TIMEOUT) if rows else (0, [])
+                failed_tickets = duplicates + failed_tickets
                 if success_count:
                     st.success(f"Successfully added {success_count} ticket(s) to batch '{batch_name}'.")
                     if animations["success"]:
@@ -360,6 +2906,8 @@ def add_tickets_page():
                     st.warning(f"Could not add {len(failed_tickets)} ticket(s) because they already exist: {', '.join(failed_tickets[:5])}{'...' if len(failed_tickets) > 5 else ''}")
             else:
                 st.warning("Please enter ticket number(s).")
+    elif ticket_input_type == "Rapid Scan":
+        rapid_scan_entry(batch_name)
     else:
         col_large1, col_large2 = st.columns(2)
         with col_large1:
@@ -368,26 +2916,32 @@ def add_tickets_page():
             sub_count = st.number_input("Number of Sub-Tickets", min_value=1, value=5, step=1)
         if st.button("Add Large Ticket"):
             if large_ticket.strip():
-                try:
-                    cursor.execute(
-                        """INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay)
-                           VALUES(?,?,?,?,?,?,?)""",
-                        (current_date, current_time, batch_name, large_ticket.strip(), sub_count, "Intake", st.session_state.ticket_price)
-                    )
-                    conn.commit()
-                    st.success(f"Added large ticket '{large_ticket}' with {sub_count} sub-tickets to batch '{batch_name}'.")
-                    if animations["success"]:
-                        st_lottie(animations["success"], height=120)
-                except sqlite3.IntegrityError:
-                    st.error(f"Ticket '{large_ticket.strip()}' already exists.")
+                current_date, current_time, created_at = ticket_timestamp()
+                large_ticket, school = parse_ticket_line(large_ticket)
+                if ticket_index.contains([large_ticket])[0]:
+                    st.error(f"Ticket '{large_ticket}' already exists.")
+                else:
+                    try:
+                        write_queue.execute(
+                            """INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay,
+                                                    ticket_school, ticket_day, created_at, updated_at)
+                               VALUES(?,?,?,?,?,?,?,?,?,?,?)""",
+                            (current_date, current_time, batch_name, large_ticket, sub_count, "Intake", st.session_state.ticket_price,
+                             school, ticket_weekday(current_date), created_at, created_at)
+                        ).result(timeout=WRITE_TIMEOUT)
+                        st.success(f"Added large ticket '{large_ticket}' with {sub_count} sub-tickets to batch '{batch_name}'.")
+                        if animations["success"]:
+                            st_lottie(animations["success"], height=120)
+                    except sqlite3.IntegrityError:
+                        st.error(f"Ticket '{large_ticket.strip()}' already exists.")
             else:
                 st.warning("Please enter a valid ticket number.")
     
     st.markdown("---")
     st.subheader("Recent Additions")
-    df_recent = pd.read_sql("SELECT date, time, batch_name, ticket_number, num_sub_tickets, status FROM tickets ORDER BY id DESC LIMIT 5", conn)
+    df_recent = cached_read_sql("SELECT date, time, batch_name, ticket_number, num_sub_tickets, status_code FROM tickets ORDER BY id DESC LIMIT 5")
     if not df_recent.empty:
-        df_recent['status'] = df_recent['status'].apply(display_status)
+        df_recent = with_status_labels(df_recent)
         st.dataframe(df_recent, use_container_width=True)
     else:
         st.info("No recent tickets added.")
@@ -411,10 +2965,10 @@ def view_tickets_page():
     def show_status_data(status_key, container):
         with container:
             st.subheader(f"Tickets with status '{display_status(status_key)}'")
-            df_data = pd.read_sql("SELECT * FROM tickets WHERE status=? ORDER BY date DESC, time DESC", conn, params=(status_key,))
+            df_data = load_tickets(TICKET_VIEW_COLUMNS, "status_code = ?", (STATUS_CODES.get(status_key, -1),),
+                                   order_by="created_at DESC")
             if not df_data.empty:
-                df_data['status'] = df_data['status'].apply(display_status)
-                st.dataframe(df_data, use_container_width=True)
+                st.dataframe(df_data, use_container_width=True, column_config=TICKET_COLUMN_CONFIG)
                 total_count = df_data['num_sub_tickets'].sum()
                 total_value = total_count * st.session_state.ticket_price
                 colA, colB = st.columns(2)
@@ -434,6 +2988,272 @@ def view_tickets_page():
     # Cancelled
     show_status_data("Cancelled", tab5)
 
+# -----------------------------------------------------------
+# Guarded Custom SQL
+# -----------------------------------------------------------
+# Hand-written SQL never touches the shared reader. Reads and plans use a
+# read-only connection of their own, writes go through the writer thread,
+# and every statement is interrupted by the progress handler at a deadline.
+SQL_PAGE_SIZE = 100
+SQL_READ_KEYWORDS = ("SELECT", "WITH", "VALUES")
+SQL_WRITE_KEYWORDS = ("INSERT", "UPDATE", "REPLACE")
+
+def sql_statement_kind(sql: str):
+    """'read', 'write', or None for statements the Custom SQL tab refuses."""
+    words = sql.strip().split(None, 1)
+    keyword = words[0].upper() if words else ""
+    if keyword in SQL_READ_KEYWORDS:
+        return "read"
+    if keyword in SQL_WRITE_KEYWORDS:
+        return "write"
+    return None
+
+@contextmanager
+def sql_deadline(connection, seconds: float):
+    """Abort whatever runs on connection once seconds have passed."""
+    deadline = time.monotonic() + seconds
+    connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+        yield
+    finally:
+        connection.set_progress_handler(None, 0)
+
+def open_read_only_connection():
+    guarded = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+    guarded.execute("PRAGMA query_only = ON")
+    return guarded
+
+# "SCAN t USING COVERING INDEX i"; SQLite before 3.36 wrote "SCAN TABLE tickets AS t"
+SCAN_DETAIL = re.compile(r"SCAN (?:TABLE )?(\S+)(?: AS (\S+))?(?: USING (?:COVERING )?INDEX (\S+))?")
+# Words that may follow a table name in FROM/JOIN without being its alias
+NOT_ALIASES = {
+    "WHERE", "JOIN", "ON", "USING", "LEFT", "RIGHT", "FULL", "INNER", "OUTER", "CROSS", "NATURAL", "GROUP",
+    "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "HAVING", "INDEXED", "NOT", "RETURNING",
+    "SET", "VALUES", "SELECT", "FROM", "DEFAULT", "AS",
+}
+
+def table_aliases(sql: str, tables) -> dict:
+    """{alias: table} for every `table [AS] alias` in sql, so plan rows naming an alias find their table."""
+    tokens = [m for m in SQL_TOKEN.finditer(sql) if m.group()[0].isalnum() or m.group()[0] in "_\"`["]
+    aliases = {}
+    for i, match in enumerate(tokens[:-1]):
+        table = tables.get(match.group().strip("\"`[]").lower())
+        if table is None:
+            continue
+        following = tokens[i + 1:i + 3]
+        if following[0].group().upper() == "AS" and len(following) > 1:
+            following = following[1:]
+        alias = following[0]
+        # Only whitespace (and AS) between the two, so "tickets.id" or "tickets, t" is not an alias
+        gap = sql[match.end():alias.start()]
+        if gap.strip().upper() in ("", "AS") and alias.group().upper() not in NOT_ALIASES:
+            aliases[alias.group().strip("\"`[]")] = table
+    return aliases
+
+def explain_sql(sql: str):
+    """EXPLAIN QUERY PLAN rows plus a warning per full scan, sized from ANALYZE statistics."""
+    guarded = open_read_only_connection()
+    try:
+        plan = [detail for _, _, _, detail in guarded.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+        # sqlite_stat1 exists once the maintenance job has run ANALYZE
+        has_stats = guarded.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        tables = {name.lower(): name for (name,) in guarded.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        aliases = table_aliases(sql, tables)
+        warnings = []
+        for detail in plan:
+            match = SCAN_DETAIL.match(detail)
+            if match is None:
+                continue
+            name, alias, index = match.groups()
+            # Scans of subqueries, CTEs and constant rows are reported through the tables they read
+            table = tables.get(name.lower()) or aliases.get(alias or name)
+            if table is None:
+                continue
+            stat = guarded.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)
+            ).fetchone() if has_stats else None
+            estimate = f" (~{int(stat[0].split()[0]):,} rows)" if stat else ""
+            if index:
+                warnings.append(f"Full scan of `{table}` through index `{index}`{estimate}: "
+                                "every index entry is visited.")
+            else:
+                warnings.append(f"Full scan of `{table}`{estimate}: every row is visited.")
+        return plan, warnings
+    finally:
+        guarded.close()
+
+def read_sql_page(sql: str, page: int, timeout: float):
+    """One page of a read query and whether more rows follow."""
+    guarded = open_read_only_connection()
+    try:
+        with sql_deadline(guarded, timeout):
+            # Plain cursor rather than pd.read_sql, which would hide the sqlite3 "interrupted" error
+            cur = guarded.execute(f"SELECT * FROM ({statement_body(sql)}) LIMIT ? OFFSET ?",
+                                  (SQL_PAGE_SIZE + 1, page * SQL_PAGE_SIZE))
+            rows = cur.fetchall()
+        columns = [column[0] for column in cur.description]
+    finally:
+        guarded.close()
+    return pd.DataFrame(rows[:SQL_PAGE_SIZE], columns=columns), len(rows) > SQL_PAGE_SIZE
+
+# A real dry run holds the write lock, and the writer gives up on it after its
+# 5 s busy_timeout, so it is only the fallback and never runs this long
+DRY_RUN_MAX_SECONDS = 1.5
+SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/|[()]|\w+", re.S)
+
+def top_level_words(sql: str):
+    """(offset, WORD) for every bare word outside quotes, comments and parentheses."""
+    depth, words = 0, []
+    for match in SQL_TOKEN.finditer(sql):
+        token = match.group()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and (token[0].isalnum() or token[0] == "_"):
+            words.append((match.start(), token.upper()))
+    return words
+
+def statement_body(sql: str) -> str:
+    """sql up to its last token, without the semicolons and comments after it, so it can be wrapped."""
+    end = 0
+    for match in SQL_TOKEN.finditer(sql):
+        if not match.group().startswith(("--", "/*")):
+            end = match.end()
+    return sql[:end]
+
+def count_rows_sql(sql: str):
+    """
+    A SELECT COUNT(*) over the rows an INSERT/REPLACE/UPDATE would write, or None
+    when the statement is too involved to rewrite (UPDATE ... FROM, LIMIT).
+    """
+    body = statement_body(sql)
+    words = top_level_words(body)
+    names = [word for _, word in words]
+
+    def find(*keywords, start=0):
+        return next((i for i in range(start, len(names)) if names[i] in keywords), None)
+
+    if names[:1] == ["UPDATE"]:
+        set_at = find("SET")
+        if set_at is None or find("FROM", "ORDER", "LIMIT", start=set_at) is not None:
+            return None
+        target_at = 3 if names[1:2] == ["OR"] else 1
+        target = body[words[target_at][0]:words[set_at][0]]
+        where_at = find("WHERE", start=set_at)
+        if where_at is None:
+            return f"SELECT COUNT(*) FROM {target}"
+        end_at = find("RETURNING", start=where_at)
+        condition = body[words[where_at][0] + len("WHERE"):words[end_at][0] if end_at else len(body)]
+        return f"SELECT COUNT(*) FROM {target} WHERE {condition}"
+    if names[:1] in (["INSERT"], ["REPLACE"]):
+        source_at = find("VALUES", "SELECT", "WITH", "DEFAULT")
+        if source_at is None:
+            return None
+        if names[source_at] == "DEFAULT":
+            return "SELECT 1"
+        end = len(body)
+        for i in range(source_at, len(names)):
+            if names[i] == "RETURNING" or names[i:i + 2] == ["ON", "CONFLICT"]:
+                end = words[i][0]
+                break
+        return f"SELECT COUNT(*) FROM ({body[words[source_at][0]:end]})"
+    return None
+
+def dry_run_sql(sql: str, timeout: float) -> int:
+    """
+    Rows a write would touch, without taking the write lock: a COUNT(*) over the
+    same target and WHERE clause (an upper bound when INSERT rows hit conflicts).
+    Statements that can't be rewritten run on the writer and are rolled back.
+    """
+    count_sql = count_rows_sql(sql)
+    if count_sql is not None:
+        guarded = open_read_only_connection()
+        try:
+            with sql_deadline(guarded, timeout):
+                return guarded.execute(count_sql).fetchone()[0]
+        finally:
+            guarded.close()
+
+    def rolled_back_write(cur):
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            with sql_deadline(cur.connection, min(timeout, DRY_RUN_MAX_SECONDS)):
+                return cur.execute(sql).rowcount
+        finally:
+            if cur.connection.in_transaction:
+                cur.execute("ROLLBACK")
+
+    return write_queue.submit(rolled_back_write, transactional=False).result(timeout=WRITE_TIMEOUT + DRY_RUN_MAX_SECONDS)
+
+def execute_guarded_write(sql: str, timeout: float) -> int:
+    def guarded_write(cur):
+        # An interrupted write rolls back its whole transaction, so it gets one of
+        # its own instead of joining a group commit with other sessions' changes
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            with sql_deadline(cur.connection, timeout):
+                affected = cur.execute(sql).rowcount
+            cur.execute("COMMIT")
+        except Exception:
+            if cur.connection.in_transaction:
+                cur.execute("ROLLBACK")
+            raise
+        return affected
+
+    return write_queue.submit(guarded_write, transactional=False).result(timeout=WRITE_TIMEOUT + timeout)
+
+# -----------------------------------------------------------
+# Batch Lookup (prefix search + cached summaries)
+# -----------------------------------------------------------
+BATCH_SEARCH_LIMIT = 20
+
+def prefix_range(prefix: str):
+    """[low, high) bounds matching every string that starts with prefix, so the index can seek."""
+    return (prefix, prefix + "\U0010ffff") if prefix else ("", "\U0010ffff")
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def find_batches(text: str, batch_prefix: str, data_version: tuple, limit: int = BATCH_SEARCH_LIMIT):
+    """
+    Batches whose name starts with text (or with the batch prefix + text, so
+    "12" finds "Batch-12"), most recently active first. data_version
+    (write_queue.version()) only keys the cache.
+    """
+    prefixes = {text}
+    if text and not text.startswith(batch_prefix):
+        prefixes.add(batch_prefix + text)
+    clauses, params = [], []
+    for prefix in prefixes:
+        low, high = prefix_range(prefix)
+        clauses.append("(batch_name >= ? AND batch_name < ?)")
+        params += [low, high]
+    rows = conn.execute(f"""
+        SELECT batch_name, MAX(created_at) AS last_at
+        FROM tickets
+        WHERE batch_name != '' AND ({" OR ".join(clauses)})
+        GROUP BY batch_name
+        ORDER BY last_at DESC
+        LIMIT ?
+    """, params + [limit]).fetchall()
+    return rows
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def batch_summary(batch_name: str, data_version: tuple) -> dict:
+    tickets, sub_tickets, value, first_at, last_at = conn.execute("""
+        SELECT COUNT(*), TOTAL(num_sub_tickets), TOTAL(num_sub_tickets * pay), MIN(created_at), MAX(created_at)
+        FROM tickets WHERE batch_name = ?
+    """, (batch_name,)).fetchone()
+    by_status = conn.execute(
+        "SELECT status_code, COUNT(*) FROM tickets WHERE batch_name = ? GROUP BY status_code", (batch_name,)
+    ).fetchall()
+    status_counts = {}
+    for code, count in by_status:
+        position = _STATUS_POSITIONS[code] if code is not None and 0 <= code < len(_STATUS_POSITIONS) else -1
+        label = STATUS_CATEGORIES[position] if position >= 0 else "Unknown"
+        status_counts[label] = status_counts.get(label, 0) + count
+    return {"tickets": tickets, "sub_tickets": int(sub_tickets), "value": value,
+            "first_at": first_at, "last_at": last_at, "status_counts": status_counts}
+
 # -----------------------------------------------------------
 # Manage Tickets Page
 # -----------------------------------------------------------
@@ -458,9 +3278,23 @@ def manage_tickets_page():
     # Tab 1: Search & Edit (Individual Ticket)
     with tab1:
         st.subheader("Individual Ticket Management")
-        ticket_number = st.text_input("Enter Ticket Number to Manage")
+        # text_input only reruns on Enter/blur, which debounces the search for us
+        search_text = st.text_input("Search Tickets",
+                                    placeholder="Ticket number (full or partial), school, day or comment text")
+        ticket_number = ""
+        if search_text.strip():
+            started = time.perf_counter()
+            df_matches = search_tickets(search_text)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if df_matches.empty:
+                st.warning("Ticket not found in database")
+            else:
+                st.caption(f"{len(df_matches)} match(es) in {elapsed_ms:.1f} ms")
+                df_matches = with_status_labels(df_matches)
+                st.dataframe(df_matches.drop(columns="id"), use_container_width=True)
+                ticket_number = st.selectbox("Ticket to Manage", df_matches["ticket_number"].tolist())
         if ticket_number:
-            ticket_data = pd.read_sql("SELECT * FROM tickets WHERE ticket_number = ?", conn, params=(ticket_number.strip(),))
+            ticket_data = load_tickets(["status", "num_sub_tickets", "pay"], "ticket_number = ?", (ticket_number.strip(),))
             if not ticket_data.empty:
                 current_status_db = ticket_data.iloc[0]['status']
                 current_status_ui = display_status(current_status_db)
@@ -475,11 +3309,10 @@ def manage_tickets_page():
                     new_subtickets = st.number_input("Sub-Tickets", min_value=1, value=int(ticket_data.iloc[0]['num_sub_tickets']))
                     new_price = st.number_input("Ticket Price", min_value=0.0, value=float(ticket_data.iloc[0]['pay']), step=0.5)
                     if st.form_submit_button("Update Ticket"):
-                        cursor.execute(
+                        write_queue.execute(
                             "UPDATE tickets SET status = ?, num_sub_tickets = ?, pay = ? WHERE ticket_number = ?",
                             (new_status_db, new_subtickets, new_price, ticket_number.strip())
-                        )
-                        conn.commit()
+                        ).result(timeout=WRITE_TIMEOUT)
                         st.success("Ticket updated successfully!")
                         if animations["success"]:
                             st_lottie(animations["success"], height=80)
@@ -493,14 +3326,7 @@ def manage_tickets_page():
         bulk_action = st.selectbox("Action", ["Update Status", "Change Price", "Add Subtickets"])
         if bulk_tickets:
             ticket_list = [t.strip() for t in bulk_tickets.split('\n') if t.strip()]
-            found_tickets = []
-            missing_tickets = []
-            for t in ticket_list:
-                cursor.execute("SELECT 1 FROM tickets WHERE ticket_number = ?", (t,))
-                if cursor.fetchone():
-                    found_tickets.append(t)
-                else:
-                    missing_tickets.append(t)
+            found_tickets, missing_tickets = split_existing(ticket_list)
             if missing_tickets:
                 st.warning(f"{len(missing_tickets)} tickets not found: {', '.join(missing_tickets[:3])}{'...' if len(missing_tickets) > 3 else ''}")
             if found_tickets:
@@ -510,24 +3336,25 @@ def manage_tickets_page():
                     new_status_label = st.selectbox("New Status", status_display_list)
                     new_status_db = get_db_status_from_display(new_status_label)
                     if st.button("Update Status for All Found Tickets"):
-                        for t in found_tickets:
-                            cursor.execute("UPDATE tickets SET status = ? WHERE ticket_number = ?", (new_status_db, t))
-                        conn.commit()
-                        st.success(f"Updated {len(found_tickets)} tickets to {new_status_label} status")
+                        job_submitted_notice(job_runner.submit(
+                            "bulk_update", f"Set {len(found_tickets)} tickets to {new_status_label}",
+                            lambda job: update_tickets_job(job, "status = ?", (new_status_db,), "ticket_number", found_tickets)
+                        ))
                 elif bulk_action == "Change Price":
                     new_price = st.number_input("New Price", min_value=0.0, value=st.session_state.ticket_price)
                     if st.button("Update Price for All Found Tickets"):
-                        for t in found_tickets:
-                            cursor.execute("UPDATE tickets SET pay = ? WHERE ticket_number = ?", (new_price, t))
-                        conn.commit()
-                        st.success(f"Updated pricing for {len(found_tickets)} tickets")
+                        job_submitted_notice(job_runner.submit(
+                            "bulk_update", f"Set price {new_price} on {len(found_tickets)} tickets",
+                            lambda job: update_tickets_job(job, "pay = ?", (new_price,), "ticket_number", found_tickets)
+                        ))
                 elif bulk_action == "Add Subtickets":
                     add_count = st.number_input("Additional Subtickets", min_value=1, value=1)
                     if st.button("Add Subtickets to All Found Tickets"):
-                        for t in found_tickets:
-                            cursor.execute("UPDATE tickets SET num_sub_tickets = num_sub_tickets + ? WHERE ticket_number = ?", (add_count, t))
-                        conn.commit()
-                        st.success(f"Added {add_count} subtickets to {len(found_tickets)} tickets")
+                        job_submitted_notice(job_runner.submit(
+                            "bulk_update", f"Add {add_count} subtickets to {len(found_tickets)} tickets",
+                            lambda job: update_tickets_job(job, "num_sub_tickets = num_sub_tickets + ?", (add_count,),
+                                                           "ticket_number", found_tickets)
+                        ))
     
     # Tab 3: Delete Tickets
     with tab3:
@@ -536,18 +3363,21 @@ def manage_tickets_page():
         if delete_option == "Single Ticket":
             del_ticket = st.text_input("Enter Ticket Number to Delete")
             if del_ticket and st.button("Delete Ticket"):
-                cursor.execute("DELETE FROM tickets WHERE ticket_number = ?", (del_ticket.strip(),))
-                conn.commit()
-                if cursor.rowcount > 0:
+                deleted = write_queue.execute(
+                    "DELETE FROM tickets WHERE ticket_number = ?", (del_ticket.strip(),)
+                ).result(timeout=WRITE_TIMEOUT)
+                if deleted > 0:
                     st.success("Ticket deleted successfully")
                 else:
                     st.error("Ticket not found")
         elif delete_option == "By Batch":
             batch_name = st.text_input("Enter Batch Name to Delete")
             if batch_name and st.button("Delete Entire Batch"):
-                cursor.execute("DELETE FROM tickets WHERE batch_name = ?", (batch_name.strip(),))
-                conn.commit()
-                st.success(f"Deleted {cursor.rowcount} tickets from batch {batch_name}")
+                batch_name = batch_name.strip()
+                job_submitted_notice(job_runner.submit(
+                    "delete_batch", f"Delete batch {batch_name}",
+                    lambda job: delete_tickets_job(job, "batch_name = ?", (batch_name,))
+                ))
         elif delete_option == "By Date Range":
             col_date1, col_date2 = st.columns(2)
             with col_date1:
@@ -555,59 +3385,128 @@ def manage_tickets_page():
             with col_date2:
                 end_date = st.date_input("End Date")
             if st.button("Delete Tickets in Date Range"):
-                cursor.execute("DELETE FROM tickets WHERE date BETWEEN ? AND ?", (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
-                conn.commit()
-                st.success(f"Deleted {cursor.rowcount} tickets from {start_date} to {end_date}")
+                range_params = epoch_range(start_date, end_date)
+                job_submitted_notice(job_runner.submit(
+                    "delete_range", f"Delete tickets from {start_date} to {end_date}",
+                    lambda job: delete_tickets_job(job, "created_at >= ? AND created_at < ?", range_params)
+                ))
     
     # Tab 4: Manage Tickets By Batch
     with tab4:
-        st.subheader("Manage Tickets By Batch Name")
-        cursor.execute("SELECT DISTINCT batch_name FROM tickets")
-        batch_rows = cursor.fetchall()
-        batch_names = [row[0] for row in batch_rows if row[0]]
-        if batch_names:
-            selected_batch = st.selectbox("Select a Batch to Manage", batch_names)
-            if selected_batch:
-                df_batch = pd.read_sql("SELECT * FROM tickets WHERE batch_name = ?", conn, params=(selected_batch,))
-                df_batch['status'] = df_batch['status'].apply(display_status)
-                st.dataframe(df_batch, use_container_width=True)
-
-                # Bulk update of the entire batch to a single status
-                status_display_list = [display_status(s) for s in AVAILABLE_STATUSES]
-                new_status_label = st.selectbox("New Status for All Tickets in This Batch", status_display_list)
-                new_status_db = get_db_status_from_display(new_status_label)
-                if st.button("Update All Tickets in Batch"):
-                    cursor.execute("UPDATE tickets SET status = ? WHERE batch_name = ?", (new_status_db, selected_batch))
-                    conn.commit()
-                    st.success(f"All tickets in batch '{selected_batch}' updated to '{new_status_label}'!")
-                    
-                    # Show updated data
-                    df_batch = pd.read_sql("SELECT * FROM tickets WHERE batch_name = ?", conn, params=(selected_batch,))
-                    df_batch['status'] = df_batch['status'].apply(display_status)
-                    st.dataframe(df_batch, use_container_width=True)
-        else:
-            st.info("No batches found in the database.")
+        manage_batch_tab()
     
-    # Tab 5: Custom SQL Query Insert/Update
+    # Tab 5: Custom SQL Query (guarded)
     with tab5:
-        st.subheader("Custom SQL Query Insert/Update")
-        st.write("Enter a valid SQL query (only INSERT or UPDATE queries are allowed) to update the tickets table. "
-                 "This will modify ticket records and changes will reflect in the Intake, Ready to Deliver, and Delivered views.")
+        st.subheader("Custom SQL Query")
+        st.write("Enter a single SELECT, INSERT or UPDATE statement. SELECTs run read-only and are paged; "
+                 "INSERT/UPDATE modify ticket records and changes will reflect in the Intake, Ready to Deliver, and Delivered views. "
+                 "Every statement is stopped when it exceeds the time limit.")
         sql_query = st.text_area("SQL Query", height=150,
                                  placeholder="e.g., INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay) VALUES ('2025-03-24', '12:34:56', 'Batch-100', 'TICKET123', 1, 'Intake', 5.5)")
-        if st.button("Execute SQL Query"):
-            if sql_query.strip():
+        sql_timeout = st.slider("Time Limit (seconds)", min_value=1, max_value=30, value=5)
+        sql_kind = sql_statement_kind(sql_query) if sql_query.strip() else None
+        if sql_query.strip():
+            if sql_kind is None:
+                st.error("Only SELECT, INSERT or UPDATE statements are allowed here.")
+            else:
                 try:
-                    cursor.execute(sql_query)
-                    conn.commit()
-                    st.success(f"Query executed successfully. Rows affected: {cursor.rowcount}")
+                    plan, scan_warnings = explain_sql(sql_query)
+                    with st.expander("Query Plan", expanded=bool(scan_warnings)):
+                        st.code("\n".join(plan) or "(no plan rows)", language="text")
+                    for warning in scan_warnings:
+                        st.warning(warning)
+                except sqlite3.Error as e:
+                    st.error(f"Cannot plan this query: {e}")
+                    sql_kind = None
+
+        if sql_kind == "read":
+            if st.button("Run Query"):
+                st.session_state.sql_result = {"sql": sql_query, "page": 0}
+        elif sql_kind == "write":
+            col_dry, col_exec = st.columns(2)
+            if col_dry.button("Dry Run"):
+                try:
+                    would_change = dry_run_sql(sql_query, sql_timeout)
+                    st.info(f"Dry run: {would_change} row(s) would be affected. Nothing was changed.")
+                except sqlite3.OperationalError as e:
+                    if "interrupted" in str(e):
+                        st.error("Dry run stopped at its time limit; nothing was changed.")
+                    else:
+                        st.error(f"Dry run failed: {e}")
+                except sqlite3.Error as e:
+                    st.error(f"Dry run failed: {e}")
+            if col_exec.button("Execute SQL Query"):
+                try:
+                    affected = execute_guarded_write(sql_query, sql_timeout)
+                    st.success(f"Query executed successfully. Rows affected: {affected}")
+                except sqlite3.OperationalError as e:
+                    if "interrupted" in str(e):
+                        st.error(f"Query stopped after {sql_timeout} s and was rolled back.")
+                    else:
+                        st.error(f"Error executing query: {e}")
                 except Exception as e:
                     st.error(f"Error executing query: {e}")
-            else:
-                st.warning("Please enter a SQL query.")
+
+        sql_result = st.session_state.get("sql_result")
+        if sql_result and sql_result["sql"] == sql_query:
+            try:
+                df_page, has_more = read_sql_page(sql_query, sql_result["page"], sql_timeout)
+                first_row = sql_result["page"] * SQL_PAGE_SIZE
+                st.caption(f"Rows {first_row + 1 if len(df_page) else 0}–{first_row + len(df_page)}")
+                st.dataframe(df_page, use_container_width=True)
+                col_prev, col_next = st.columns(2)
+                if col_prev.button("◀ Previous Page", disabled=sql_result["page"] == 0):
+                    sql_result["page"] -= 1
+                    st.rerun()
+                if col_next.button("Next Page ▶", disabled=not has_more):
+                    sql_result["page"] += 1
+                    st.rerun()
+            except sqlite3.Error as e:
+                if "interrupted" in str(e):
+                    st.error(f"Query stopped after {sql_timeout} s. Narrow it down or raise the time limit.")
+                else:
+                    st.error(f"Error running query: {e}")
     
     st.markdown("---")
 
+@st.fragment
+def manage_batch_tab():
+    # A fragment, so typing in the finder does not rerun the other Manage tabs
+    st.subheader("Manage Tickets By Batch Name")
+    batch_query = st.text_input("Find Batch", placeholder="Start of a batch name (e.g. Batch-12 or just 12); most recent first")
+    matches = find_batches(batch_query.strip(), st.session_state.batch_prefix, write_queue.version())
+    if not matches:
+        st.info("No batches found in the database." if not batch_query.strip() else "No batch names start with that.")
+        return
+    last_active = dict(matches)
+    selected_batch = st.selectbox(
+        "Select a Batch to Manage", list(last_active),
+        format_func=lambda name: f"{name} · last ticket "
+                                 f"{datetime.datetime.fromtimestamp(last_active[name]):%Y-%m-%d %H:%M}"
+                                 if last_active[name] else name
+    )
+    summary = batch_summary(selected_batch, write_queue.version())
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Tickets", summary["tickets"])
+    col2.metric("Sub-Tickets", summary["sub_tickets"])
+    col3.metric("Value", f"${summary['value']:,.2f}")
+    col4.metric("Active For", format_duration((summary["last_at"] or 0) - (summary["first_at"] or 0)))
+    st.caption(" · ".join(f"{label}: {count}" for label, count in summary["status_counts"].items()))
+    if st.toggle("Show tickets in this batch", key="show_batch_tickets"):
+        df_batch = load_tickets(TICKET_VIEW_COLUMNS, "batch_name = ?", (selected_batch,), order_by="created_at")
+        st.dataframe(df_batch, use_container_width=True, column_config=TICKET_COLUMN_CONFIG)
+
+    # Bulk update of the entire batch to a single status
+    status_display_list = [display_status(s) for s in AVAILABLE_STATUSES]
+    new_status_label = st.selectbox("New Status for All Tickets in This Batch", status_display_list)
+    new_status_db = get_db_status_from_display(new_status_label)
+    if st.button("Update All Tickets in Batch"):
+        batch_ids = [row[0] for row in conn.execute("SELECT id FROM tickets WHERE batch_name = ?", (selected_batch,))]
+        job_submitted_notice(job_runner.submit(
+            "batch_update", f"Set batch '{selected_batch}' to {new_status_label}",
+            lambda job: update_tickets_job(job, "status = ?", (new_status_db,), "id", batch_ids)
+        ))
+
 # -----------------------------------------------------------
 # BULK TICKET COMPARISON PAGE
 # -----------------------------------------------------------
@@ -639,12 +3538,14 @@ def bulk_ticket_comparison_page():
             st.warning("No valid ticket numbers found in the text area.")
             return
 
-        df_db_tickets = pd.read_sql("SELECT ticket_number FROM tickets", conn)
-        db_tickets = set(df_db_tickets["ticket_number"].tolist())
+        # Both directions are answered from the in-memory ticket index
+        user_numbers = np.array(sorted(user_tickets), dtype=str)
+        exists = ticket_index.contains(user_numbers)
+        db_numbers = ticket_index.numbers()
 
-        missing_in_db = user_tickets - db_tickets
-        extra_in_db = db_tickets - user_tickets
-        matches = user_tickets & db_tickets
+        missing_in_db = set(user_numbers[~exists].tolist())
+        extra_in_db = set(db_numbers[~np.isin(db_numbers, user_numbers)].tolist())
+        matches = set(user_numbers[exists].tolist())
 
         colA, colB, colC = st.columns(3)
         colA.metric("Missing in DB", len(missing_in_db))
@@ -664,20 +3565,16 @@ def bulk_ticket_comparison_page():
             st.write("### Tickets in DB But Not in Your List")
             st.write(", ".join(sorted(extra_in_db)))
             placeholders = ",".join(["?"] * len(extra_in_db))
-            query_extra = f"SELECT * FROM tickets WHERE ticket_number IN ({placeholders})"
-            df_extra = pd.read_sql(query_extra, conn, params=list(extra_in_db))
-            df_extra["status"] = df_extra["status"].apply(display_status)
-            st.dataframe(df_extra, use_container_width=True)
+            df_extra = load_tickets(TICKET_VIEW_COLUMNS, f"ticket_number IN ({placeholders})", list(extra_in_db))
+            st.dataframe(df_extra, use_container_width=True, column_config=TICKET_COLUMN_CONFIG)
         else:
             st.info("No extra tickets found in DB.")
 
         if matches:
             st.write("### Matched Tickets (In Both Lists)")
             placeholders = ",".join(["?"] * len(matches))
-            query = f"SELECT * FROM tickets WHERE ticket_number IN ({placeholders})"
-            df_matched = pd.read_sql(query, conn, params=list(matches))
-            df_matched["status"] = df_matched["status"].apply(display_status)
-            st.dataframe(df_matched, use_container_width=True)
+            df_matched = load_tickets(TICKET_VIEW_COLUMNS, f"ticket_number IN ({placeholders})", list(matches))
+            st.dataframe(df_matched, use_container_width=True, column_config=TICKET_COLUMN_CONFIG)
         else:
             st.info("No tickets were found in both lists.")
 
@@ -699,45 +3596,45 @@ def sql_query_converter_page():
     target_status_db = get_db_status_from_display(target_status_label)
     
     if st.button("Generate and Execute SQL Query"):
-        lines = raw_text.strip().splitlines()
-        ticket_numbers = []
-        for line in lines:
-            line = line.strip()
-            if " - " in line:
-                tnum = line.split(" - ")[0].strip()
-                ticket_numbers.append(tnum)
-            else:
-                # Fallback: take the first word of the line, if any
-                parts = line.split()
-                if parts:
-                    ticket_numbers.append(parts[0].strip())
+        entries = [entry for entry in map(parse_ticket_line, raw_text.strip().splitlines()) if entry]
+        ticket_numbers = [number for number, _ in entries]
 
         if ticket_numbers:
             # We'll do two steps:
-            # 1) INSERT OR IGNORE any that don't exist
+            # 1) INSERT OR IGNORE any that don't exist (recording the school of ones that do)
             # 2) UPDATE status
-            now_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            now_time = datetime.datetime.now().strftime("%H:%M:%S")
+            now_date, now_time, created_at = ticket_timestamp()
             insert_sql = """
-                INSERT OR IGNORE INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay)
-                VALUES (?, ?, ?, ?, 1, 'Intake', ?)
+                INSERT OR IGNORE INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay,
+                                               ticket_school, ticket_day, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 1, 'Intake', ?, ?, ?, ?, ?)
             """
-            for tkt in ticket_numbers:
-                try:
-                    cursor.execute(insert_sql, (now_date, now_time, "Auto-Batch", tkt, st.session_state.ticket_price))
-                except Exception as e:
-                    st.error(f"Error inserting ticket {tkt}: {e}")
-            conn.commit()
+            price = st.session_state.ticket_price
+            weekday = ticket_weekday(now_date)
+            insert_future = write_queue.executemany(
+                insert_sql, [(now_date, now_time, "Auto-Batch", tkt, price, school, weekday, created_at, created_at)
+                             for tkt, school in entries]
+            )
+            # Tickets that already existed pick up the school named in the pasted line
+            school_future = write_queue.executemany(
+                "UPDATE tickets SET ticket_school = ? WHERE ticket_number = ? AND ticket_school IS NOT ?",
+                [(school, tkt, school) for tkt, school in entries if school]
+            )
 
-            # 2) Update to the chosen status
+            # 2) Update to the chosen status (queued right behind the inserts)
             placeholders = ",".join(["?"] * len(ticket_numbers))
             update_sql = f"UPDATE tickets SET status = ? WHERE ticket_number IN ({placeholders})"
             params = [target_status_db] + ticket_numbers
+            update_future = write_queue.execute(update_sql, params)
             try:
-                cursor.execute(update_sql, params)
-                conn.commit()
+                insert_future.result(timeout=WRITE_TIMEOUT)
+                school_future.result(timeout=WRITE_TIMEOUT)
+            except Exception as e:
+                st.error(f"Error inserting tickets: {e}")
+            try:
+                updated = update_future.result(timeout=WRITE_TIMEOUT)
                 st.success(
-                    f"Inserted/updated {cursor.rowcount} tickets to '{target_status_label}'."
+                    f"Inserted/updated {updated} tickets to '{target_status_label}'."
                 )
             except Exception as e:
                 st.error(f"Error updating tickets to '{target_status_label}': {e}")
@@ -752,29 +3649,28 @@ def batch_view_page():
     st.write("""Each batch is shown under the tab that matches its **single** status. 
     If a batch has multiple ticket statuses, it is shown as "Mixed" in the Mixed tab.""")
     
-    df_batches = pd.read_sql(
+    df_batches = cached_read_sql(
         """
         SELECT batch_name, 
-               GROUP_CONCAT(DISTINCT status) as statuses,
+               COUNT(DISTINCT status_code) as status_count,
+               MIN(status_code) as status_code,
                SUM(num_sub_tickets) as total_tickets,
                GROUP_CONCAT(ticket_number) as ticket_numbers
         FROM tickets
         GROUP BY batch_name
-        """, conn
+        """
     )
     if df_batches.empty:
         st.info("No batches found.")
         return
     
     # Compute whether each batch has exactly 1 status or multiple
-    def get_batch_primary_status(row):
-        stat_list = row["statuses"].split(",")
-        stat_list = list(set(stat_list))  # unique
-        if len(stat_list) == 1:
-            return stat_list[0]  # the single status
-        return "Mixed"
-
-    df_batches["batch_status"] = df_batches.apply(get_batch_primary_status, axis=1)
+    status_names = {code: name for name, code in STATUS_CODES.items()}
+    df_batches["batch_status"] = np.where(
+        df_batches["status_count"] == 1,
+        df_batches["status_code"].map(status_names),
+        "Mixed"
+    )
 
     # We create a tab for each known status + a "Mixed" tab
     known_statuses = AVAILABLE_STATUSES + ["Mixed"]
@@ -793,16 +3689,11 @@ def batch_view_page():
             cols = st.columns(3)
             for idx, row in df_filtered.iterrows():
                 bname = row["batch_name"]
-                statuses_raw = row["statuses"]
                 total_tickets = row["total_tickets"]
                 tnumbers = row["ticket_numbers"]
 
                 # If there's exactly 1 status, display the label; else "Mixed"
-                if statuses_raw and "," in statuses_raw:
-                    # multiple distinct statuses
-                    status_label = "Mixed"
-                else:
-                    status_label = display_status(statuses_raw)
+                status_label = display_status(row["batch_status"])
 
                 with cols[idx % 3]:
                     st.markdown(f"""
@@ -847,8 +3738,8 @@ def batch_view_page():
         bname = st.session_state["edit_batch"]
         st.markdown("---")
         st.markdown(f"## Update Batch Status for: **{bname}**")
-        df_b = pd.read_sql("SELECT * FROM tickets WHERE batch_name = ?", conn, params=(bname,))
-        st.dataframe(df_b, use_container_width=True)
+        df_b = load_tickets(TICKET_VIEW_COLUMNS, "batch_name = ?", (bname,))
+        st.dataframe(df_b, use_container_width=True, column_config=TICKET_COLUMN_CONFIG)
 
         # Let user pick new status
         status_display_list = [display_status(s) for s in AVAILABLE_STATUSES]
@@ -856,17 +3747,228 @@ def batch_view_page():
         new_status_db = get_db_status_from_display(new_status_label)
 
         if st.button("Confirm Status Update"):
-            cursor.execute("UPDATE tickets SET status = ? WHERE batch_name = ?", (new_status_db, bname))
-            conn.commit()
+            write_queue.execute(
+                "UPDATE tickets SET status = ? WHERE batch_name = ?", (new_status_db, bname)
+            ).result(timeout=WRITE_TIMEOUT)
             st.success(f"All tickets in batch '{bname}' updated to '{new_status_label}'.")
             # Clear from session
             st.session_state["edit_batch"] = None
             st.session_state["edit_batch_status"] = None
             st.experimental_rerun()
 
+# -----------------------------------------------------------
+# School Breakdown
+# -----------------------------------------------------------
+# school_daily is kept current by triggers, so the report job only reads a
+# few rows per school and day. Trends for every school come out of one
+# matrix product; the result lands in school_report and the page just reads
+# that table, regenerating in the background when tickets have changed.
+SCHOOL_TREND_WEEKS = 12
+SCHOOL_REPORT_RETRY_SECONDS = 300
+UNKNOWN_SCHOOL = "(no school)"
+
+def school_report_job(job):
+    # Stamped before reading, so a change made while the job runs still marks the report stale
+    generated_at = int(time.time())
+    reader = get_db_connection()
+    try:
+        job.progress(0.1, "Reading per-school totals")
+        totals = pd.read_sql("""
+            SELECT school, SUM(tickets) AS tickets, SUM(sub_tickets) AS sub_tickets,
+                   SUM(delivered_sub_tickets) AS delivered_sub_tickets, SUM(earned_cents) / 100.0 AS income,
+                   MIN(date) AS first_date, MAX(date) AS last_date
+            FROM school_daily
+            GROUP BY school
+            HAVING SUM(tickets) > 0
+        """, reader)
+        # Whole weeks only; the running week would drag every trend down
+        week_end = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
+        week_start = week_end - datetime.timedelta(weeks=SCHOOL_TREND_WEEKS)
+        recent = pd.read_sql("SELECT school, date, sub_tickets FROM school_daily WHERE date >= ? AND date < ?",
+                             reader, params=[week_start.isoformat(), week_end.isoformat()])
+    finally:
+        reader.close()
+
+    job.progress(0.5, f"Computing trends for {len(totals)} schools")
+    # schools x weeks grid of sub-tickets, then the least-squares slope of every row at once
+    grid = np.zeros((len(totals), SCHOOL_TREND_WEEKS))
+    rows = pd.Index(totals["school"]).get_indexer(recent["school"])
+    weeks = ((pd.to_datetime(recent["date"]) - pd.Timestamp(week_start)).dt.days // 7).to_numpy()
+    keep = rows >= 0
+    np.add.at(grid, (rows[keep], weeks[keep]), recent["sub_tickets"].to_numpy()[keep])
+    x = np.arange(SCHOOL_TREND_WEEKS) - (SCHOOL_TREND_WEEKS - 1) / 2
+    totals["weekly_trend"] = grid @ x / (x @ x)
+    totals["delivery_rate"] = np.where(totals["sub_tickets"] > 0,
+                                       totals["delivered_sub_tickets"] / totals["sub_tickets"].where(totals["sub_tickets"] > 0, 1), 0.0)
+
+    columns = ["school", "tickets", "sub_tickets", "delivered_sub_tickets", "delivery_rate", "income",
+               "weekly_trend", "first_date", "last_date"]
+    records = [(*row, generated_at) for row in totals[columns].itertuples(index=False, name=None)]
+
+    def store_report(cur):
+        cur.execute("DELETE FROM school_report")
+        cur.executemany(f"INSERT INTO school_report ({', '.join(columns)}, generated_at) "
+                        f"VALUES ({', '.join('?' * (len(columns) + 1))})", records)
+
+    job.progress(0.9, "Saving the report")
+    write_queue.submit(store_report).result(timeout=WRITE_TIMEOUT)
+    job.progress(1.0, f"Reported on {len(records)} school(s)")
+    return {"schools": len(records), "generated_at": generated_at}
+
+@st.cache_data
+def load_school_report(generated_at: int):
+    df = pd.read_sql("SELECT * FROM school_report ORDER BY income DESC, tickets DESC", conn)
+    df["school"] = df["school"].replace("", UNKNOWN_SCHOOL)
+    return df
+
+def school_report_status():
+    """(generated_at, stale, job running, error of a recent failed run) for the stored report."""
+    generated_at = conn.execute("SELECT MAX(generated_at) FROM school_report").fetchone()[0]
+    changed_at = conn.execute("""
+        SELECT MAX(COALESCE((SELECT MAX(local_changed_at) FROM tickets), 0),
+                   COALESCE((SELECT MAX(local_changed_at) FROM ticket_tombstones), 0))
+    """).fetchone()[0]
+    running = conn.execute(
+        "SELECT 1 FROM jobs WHERE kind = 'school_report' AND status IN ('queued', 'running') LIMIT 1"
+    ).fetchone() is not None
+    last = conn.execute(
+        "SELECT status, finished_at, error FROM jobs WHERE kind = 'school_report' ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    failure = None
+    if last is not None and last[0] == "failed" and (last[1] or 0) > time.time() - SCHOOL_REPORT_RETRY_SECONDS:
+        failure = last[2] or "unknown error"
+    return generated_at, generated_at is None or changed_at > generated_at, running, failure
+
+def schools_page():
+    st.markdown("## 🏫 School Breakdown")
+    st.write("Tickets, delivery rate, income and the recent weekly trend for every school, taken from the "
+             "school named in each ticket line (\"125633 - School / Device\").")
+
+    generated_at, stale, running, failure = school_report_status()
+    if failure is not None and not running:
+        # Retrying on every rerun would only pile up failed jobs; wait or let the user retry
+        st.error(f"The last school report run failed: {failure}")
+    elif stale and not running:
+        job_runner.submit("school_report", "Generate school report", school_report_job)
+        running = True
+    if running:
+        # Swap in the new report as soon as the background job stores it
+        @st.fragment(run_every=2)
+        def report_watcher():
+            if conn.execute("SELECT MAX(generated_at) FROM school_report").fetchone()[0] != generated_at:
+                st.rerun()
+        report_watcher()
+    if generated_at is None:
+        if running:
+            st.info("Generating the first school report in the background…")
+        elif st.button("Retry"):
+            job_runner.submit("school_report", "Generate school report", school_report_job)
+            st.rerun()
+        return
+
+    df = load_school_report(generated_at)
+    col_note, col_button = st.columns([4, 1])
+    col_note.caption(f"Report generated {format_duration(time.time() - generated_at)} ago"
+                     + (" — updating in the background." if running else "."))
+    if col_button.button("Regenerate", disabled=running):
+        job_runner.submit("school_report", "Generate school report", school_report_job)
+        st.rerun()
+
+    known = df[df["school"] != UNKNOWN_SCHOOL]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Schools", len(known))
+    col2.metric("Sub-Tickets", f"{int(df['sub_tickets'].sum()):,}")
+    total_subs = df["sub_tickets"].sum()
+    col3.metric("Delivery Rate", f"{df['delivered_sub_tickets'].sum() / total_subs:.0%}" if total_subs else "—")
+    col4.metric("Income", f"${df['income'].sum():,.2f}")
+
+    query = st.text_input("Filter schools", placeholder="Part of a school name")
+    shown = df[df["school"].str.contains(query, case=False, regex=False)] if query else df
+    table = shown.assign(delivery_rate=shown["delivery_rate"] * 100)[
+        ["school", "tickets", "sub_tickets", "delivery_rate", "income", "weekly_trend", "first_date", "last_date"]]
+    st.dataframe(table, use_container_width=True, hide_index=True, column_config={
+        "school": "School",
+        "tickets": "Tickets",
+        "sub_tickets": "Sub-Tickets",
+        "delivery_rate": st.column_config.ProgressColumn("Delivered", min_value=0, max_value=100, format="%.0f%%"),
+        "income": st.column_config.NumberColumn("Income", format="$%.2f"),
+        "weekly_trend": st.column_config.NumberColumn(
+            "Trend", format="%+.2f", help=f"Change in sub-tickets per week over the last {SCHOOL_TREND_WEEKS} full weeks"),
+        "first_date": "First Ticket",
+        "last_date": "Last Ticket",
+    })
+
+    st.subheader("Trend and Weekday Breakdown")
+    school = st.selectbox("School", ["All schools"] + df["school"].tolist())
+    where, params = ("", []) if school == "All schools" else \
+        ("WHERE school = ?", ["" if school == UNKNOWN_SCHOOL else school])
+    col_week, col_day = st.columns(2)
+    with col_week:
+        weekly = cached_read_sql(f"""
+            SELECT {TIME_BUCKETS["Week"]} AS week, SUM(sub_tickets) AS sub_tickets,
+                   SUM(delivered_sub_tickets) AS delivered
+            FROM school_daily {where}
+            GROUP BY 1 ORDER BY 1
+        """, params)
+        fig = figure_cache.get_or_build("school_weekly", {"school": school}, lambda: px.line(
+            weekly, x="week", y=["sub_tickets", "delivered"], title="Sub-Tickets per Week",
+            labels={"week": "Week", "value": "Sub-Tickets", "variable": ""}))
+        st.plotly_chart(fig, use_container_width=True)
+    with col_day:
+        weekday_sql = " ".join(f"WHEN '{n}' THEN {(n + 6) % 7}" for n in range(7))
+        by_day = cached_read_sql(f"""
+            SELECT CASE strftime('%w', date) {weekday_sql} END AS weekday_index,
+                   SUM(sub_tickets) AS sub_tickets, SUM(delivered_sub_tickets) AS delivered
+            FROM school_daily {where}
+            GROUP BY 1 ORDER BY 1
+        """, params)
+        by_day["weekday"] = [WEEKDAYS[i] for i in by_day["weekday_index"]]
+        fig = figure_cache.get_or_build("school_weekday", {"school": school}, lambda: px.bar(
+            by_day, x="weekday", y=["sub_tickets", "delivered"], barmode="group", title="Sub-Tickets by Weekday",
+            labels={"weekday": "", "value": "Sub-Tickets", "variable": ""}))
+        st.plotly_chart(fig, use_container_width=True)
+
 # -----------------------------------------------------------
 # Income Page
 # -----------------------------------------------------------
+def ledger_income(start_date, end_date, resolution: str):
+    """
+    Earned income per bucket between two dates, read from the ledger.
+    Closed months that lie wholly inside the range are taken from their
+    snapshot; the rest comes from the per-day ledger. Returns the frame,
+    the booked total and how far closed months have drifted since closing.
+    """
+    start, end = start_date.isoformat(), end_date.isoformat()
+    closed = cached_read_sql("""
+        SELECT p.month || '-01' AS date, p.earned_cents, p.sub_tickets,
+               (SELECT TOTAL(d.earned_cents) FROM ledger_daily d
+                WHERE d.date >= p.month || '-01' AND d.date < date(p.month || '-01', '+1 month')) AS current_cents
+        FROM ledger_periods p
+        WHERE p.month >= substr(?, 1, 7) AND p.month <= substr(?, 1, 7)
+          AND p.month || '-01' >= ? AND date(p.month || '-01', '+1 month', '-1 day') <= ?
+    """, params=[start, end, start, end])
+    closed_months = set(closed["date"].str[:7])
+
+    # Buckets at month resolution can use the snapshots directly; finer ones need the days
+    daily = cached_read_sql(f"""
+        SELECT {TIME_BUCKETS[resolution]} AS date, substr(date, 1, 7) AS month,
+               TOTAL(earned_cents) AS earned_cents
+        FROM ledger_daily
+        WHERE date >= ? AND date <= ?
+        GROUP BY 1, 2
+        HAVING TOTAL(earned_cents) != 0 OR TOTAL(sub_tickets) != 0
+    """, params=[start, end])
+    open_days = daily[~daily["month"].isin(closed_months)]
+    booked_cents = closed["earned_cents"].sum() + open_days["earned_cents"].sum()
+    adjustment_cents = (closed["current_cents"] - closed["earned_cents"]).sum()
+
+    if resolution == "Month":
+        daily = pd.concat([open_days[["date", "earned_cents"]],
+                           closed.loc[closed["sub_tickets"] != 0, ["date", "earned_cents"]]])
+    frame = (daily.groupby("date", as_index=False)["earned_cents"].sum()
+             .assign(day_earnings=lambda f: f["earned_cents"].astype(float) / 100)[["date", "day_earnings"]])
+    return frame, booked_cents / 100, adjustment_cents / 100
+
 def income_page():
     col_anim, col_title = st.columns([1, 5])
     with col_anim:
@@ -882,57 +3984,55 @@ def income_page():
         start_date = st.date_input("Start Date", datetime.date.today() - datetime.timedelta(days=30))
     with col_date2:
         end_date = st.date_input("End Date", datetime.date.today())
+    resolution = pick_resolution(start_date, end_date, resolution_picker("income_resolution"))
+    period = resolution.lower()
     
-    query_delivered = """
-        SELECT date,
-               SUM(num_sub_tickets * pay) AS day_earnings
-        FROM tickets
-        WHERE status='Delivered' AND date BETWEEN ? AND ?
-        GROUP BY date
-        ORDER BY date ASC
-    """
-    df_income = pd.read_sql(query_delivered, conn, params=[start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")])
-    
-    query_pending = """
-        SELECT SUM(num_sub_tickets * pay) AS pending_income
-        FROM tickets
-        WHERE status != 'Delivered'
-    """
-    df_pending = pd.read_sql(query_pending, conn)
-    pending_income = df_pending.iloc[0]['pending_income'] or 0
+    # day_earnings holds the earnings of each bucket (day, week or month)
+    df_income, total_received, adjustments = ledger_income(start_date, end_date, resolution)
+    pending_income = conn.execute("SELECT pending_cents FROM ledger_balance WHERE id = 1").fetchone()[0] / 100
 
     if not df_income.empty:
         df_income['date'] = pd.to_datetime(df_income['date'])
         df_income.sort_values("date", inplace=True)
-        
-        fig = px.area(df_income, x="date", y="day_earnings", title="Daily Earnings Trend",
-                      labels={"day_earnings": "Earnings ($)", "date": "Date"})
+
+        # Simple linear forecast
+        forecast_dates, forecast_y = [], []
+        if len(df_income) > 1:
+            x = df_income["date"].map(datetime.datetime.toordinal).values
+            y = df_income["day_earnings"].values
+            coeffs = np.polyfit(x, y, 1)
+            poly = np.poly1d(coeffs)
+            last_date = df_income["date"].max()
+            # Step forward one bucket at a time so the forecast matches the chart resolution
+            forecast_dates = list(pd.date_range(last_date, periods=8, freq=BUCKET_FREQ[resolution])[1:])
+            forecast_x = [d.toordinal() for d in forecast_dates]
+            forecast_y = poly(forecast_x)
+
+        # One figure with the forecast trace already added, rendered once
+        def build_earnings_chart():
+            plot_dates, plot_earnings = downsample_line(df_income["date"], df_income["day_earnings"])
+            fig = px.area(x=plot_dates, y=plot_earnings, title=f"{BUCKET_ADJECTIVE[resolution]} Earnings Trend",
+                          labels={"y": "Earnings ($)", "x": "Date"})
+            if forecast_dates:
+                fig.add_trace(go.Scatter(x=forecast_dates, y=forecast_y, mode='lines+markers', name="Forecast"))
+            return fig
+
+        fig = figure_cache.get_or_build("income_daily", {"start": start_date, "end": end_date, "resolution": resolution},
+                                        build_earnings_chart)
         st.plotly_chart(fig, use_container_width=True)
         
         st.subheader("Detailed Earnings")
         st.dataframe(df_income, use_container_width=True)
         
-        total_received = df_income["day_earnings"].sum()
         st.metric("Amount Received", f"${total_received:,.2f}")
+        if adjustments:
+            st.caption(f"Closed months in this range have since changed by ${adjustments:,.2f}; "
+                       "the amount received keeps their closed totals.")
         st.metric("Pending Income", f"${pending_income:,.2f}")
         st.metric("Total Potential Income", f"${total_received + pending_income:,.2f}")
         
-        # Simple linear forecast
-        if len(df_income) > 1:
-            df_income["date_num"] = df_income["date"].map(datetime.datetime.toordinal)
-            x = df_income["date_num"].values
-            y = df_income["day_earnings"].values
-            coeffs = np.polyfit(x, y, 1)
-            poly = np.poly1d(coeffs)
-            last_date = df_income["date"].max()
-            forecast_dates = [last_date + datetime.timedelta(days=i) for i in range(1, 8)]
-            forecast_x = [d.toordinal() for d in forecast_dates]
-            forecast_y = poly(forecast_x)
-            
-            fig.add_trace(go.Scatter(x=forecast_dates, y=forecast_y, mode='lines+markers', name="Forecast"))
-            st.plotly_chart(fig, use_container_width=True)
-            
-            st.write("Forecast for the next 7 days (based on a simple linear trend):")
+        if forecast_dates:
+            st.write(f"Forecast for the next 7 {period}s (based on a simple linear trend):")
             forecast_df = pd.DataFrame({
                 "Date": forecast_dates,
                 "Forecasted Earnings ($)": np.round(forecast_y, 2)
@@ -953,11 +4053,16 @@ def ai_analysis_page():
     st.write("This section provides AI-driven insights into your ticket management performance based on historical data. "
              "It can highlight trends, perform simple forecasts, and detect anomalies in your delivered ticket counts.")
     
-    total_tickets_df = pd.read_sql("SELECT SUM(num_sub_tickets) as total FROM tickets", conn)
-    total_tickets = total_tickets_df.iloc[0]['total'] or 0
-    total_delivered_df = pd.read_sql("SELECT SUM(num_sub_tickets) as total_delivered FROM tickets WHERE status='Delivered'", conn)
-    total_delivered = total_delivered_df.iloc[0]['total_delivered'] or 0
+    # COALESCE in SQL: DuckDB hands back an empty SUM as NaN, which `or 0` lets through
+    total_tickets_df = analytics_read_sql("SELECT COALESCE(SUM(num_sub_tickets), 0) as total FROM {tickets}")
+    total_tickets = int(total_tickets_df.iloc[0]['total'])
+    total_delivered_df = analytics_read_sql(
+        "SELECT COALESCE(SUM(num_sub_tickets), 0) as total_delivered FROM {tickets} WHERE status_code=?",
+        [STATUS_CODES["Delivered"]]
+    )
+    total_delivered = int(total_delivered_df.iloc[0]['total_delivered'])
     conversion_rate = (total_delivered / total_tickets * 100) if total_tickets else 0
+    source_key = analytics_source_key()
 
     st.metric("Total Tickets", total_tickets)
     st.metric("Total Delivered", total_delivered)
@@ -966,22 +4071,16 @@ def ai_analysis_page():
     tab1, tab2, tab3, tab4 = st.tabs(["Daily Trend & Forecast", "Weekday Analysis", "Calendar Heatmap", "Anomaly Detection"])
     
     with tab1:
-        df_trend = pd.read_sql(
-            "SELECT date, SUM(num_sub_tickets) as delivered FROM tickets WHERE status='Delivered' GROUP BY date ORDER BY date",
-            conn
+        df_trend = analytics_read_sql(
+            "SELECT date, SUM(num_sub_tickets) as delivered FROM {tickets} WHERE status_code=? GROUP BY date ORDER BY date",
+            [STATUS_CODES["Delivered"]]
         )
         if not df_trend.empty:
             df_trend['date'] = pd.to_datetime(df_trend['date'])
-            fig1 = go.Figure(go.Scatter(x=df_trend['date'], y=df_trend['delivered'], mode='lines+markers', name="Historical"))
-            fig1.update_layout(title="Daily Delivered Tickets Trend", xaxis_title="Date", yaxis_title="Delivered Tickets")
-            st.plotly_chart(fig1, use_container_width=True)
-            avg_delivered = df_trend['delivered'].mean()
-            st.write(f"On average, you deliver about {avg_delivered:.1f} tickets per day.")
-            
             df_trend = df_trend.sort_values("date")
-            df_trend["date_num"] = df_trend["date"].map(datetime.datetime.toordinal)
-            x = df_trend["date_num"].values
+            x = df_trend["date"].map(datetime.datetime.toordinal).values
             y = df_trend["delivered"].values
+            forecast_dates, forecast_y = [], []
             if len(x) > 1:
                 coeffs = np.polyfit(x, y, 1)
                 poly = np.poly1d(coeffs)
@@ -989,8 +4088,21 @@ def ai_analysis_page():
                 forecast_dates = [last_date + datetime.timedelta(days=i) for i in range(1, 8)]
                 forecast_x = [d.toordinal() for d in forecast_dates]
                 forecast_y = poly(forecast_x)
-                fig1.add_trace(go.Scatter(x=forecast_dates, y=forecast_y, mode='lines+markers', name="Forecast"))
-                st.plotly_chart(fig1, use_container_width=True)
+
+            # Historical and forecast traces go into one figure, rendered once
+            def build_trend_chart():
+                fig1 = go.Figure(go.Scatter(x=df_trend['date'], y=df_trend['delivered'], mode='lines+markers', name="Historical"))
+                fig1.update_layout(title="Daily Delivered Tickets Trend", xaxis_title="Date", yaxis_title="Delivered Tickets")
+                if forecast_dates:
+                    fig1.add_trace(go.Scatter(x=forecast_dates, y=forecast_y, mode='lines+markers', name="Forecast"))
+                return fig1
+
+            fig1 = figure_cache.get_or_build("ai_trend", source_key, build_trend_chart)
+            st.plotly_chart(fig1, use_container_width=True)
+            avg_delivered = df_trend['delivered'].mean()
+            st.write(f"On average, you deliver about {avg_delivered:.1f} tickets per day.")
+            
+            if forecast_dates:
                 st.write("Forecast for the next 7 days (based on a simple linear trend):")
                 forecast_df = pd.DataFrame({
                     "Date": forecast_dates,
@@ -1003,46 +4115,53 @@ def ai_analysis_page():
             st.info("No delivered ticket data available for daily trend analysis.")
     
     with tab2:
-        df_status = pd.read_sql(
-            "SELECT date, status, SUM(num_sub_tickets) as count FROM tickets GROUP BY date, status",
-            conn
+        df_status = analytics_read_sql(
+            "SELECT date, status_code, SUM(num_sub_tickets) as count FROM {tickets} GROUP BY date, status_code"
         )
         if not df_status.empty:
             df_status['date'] = pd.to_datetime(df_status['date'])
             df_status['weekday'] = df_status['date'].dt.day_name()
-            df_status['status_ui'] = df_status['status'].apply(display_status)
-            pivot = df_status.pivot_table(index='weekday', columns='status_ui', values='count', aggfunc='mean', fill_value=0)
+            df_status['status_ui'] = status_categorical(df_status['status_code'])
+            pivot = df_status.pivot_table(index='weekday', columns='status_ui', values='count', aggfunc='mean', fill_value=0,
+                                          observed=True)
             weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
             pivot = pivot.reindex(weekday_order)
             st.subheader("Average Daily Ticket Counts by Weekday")
             st.dataframe(pivot)
-            fig2 = go.Figure()
-            for status_col in pivot.columns:
-                fig2.add_trace(go.Bar(
-                    x=pivot.index,
-                    y=pivot[status_col],
-                    name=status_col
-                ))
-            fig2.update_layout(
-                title="Average Ticket Counts by Weekday",
-                xaxis_title="Weekday",
-                yaxis_title="Average Count",
-                barmode="group"
-            )
+
+            def build_weekday_chart():
+                fig2 = go.Figure()
+                for status_col in pivot.columns:
+                    fig2.add_trace(go.Bar(
+                        x=pivot.index,
+                        y=pivot[status_col],
+                        name=status_col
+                    ))
+                fig2.update_layout(
+                    title="Average Ticket Counts by Weekday",
+                    xaxis_title="Weekday",
+                    yaxis_title="Average Count",
+                    barmode="group"
+                )
+                return fig2
+
+            fig2 = figure_cache.get_or_build("ai_weekday", source_key, build_weekday_chart)
             st.plotly_chart(fig2, use_container_width=True)
         else:
             st.info("No ticket data available for weekday analysis.")
     
     with tab3:
-        df_delivered = pd.read_sql("SELECT date, SUM(num_sub_tickets) as delivered FROM tickets WHERE status='Delivered' GROUP BY date", conn)
-        if not df_delivered.empty:
+        def build_heatmap():
+            df_delivered = analytics_read_sql("SELECT date, SUM(num_sub_tickets) as delivered FROM {tickets} WHERE status_code=? GROUP BY date",
+                                              [STATUS_CODES["Delivered"]])
+            if df_delivered.empty:
+                return None
             df_delivered['date'] = pd.to_datetime(df_delivered['date'])
             df_delivered['week'] = df_delivered['date'].dt.isocalendar().week
             df_delivered['weekday'] = df_delivered['date'].dt.day_name()
             weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
             heatmap_data = df_delivered.pivot_table(index='weekday', columns='week', values='delivered', fill_value=0)
             heatmap_data = heatmap_data.reindex(weekday_order)
-            st.subheader("Calendar Heatmap of Delivered Tickets")
             fig3 = go.Figure(data=go.Heatmap(
                 z=heatmap_data.values,
                 x=heatmap_data.columns,
@@ -1050,12 +4169,18 @@ def ai_analysis_page():
                 colorscale='Viridis'
             ))
             fig3.update_layout(title="Delivered Tickets Heatmap", xaxis_title="Week Number", yaxis_title="Weekday")
+            return fig3
+
+        fig3 = figure_cache.get_or_build("ai_heatmap", source_key, build_heatmap)
+        if fig3 is not None:
+            st.subheader("Calendar Heatmap of Delivered Tickets")
             st.plotly_chart(fig3, use_container_width=True)
         else:
             st.info("No delivered ticket data available for calendar heatmap.")
     
     with tab4:
-        df_anomaly = pd.read_sql("SELECT date, SUM(num_sub_tickets) as delivered FROM tickets WHERE status='Delivered' GROUP BY date", conn)
+        df_anomaly = analytics_read_sql("SELECT date, SUM(num_sub_tickets) as delivered FROM {tickets} WHERE status_code=? GROUP BY date",
+                                        [STATUS_CODES["Delivered"]])
         if not df_anomaly.empty:
             df_anomaly['date'] = pd.to_datetime(df_anomaly['date'])
             mean_val = df_anomaly['delivered'].mean()
@@ -1066,27 +4191,32 @@ def ai_analysis_page():
             st.subheader("Anomaly Detection in Delivered Tickets")
             st.write(f"Mean: {mean_val:.1f}, Standard Deviation: {std_val:.1f}")
             st.dataframe(df_anomaly)
-            fig4 = go.Figure()
-            fig4.add_trace(go.Scatter(
-                x=df_anomaly['date'],
-                y=df_anomaly['delivered'],
-                mode='lines+markers',
-                name="Delivered"
-            ))
-            anomalies = df_anomaly[df_anomaly['anomaly'] == 'Yes']
-            if not anomalies.empty:
+
+            def build_anomaly_chart():
+                fig4 = go.Figure()
                 fig4.add_trace(go.Scatter(
-                    x=anomalies['date'],
-                    y=anomalies['delivered'],
-                    mode='markers',
-                    marker=dict(color='red', size=10),
-                    name="Anomalies"
+                    x=df_anomaly['date'],
+                    y=df_anomaly['delivered'],
+                    mode='lines+markers',
+                    name="Delivered"
                 ))
-            fig4.update_layout(
-                title="Delivered Tickets with Anomalies",
-                xaxis_title="Date",
-                yaxis_title="Delivered Tickets"
-            )
+                anomalies = df_anomaly[df_anomaly['anomaly'] == 'Yes']
+                if not anomalies.empty:
+                    fig4.add_trace(go.Scatter(
+                        x=anomalies['date'],
+                        y=anomalies['delivered'],
+                        mode='markers',
+                        marker=dict(color='red', size=10),
+                        name="Anomalies"
+                    ))
+                fig4.update_layout(
+                    title="Delivered Tickets with Anomalies",
+                    xaxis_title="Date",
+                    yaxis_title="Delivered Tickets"
+                )
+                return fig4
+
+            fig4 = figure_cache.get_or_build("ai_anomaly", source_key, build_anomaly_chart)
             st.plotly_chart(fig4, use_container_width=True)
         else:
             st.info("No delivered ticket data available for anomaly detection.")
@@ -1101,49 +4231,184 @@ def ai_analysis_page():
     
     st.write("Keep monitoring your performance regularly to identify trends and optimize your operations.")
 
+# -----------------------------------------------------------
+# Cycle Times Page (reads the incremental histograms, never ticket_events)
+# -----------------------------------------------------------
+def format_duration(seconds: float) -> str:
+    if seconds is None or seconds != seconds:  # None or NaN
+        return "-"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} h"
+    return f"{seconds / 86400:.1f} d"
+
+def histogram_percentiles(df_hist: pd.DataFrame, quantiles=(0.5, 0.9, 0.95)) -> dict:
+    """Estimate percentiles from bucket counts, interpolating linearly inside a bucket."""
+    df_hist = df_hist.groupby("bucket", as_index=False)["n"].sum().sort_values("bucket")
+    counts = df_hist["n"].to_numpy(dtype=np.float64)
+    # An empty read_sql frame has object columns, which can't index
+    buckets = df_hist["bucket"].to_numpy(dtype=np.int64)
+    uppers = np.array(CYCLE_TIME_BUCKETS, dtype=np.float64)[buckets]
+    lowers = np.array([0.0] + CYCLE_TIME_BUCKETS[:-1], dtype=np.float64)[buckets]
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1] if len(cumulative) else 0
+    result = {"count": int(total)}
+    for q in quantiles:
+        if not total:
+            result[f"p{int(q * 100)}"] = None
+            continue
+        idx = int(np.searchsorted(cumulative, q * total))
+        before = cumulative[idx - 1] if idx else 0
+        fraction = (q * total - before) / counts[idx]
+        if uppers[idx] == CYCLE_TIME_BUCKETS[-1]:
+            fraction = 0.0  # the catch-all bucket has no meaningful upper bound
+        result[f"p{int(q * 100)}"] = lowers[idx] + fraction * (uppers[idx] - lowers[idx])
+    return result
+
+def cycle_times_page():
+    st.markdown("## ⏳ Cycle Times")
+    st.write("How long tickets spend in each status and how long they take to reach it, "
+             "maintained incrementally from the status transition log.")
+
+    df_pairs = cached_read_sql("SELECT DISTINCT from_code, to_code FROM cycle_time_hist WHERE scope = 'all'")
+    if df_pairs.empty:
+        st.info("No status transitions recorded yet.")
+        return
+
+    def transition_label(from_code, to_code):
+        to_label = status_categorical([to_code])[0]
+        if from_code == LEAD_TIME_FROM_CODE:
+            return f"Created → {to_label}"
+        return f"{status_categorical([from_code])[0]} → {to_label}"
+
+    df_pairs["label"] = [transition_label(f, t) for f, t in zip(df_pairs["from_code"], df_pairs["to_code"])]
+    df_pairs = df_pairs.sort_values(["from_code", "to_code"])
+    default_label = transition_label(LEAD_TIME_FROM_CODE, STATUS_CODES["Delivered"])
+    labels = df_pairs["label"].tolist()
+    col1, col2 = st.columns(2)
+    with col1:
+        selected = st.selectbox("Transition", labels,
+                                index=labels.index(default_label) if default_label in labels else 0)
+    with col2:
+        scope = st.radio("Break Down By", ["Day", "Batch"], horizontal=True)
+    pair = df_pairs[df_pairs["label"] == selected].iloc[0]
+    params = [int(pair["from_code"]), int(pair["to_code"])]
+
+    overall = histogram_percentiles(cached_read_sql(
+        "SELECT bucket, n FROM cycle_time_hist WHERE scope = 'all' AND from_code = ? AND to_code = ?", params
+    ))
+    col_a, col_b, col_c, col_d = st.columns(4)
+    col_a.metric("Transitions", overall["count"])
+    col_b.metric("Median (p50)", format_duration(overall["p50"]))
+    col_c.metric("p90", format_duration(overall["p90"]))
+    col_d.metric("p95", format_duration(overall["p95"]))
+
+    df_hist = cached_read_sql(
+        "SELECT scope_key, bucket, n FROM cycle_time_hist WHERE scope = ? AND from_code = ? AND to_code = ?",
+        [scope.lower()] + params
+    )
+    if df_hist.empty:
+        st.info("No transitions recorded for this selection.")
+        return
+    rows = []
+    for key, group in df_hist.groupby("scope_key"):
+        rows.append({scope: key, **histogram_percentiles(group)})
+    df_pct = pd.DataFrame(rows)
+    if scope == "Day":
+        df_pct = df_pct.sort_values(scope)
+        fig = go.Figure()
+        for col, name in (("p50", "p50"), ("p90", "p90"), ("p95", "p95")):
+            fig.add_trace(go.Scatter(x=pd.to_datetime(df_pct[scope]), y=df_pct[col] / 3600,
+                                     mode="lines+markers", name=name))
+        fig.update_layout(title=f"{selected} Cycle Time by Day", xaxis_title="Date",
+                          yaxis_title="Hours", hovermode="x unified", template="plotly_white")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        df_pct = df_pct.sort_values("count", ascending=False)
+    for col in ("p50", "p90", "p95"):
+        df_pct[col] = df_pct[col].map(format_duration)
+    st.dataframe(df_pct, use_container_width=True)
+
+# -----------------------------------------------------------
+# Jobs Page
+# -----------------------------------------------------------
+def jobs_page():
+    st.markdown("## 🧵 Background Jobs")
+    st.write("Deletes, batch updates, Excel restores and exports run here without blocking the app.")
+    active = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    @st.fragment(run_every=2 if active else None)
+    def job_list():
+        df_jobs = pd.read_sql(
+            "SELECT id, kind, description, status, progress, message, result, error, cancel_requested, "
+            "created_at, started_at, finished_at FROM jobs ORDER BY id DESC LIMIT 50", conn
+        )
+        if df_jobs.empty:
+            st.info("No jobs have been run yet.")
+            return
+        for job in df_jobs.itertuples():
+            with st.container(border=True):
+                col_info, col_action = st.columns([5, 1])
+                started = datetime.datetime.fromtimestamp(job.created_at).strftime("%Y-%m-%d %H:%M:%S")
+                col_info.markdown(f"**#{job.id} {job.description}** · `{job.status}` · {started}")
+                if job.status in ACTIVE_JOB_STATUSES:
+                    live = job_runner.live_progress(job.id) or {"progress": job.progress or 0.0, "message": job.message}
+                    col_info.progress(live["progress"], text=live["message"] or job.status)
+                    if job.cancel_requested:
+                        col_action.caption("Cancelling…")
+                    elif col_action.button("Cancel", key=f"cancel_job_{job.id}"):
+                        job_runner.cancel(job.id)
+                        st.rerun(scope="fragment")
+                else:
+                    elapsed = (job.finished_at or job.created_at) - (job.started_at or job.created_at)
+                    col_info.caption(f"{job.message or ''} · took {format_duration(elapsed)}")
+                    if job.error:
+                        col_info.error(job.error)
+                    elif job.kind == "export_excel" and job.result:
+                        export = json.loads(job.result)
+                        if os.path.exists(export["path"]):
+                            with open(export["path"], "rb") as xlsx_file:
+                                col_action.download_button("Download", xlsx_file.read(), key=f"download_job_{job.id}",
+                                                           file_name="tickets_backup.xlsx",
+                                                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    job_list()
+
 # -----------------------------------------------------------
 # Backup & Restore Page
 # -----------------------------------------------------------
 def backup_restore_page():
-    global conn
     st.markdown("## 💾 Backup & Restore")
     st.write("Download your database backup or export your ticket data to Excel. You can also restore your ticket data from an Excel file or a .db file.")
     
     st.subheader("Download Options")
     try:
-        with open("ticket_management.db", "rb") as db_file:
+        with open(DB_PATH, "rb") as db_file:
             db_bytes = db_file.read()
         st.download_button("Download Database (.db)", db_bytes, file_name="ticket_management.db", mime="application/octet-stream")
     except Exception as e:
         st.error("Database file not found.")
     
-    df_tickets = pd.read_sql("SELECT * FROM tickets", conn)
-    if not df_tickets.empty:
-        towrite = BytesIO()
-        with pd.ExcelWriter(towrite, engine="xlsxwriter") as writer:
-            df_tickets.to_excel(writer, index=False, sheet_name="Tickets")
-        towrite.seek(0)
-        st.download_button("Download Excel Backup", towrite.read(), file_name="tickets_backup.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    else:
-        st.info("No ticket data available to export.")
+    # Building the workbook is slow on big tables, so it runs as a background job
+    if st.button("Prepare Excel Backup"):
+        job_submitted_notice(job_runner.submit("export_excel", "Export tickets to Excel", export_excel_job))
+    export = latest_job_result("export_excel")
+    if export and os.path.exists(export["path"]):
+        with open(export["path"], "rb") as xlsx_file:
+            st.download_button(f"Download Excel Backup ({export['rows']} tickets)", xlsx_file.read(),
+                               file_name="tickets_backup.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     
     st.markdown("---")
     st.subheader("Restore from Excel")
     st.write("Upload an Excel file to restore your ticket data. **Warning:** This will overwrite your current ticket data.")
     uploaded_excel = st.file_uploader("Choose an Excel file", type=["xlsx"])
-    if uploaded_excel is not None:
-        try:
-            df_restore = pd.read_excel(uploaded_excel)
-            required_columns = {"date", "time", "batch_name", "ticket_number", "num_sub_tickets", "status", "pay", "comments", "ticket_day", "ticket_school"}
-            if not required_columns.issubset(set(df_restore.columns)):
-                st.error("Uploaded Excel file does not contain the required columns.")
-            else:
-                cursor.execute("DELETE FROM tickets")
-                conn.commit()
-                df_restore.to_sql("tickets", conn, if_exists="append", index=False)
-                st.success("Database restored successfully from Excel file!")
-        except Exception as e:
-            st.error(f"Error restoring from Excel: {e}")
+    if uploaded_excel is not None and st.button("Restore from Excel"):
+        excel_bytes = uploaded_excel.getvalue()
+        job_submitted_notice(job_runner.submit(
+            "restore_excel", f"Restore tickets from {uploaded_excel.name}",
+            lambda job: restore_excel_job(job, excel_bytes)
+        ))
     
     st.markdown("---")
     st.subheader("Restore Database from .db File")
@@ -1151,15 +4416,80 @@ def backup_restore_page():
     uploaded_db = st.file_uploader("Choose a .db file", type=["db"])
     if uploaded_db is not None:
         try:
-            with open("ticket_management.db", "wb") as f:
+            upload_path = DB_PATH + ".upload"
+            with open(upload_path, "wb") as f:
                 f.write(uploaded_db.getbuffer())
+
+            def restore_database(cur):
+                # Copy pages in through the backup API so open connections stay valid
+                source = sqlite3.connect(upload_path)
+                try:
+                    source.backup(cur.connection)
+                finally:
+                    source.close()
+                # The file may come from another station; don't go on writing under its id
+                apply_migrations(cur.connection)
+                claim_station(cur.connection, DB_PATH)
+
+            write_queue.submit(restore_database, transactional=False).result(timeout=WRITE_TIMEOUT)
+            os.remove(upload_path)
             st.success("Database restored successfully from uploaded .db file!")
-            conn.close()
-            conn = get_db_connection()
             st.experimental_rerun()
         except Exception as e:
             st.error(f"Error restoring database from .db file: {e}")
 
+    st.markdown("---")
+    st.subheader("Sync With Other Stations")
+    station, exported_until = conn.execute("SELECT station, exported_until FROM sync_station WHERE id = 1").fetchone()
+    st.write(f"This station is **{station}**. Export the changes made here since the last export, then merge "
+             "the file on the other stations. Each ticket keeps whichever version was written last; deletes "
+             "travel too.")
+    last_export = (datetime.datetime.fromtimestamp(exported_until).strftime("%Y-%m-%d %H:%M:%S")
+                   if exported_until else "never")
+    scope = st.radio("Export", [f"Changes since last export ({last_export})", "Everything"], horizontal=True)
+    if st.button("Export Changes"):
+        since = 0 if scope == "Everything" else exported_until
+        path, summary = export_change_feed(since)
+        st.session_state.sync_export = path
+        st.success(f"Exported {summary['rows']} changed ticket(s) and {summary['deletes']} delete(s).")
+    export_path = st.session_state.get("sync_export")
+    if export_path and os.path.exists(export_path):
+        with open(export_path, "rb") as feed_file:
+            st.download_button(f"Download {os.path.basename(export_path)} ({os.path.getsize(export_path):,} bytes)",
+                               feed_file.read(), file_name=os.path.basename(export_path), mime="application/gzip")
+    uploaded_feed = st.file_uploader("Merge a change file from another station", type=["gz"])
+    if uploaded_feed is not None and st.button("Merge Changes"):
+        feed_bytes = uploaded_feed.getvalue()
+        job_submitted_notice(job_runner.submit(
+            "import_changes", f"Merge changes from {uploaded_feed.name}",
+            lambda job: import_changes_job(job, feed_bytes)
+        ))
+    df_peers = pd.read_sql("""
+        SELECT station, datetime(imported_until, 'unixepoch', 'localtime') AS changes_up_to,
+               datetime(imported_at, 'unixepoch', 'localtime') AS merged_at, rows_applied
+        FROM sync_peers ORDER BY imported_at DESC
+    """, conn)
+    if not df_peers.empty:
+        st.dataframe(df_peers, use_container_width=True)
+
+    st.markdown("---")
+    st.subheader("Archive Closed Tickets")
+    st.write("Move Delivered and Cancelled tickets that have not changed for a while into per-year archive files "
+             f"under `{ARCHIVE_DIR}/`. Date-range charts read the archives automatically when the range reaches back "
+             "that far; the .db download above contains only active tickets.")
+    archive_days = st.number_input("Archive closed tickets untouched for at least (days)", min_value=1, value=180, step=30)
+    if st.button("Archive Closed Tickets"):
+        moved = write_queue.submit(
+            lambda cur: archive_closed_tickets(cur, int(archive_days)), transactional=False
+        ).result(timeout=WRITE_TIMEOUT)
+        if moved:
+            st.success("Archived " + ", ".join(f"{count} ticket(s) into {year}" for year, count in moved.items()))
+        else:
+            st.info("No closed tickets old enough to archive.")
+    df_archives = pd.read_sql("SELECT year, path, row_count FROM archive_files ORDER BY year DESC", conn)
+    if not df_archives.empty:
+        st.dataframe(df_archives, use_container_width=True)
+
 # -----------------------------------------------------------
 # Settings Page
 # -----------------------------------------------------------
@@ -1173,7 +4503,7 @@ def settings_page():
         st.write("Configure application preferences and defaults")
     
     st.markdown("---")
-    tab1, tab2, tab3 = st.tabs(["💰 Pricing", "🏢 Company", "🎨 Appearance"])
+    tab1, tab2, tab3, tab4 = st.tabs(["💰 Pricing", "🏢 Company", "🎨 Appearance", "🛠️ System"])
     with tab1:
         st.subheader("Ticket Pricing")
         new_price = st.number_input("Price per Sub-Ticket (USD)", min_value=0.0, value=st.session_state.ticket_price, step=0.5)
@@ -1197,12 +4527,242 @@ def settings_page():
         # The color picker is not actively used to style the entire app,
         # but you could incorporate it if you want more advanced theming
         st.color_picker("Primary Color", value="#4CAF50", key="primary_color")
+    with tab4:
+        st.subheader("Startup & Imports")
+        report = get_startup_report()
+        with report["lock"]:
+            imports = [{"module": name, "import_ms": round(info["seconds"] * 1000, 1), "first needed by": info["page"]}
+                       for name, info in report["imports"].items()]
+            page_runs = [{"page": page, "first_paint_ms": round(info["first"] * 1000, 1),
+                          "last_ms": round(info["last"] * 1000, 1), "runs": info["runs"]}
+                         for page, info in report["pages"].items()]
+        st.caption("First import of each lazily loaded library in this server process "
+                   "(like `python -X importtime`), and script time per page.")
+        # Plain markdown tables so this tab does not itself pull in pandas
+        col1, col2 = st.columns(2)
+        if imports:
+            col1.markdown("| Module | Import (ms) | First needed by |\n|---|---:|---|\n" + "\n".join(
+                f"| `{row['module']}` | {row['import_ms']} | {row['first needed by']} |"
+                for row in sorted(imports, key=lambda row: -row["import_ms"])))
+        else:
+            col1.info("No lazy imports recorded yet.")
+        if page_runs:
+            col2.markdown("| Page | First run (ms) | Last run (ms) | Runs |\n|---|---:|---:|---:|\n" + "\n".join(
+                f"| {row['page']} | {row['first_paint_ms']} | {row['last_ms']} | {row['runs']} |" for row in page_runs))
+
+        st.subheader("Write Queue")
+        st.write("All ticket changes are applied by a single writer thread and committed in groups.")
+        wq = write_queue.metrics()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Queue Depth", wq["queue_depth"])
+        col2.metric("Group Commits", wq["commits"])
+        col3.metric("Avg Mutations / Commit", f"{wq['avg_batch_size']:.1f}")
+        col4.metric("Failed Mutations", wq["failures"],
+                    help=f"Commit listeners failed {wq['listener_failures']} time(s); their caches were dropped")
+        col5, col6, col7 = st.columns(3)
+        col5.metric("Commit Latency p50", f"{wq['commit_ms_p50']:.1f} ms")
+        col6.metric("Commit Latency p95", f"{wq['commit_ms_p95']:.1f} ms")
+        col7.metric("Queue Wait p95", f"{wq['wait_ms_p95']:.1f} ms")
+
+        st.subheader("Analytics Engine")
+        if analytics_engine is None:
+            st.info("DuckDB is not installed; AI Analysis queries SQLite directly. "
+                    "Install `duckdb` to enable the columnar analytics snapshot.")
+        else:
+            backend = st.radio("Analytics Backend", ["Auto", "SQLite"], horizontal=True,
+                               index=["Auto", "SQLite"].index(st.session_state.analytics_backend),
+                               help="Auto runs AI Analysis on the DuckDB snapshot.")
+            st.session_state.analytics_backend = backend
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Snapshot Rows", analytics_engine.snapshot_rows)
+            col2.metric("Last Refresh", f"{analytics_engine.last_refresh_seconds * 1000:.0f} ms")
+            age = time.time() - analytics_engine.snapshot_at if analytics_engine.snapshot_at else None
+            col3.metric("Snapshot Age", format_duration(age) if age is not None else "-")
+            if st.button("Refresh Snapshot Now"):
+                analytics_engine.refresh()
+                st.success("Analytics snapshot refreshed.")
+
+        st.subheader("Figure Cache")
+        fc = figure_cache.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Cached Figures", fc["entries"])
+        col2.metric("Hits", fc["hits"])
+        col3.metric("Misses", fc["misses"])
+
+        st.subheader("Query Cache")
+        qc = query_cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hit Rate", f"{qc['hit_rate']:.0%}", help=f"{qc['hits']} hits, {qc['misses']} misses")
+        col2.metric("Cached Results", qc["entries"], f"{qc['bytes'] / 1024 / 1024:.1f} MB", delta_color="off")
+        col3.metric("Invalidated", qc["invalidations"], help="Entries dropped because a commit wrote a table they read")
+        col4.metric("Uncacheable Reads", qc["uncacheable"])
+
+        st.subheader("Ticket Number Index")
+        ti = ticket_index.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Indexed Numbers", f"{ti['indexed']:,}")
+        col2.metric("Pending Changes", ti["pending"], help=f"Merged into the sorted index every {TICKET_INDEX_MERGE_AT} changes")
+        col3.metric("Last Build", f"{ti['build_ms']:.0f} ms")
+
+        st.subheader("Database Maintenance")
+        page_size, page_count, free_pages, vacuum_mode = (
+            conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+        )
+        last_run = conn.execute(
+            "SELECT MAX(finished_at) FROM jobs WHERE kind = 'maintenance' AND status = 'succeeded'"
+        ).fetchone()[0]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("File Size", f"{page_size * page_count / 1024 / 1024:.1f} MB")
+        col2.metric("Free Pages", free_pages)
+        col3.metric("Auto-Vacuum", {0: "None", 1: "Full", 2: "Incremental"}.get(vacuum_mode, vacuum_mode))
+        col4.metric("Last Maintenance", format_duration(time.time() - last_run) + " ago" if last_run else "Never")
+        st.caption(f"Incremental vacuum, ANALYZE and PRAGMA optimize run every {MAINTENANCE_INTERVAL // 3600} hours.")
+        if st.button("Run Maintenance Now"):
+            job_submitted_notice(job_runner.submit("maintenance", "Database maintenance", maintenance_job))
+
+        st.subheader("Page Profiling")
+        # The callback runs before the rerun, so the very next render is already profiled
+        st.checkbox("Profile page renders", value=st.session_state.profiling, key="profiling_toggle",
+                    on_change=lambda: setattr(st.session_state, "profiling", st.session_state.profiling_toggle))
+        st.caption(f"Each render runs under cProfile and tracemalloc. The sidebar shows the slowest calls and the "
+                   f"allocation peak; profiles are saved under `{PROFILE_DIR}/`. Add `?profile=1` to the URL to "
+                   "start a session with profiling on.")
     
     st.markdown("---")
 
+# -----------------------------------------------------------
+# Page Profiling (opt-in)
+# -----------------------------------------------------------
+PROFILE_DIR = "profiles"
+PROFILE_TOP_N = 15
+# Profiled renders kept per page; older .pstats/.speedscope.json pairs are deleted
+PROFILE_KEEP_PER_PAGE = 10
+
+@st.cache_resource
+def get_profiling_state():
+    # tracemalloc is process-wide, so concurrent profiled renders share one trace
+    return {"lock": threading.Lock(), "active": 0, "started": False}
+
+def speedscope_profile(stats: pstats.Stats, name: str) -> dict:
+    """
+    Convert pstats into a speedscope "sampled" profile. cProfile keeps only
+    caller edges, not full stacks, so each function's own time is charged
+    to the chain of its heaviest callers; good enough to see where time goes.
+    """
+    frames, frame_index = [], {}
+    def frame(func):
+        if func not in frame_index:
+            filename, line, function = func
+            frame_index[func] = len(frames)
+            frames.append({"name": function, "file": filename, "line": line})
+        return frame_index[func]
+
+    samples, weights = [], []
+    for func, (_, _, own_time, _, callers) in stats.stats.items():
+        if own_time <= 0:
+            continue
+        stack, seen, current = [], set(), func
+        while current is not None and current not in seen and len(stack) < 64:
+            seen.add(current)
+            stack.append(frame(current))
+            callers = stats.stats.get(current, (0, 0, 0, 0, {}))[4]
+            current = max(callers, key=lambda c: callers[c][3]) if callers else None
+        samples.append(stack[::-1])
+        weights.append(own_time)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "ticket-system page profiler",
+        "shared": {"frames": frames},
+        "profiles": [{"type": "sampled", "name": name, "unit": "seconds", "startValue": 0,
+                      "endValue": sum(weights), "samples": samples, "weights": weights}],
+    }
+
+def prune_profiles(slug: str):
+    """Delete all but the newest PROFILE_KEEP_PER_PAGE saved profiles of one page."""
+    saved = re.compile(re.escape(slug) + r"_\d{8}-\d{6}")
+    stems = sorted({name.split(".", 1)[0] for name in os.listdir(PROFILE_DIR)
+                    if saved.fullmatch(name.split(".", 1)[0])})
+    for stem in stems[:-PROFILE_KEEP_PER_PAGE]:
+        for suffix in (".pstats", ".speedscope.json"):
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(PROFILE_DIR, stem + suffix))
+
+def profile_page(page: str, render) -> dict:
+    """Run one page render under cProfile and tracemalloc; save the profile and return a summary."""
+    state = get_profiling_state()
+    with state["lock"]:
+        if state["active"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            state["started"] = True
+        state["active"] += 1
+        tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        profiler.runcall(render)
+    finally:
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        with state["lock"]:
+            state["active"] -= 1
+            if state["active"] == 0 and state["started"]:
+                tracemalloc.stop()
+                state["started"] = False
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = page.replace(' ', '_').replace('&', 'and')
+    stem = os.path.join(PROFILE_DIR, f"{slug}_{time.strftime('%Y%m%d-%H%M%S')}")
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(stem + ".pstats")
+    with open(stem + ".speedscope.json", "w") as f:
+        json.dump(speedscope_profile(stats, page), f)
+    prune_profiles(slug)
+
+    top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_N]
+    return {
+        "page": page,
+        "seconds": seconds,
+        "peak_bytes": max(peak - baseline, 0),
+        "pstats": stem + ".pstats",
+        "speedscope": stem + ".speedscope.json",
+        "top": [{"function": f"{os.path.basename(filename)}:{line}({function})" if line else function,
+                 "calls": calls, "own_s": own, "cumulative_s": cumulative}
+                for (filename, line, function), (_, calls, own, cumulative, _) in top],
+    }
+
+def profile_sidebar(profile: dict):
+    with st.sidebar:
+        st.markdown("### ⏱️ Last Render Profile")
+        st.write(f"**{profile['page']}**: {profile['seconds'] * 1000:,.0f} ms, "
+                 f"peak {profile['peak_bytes'] / 1_048_576:,.1f} MB allocated")
+        lines = ["| function | calls | own s | cum. s |", "|---|---:|---:|---:|"]
+        for row in profile["top"]:
+            name = row["function"].replace("|", "\\|")
+            if len(name) > 60:
+                name = "…" + name[-59:]
+            lines.append(f"| `{name}` | {row['calls']} | {row['own_s']:.3f} | {row['cumulative_s']:.3f} |")
+        st.markdown("\n".join(lines))
+        for key, label, mime in (("pstats", "Download .pstats", "application/octet-stream"),
+                                 ("speedscope", "Download speedscope JSON", "application/json")):
+            if os.path.exists(profile[key]):
+                with open(profile[key], "rb") as f:
+                    st.download_button(label, f.read(), file_name=os.path.basename(profile[key]), mime=mime,
+                                       key=f"profile_download_{key}")
+        st.caption(f"Saved under `{PROFILE_DIR}/`. Open the JSON at speedscope.app, or the .pstats with snakeviz.")
+
 # -----------------------------------------------------------
 # Main App Flow
 # -----------------------------------------------------------
+def record_page_time(page: str, seconds: float):
+    report = get_startup_report()
+    with report["lock"]:
+        info = report["pages"].setdefault(page, {"first": seconds, "last": seconds, "runs": 0})
+        info["last"] = seconds
+        info["runs"] += 1
+
 def main():
     render_navbar()
     pages = {
@@ -1214,13 +4774,25 @@ def main():
         "SQL Query Converter": sql_query_converter_page,
         "Income": income_page,
         "Batches": batch_view_page,
+        "Schools": schools_page,
         "AI Analysis": ai_analysis_page,
+        "Cycle Times": cycle_times_page,
+        "Jobs": jobs_page,
         "Backup & Restore": backup_restore_page,
         "Settings": settings_page
     }
+    # The scanner fragment only flushes while it is on screen, so every full rerun
+    # (switching input type or page) sends what is buffered and collects results
+    if st.session_state.scan_session is not None:
+        flush_scans(force=True)
     active_page = st.session_state.active_page
     if active_page in pages:
-        pages[active_page]()
+        if st.session_state.profiling:
+            profile_sidebar(profile_page(active_page, pages[active_page]))
+        else:
+            pages[active_page]()
+        # Measured from the top of the script, so the first run includes cold-start imports
+        record_page_time(active_page, time.perf_counter() - SCRIPT_STARTED)
     st.markdown(f"""
     <div style="text-align:center; padding: 15px; font-size: 0.8rem; border-top: 1px solid #ccc; margin-top: 30px;">
         <p>{st.session_state.company_name} Ticket System • {datetime.datetime.now().year}</p>
@@ -0,0 +1,310 @@
+"""
+Concurrent multi-session load test for App.py.
+
+Each simulated operator is a Streamlit AppTest session that clicks through
+the real pages, so every request goes through the same shared connection,
+write queue and background jobs as in production. Sessions run as threads
+of one process (one Streamlit server, many browser tabs) or as separate
+processes (several servers or stations on one database file, where SQLite
+file locks are contended).
+
+Everything runs against a synthetic database in a scratch directory, so the
+real ticket_management.db, exports/ and archive/ are never touched.
+
+    python load_test.py --sessions 12 --duration 60
+    python load_test.py --sessions 8 --mode process --tickets 50000 --json report.json
+    python load_test.py --mix ingest=6,status=3,dashboard=1 --keep
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Keep per-run Streamlit warnings out of the report; spawned workers inherit this
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "App.py")
+DB_NAME = "ticket_management.db"
+DEFAULT_MIX = "ingest=4,status=2,dashboard=3,export=1"
+STATUSES = ["Intake", "Return", "Delivered", "On Hold", "Cancelled"]
+STATUS_WEIGHTS = [0.3, 0.2, 0.4, 0.05, 0.05]
+APP_TIMEOUT = 120
+JOB_TIMEOUT = 300
+
+# -----------------------------------------------------------
+# One Simulated Server
+# -----------------------------------------------------------
+_server_lock = threading.Lock()
+_compiled_scripts = {}
+_shared_runtime = []
+
+def share_server_state():
+    """
+    Make concurrent AppTest sessions behave like tabs on one server. A
+    Streamlit server compiles the script once and has one Runtime, but
+    AppTest builds a fresh ScriptCache and mock Runtime on every run and
+    clears the Runtime when the run ends, under the feet of any session
+    still running. Share one compiled script (which also keeps re-parsing
+    out of the latencies; CPython 3.11's parser is not thread-safe either)
+    and pin the first Runtime.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner import script_cache
+    original_bytecode = script_cache.ScriptCache.get_bytecode
+    if getattr(original_bytecode, "shared", False):
+        return
+
+    def get_bytecode(self, script_path):
+        with _server_lock:
+            if script_path not in _compiled_scripts:
+                _compiled_scripts[script_path] = original_bytecode(self, script_path)
+            return _compiled_scripts[script_path]
+
+    def instance(cls):
+        with _server_lock:
+            if not _shared_runtime and cls._instance is not None:
+                _shared_runtime.append(cls._instance)
+        if not _shared_runtime:
+            raise RuntimeError("Runtime hasn't been created!")
+        return _shared_runtime[0]
+
+    get_bytecode.shared = True
+    script_cache.ScriptCache.get_bytecode = get_bytecode
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(_shared_runtime) or cls._instance is not None)
+
+def new_session(page: str):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    at.session_state["active_page"] = page
+    return at
+
+# -----------------------------------------------------------
+# Synthetic Database
+# -----------------------------------------------------------
+def build_database(workdir: str, tickets: int, seed: int):
+    """Let the app create and migrate the schema, then bulk-load synthetic tickets."""
+    os.chdir(workdir)
+    share_server_state()
+    new_session("Settings").run()
+    rng = random.Random(seed)
+    now = int(time.time())
+    rows = []
+    for n in range(tickets):
+        created = now - rng.randrange(0, 2 * 365 * 86400)
+        local = time.localtime(created)
+        rows.append((time.strftime("%Y-%m-%d", local), time.strftime("%H:%M:%S", local),
+                     f"Batch-{n // 250}", f"LT{n:07d}", rng.choice([1, 1, 1, 2, 3]),
+                     rng.choices(STATUSES, STATUS_WEIGHTS)[0], 5.5, created, created))
+    conn = sqlite3.connect(DB_NAME)
+    with conn:
+        conn.executemany("""
+            INSERT INTO tickets (date, time, batch_name, ticket_number, num_sub_tickets, status, pay,
+                                 created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+# -----------------------------------------------------------
+# Operations (one simulated operator action each)
+# -----------------------------------------------------------
+def failures(at) -> list[str]:
+    return [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+
+def wait_for_job(at) -> list[str]:
+    """Block until the job the page just started finishes; returns its error, if any."""
+    notices = [str(i.value) for i in at.info if "background job #" in str(i.value)]
+    if not notices:
+        return failures(at) or ["no job was started"]
+    job_id = int(re.search(r"#(\d+)", notices[0]).group(1))
+    reader = sqlite3.connect(DB_NAME, timeout=30)
+    try:
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            status, error = reader.execute("SELECT status, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if status not in ("queued", "running"):
+                return [error or status] if status != "succeeded" else []
+            time.sleep(0.05)
+    finally:
+        reader.close()
+    return [f"job #{job_id} did not finish within {JOB_TIMEOUT}s"]
+
+def op_ingest(ctx) -> list[str]:
+    at = new_session("Add Tickets")
+    at.run()
+    numbers = [f"S{ctx['session']}-{ctx['next']():06d}" for _ in range(ctx["rng"].randint(1, 20))]
+    [t for t in at.text_area if t.label == "Enter Ticket Number(s)"][0].input(" ".join(numbers))
+    [b for b in at.button if b.label == "Add Tickets"][0].click()
+    at.run()
+    return failures(at)
+
+def op_status(ctx) -> list[str]:
+    at = new_session("Manage Tickets")
+    at.run()
+    numbers = [f"LT{ctx['rng'].randrange(ctx['tickets']):07d}" for _ in range(ctx["rng"].randint(10, 200))]
+    [t for t in at.text_area if t.label == "Enter Ticket Numbers (one per line)"][0].input("\n".join(numbers))
+    at.run()
+    [s for s in at.selectbox if s.label == "New Status"][0].select_index(ctx["rng"].randrange(len(STATUSES)))
+    [b for b in at.button if b.label == "Update Status for All Found Tickets"][0].click()
+    at.run()
+    return failures(at) or wait_for_job(at)
+
+def op_dashboard(ctx) -> list[str]:
+    at = new_session(ctx["rng"].choice(["Dashboard", "Dashboard", "View Tickets", "Income"]))
+    at.run()
+    return failures(at)
+
+def op_export(ctx) -> list[str]:
+    at = new_session("Backup & Restore")
+    at.run()
+    [b for b in at.button if b.label == "Prepare Excel Backup"][0].click()
+    at.run()
+    return failures(at) or wait_for_job(at)
+
+OPERATIONS = {"ingest": op_ingest, "status": op_status, "dashboard": op_dashboard, "export": op_export}
+
+# -----------------------------------------------------------
+# Sessions
+# -----------------------------------------------------------
+def run_session(session: int, workdir: str, mix: dict, duration: float, tickets: int, seed: int) -> list[tuple]:
+    """One operator: pick weighted actions until the deadline; returns (op, seconds, outcome, detail, finished) records."""
+    os.chdir(workdir)
+    share_server_state()
+    rng = random.Random(seed + session)
+    counter = iter(range(10 ** 9))
+    ctx = {"session": session, "rng": rng, "tickets": tickets, "next": lambda: next(counter)}
+    names, weights = list(mix), list(mix.values())
+    op_dashboard(ctx)  # warm-up: imports and caches, not measured
+    records = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            errors = OPERATIONS[name](ctx)
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"]
+        seconds = time.perf_counter() - started
+        if not errors:
+            outcome = "ok"
+        elif any("database is locked" in e or "database table is locked" in e for e in errors):
+            outcome = "locked"
+        else:
+            outcome = "error"
+        records.append((name, seconds, outcome, errors[0][:200] if errors else "", time.time()))
+    return records
+
+def run_sessions(args, mix: dict, workdir: str) -> list[tuple]:
+    jobs = [(n, workdir, mix, args.duration, args.tickets, args.seed) for n in range(args.sessions)]
+    if args.mode == "thread":
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            results = list(pool.map(lambda job: run_session(*job), jobs))
+    else:
+        with multiprocessing.get_context("spawn").Pool(args.sessions) as pool:
+            results = pool.starmap(run_session, jobs)
+    return [record for session in results for record in session]
+
+# -----------------------------------------------------------
+# Report
+# -----------------------------------------------------------
+def summarize(records: list[tuple]) -> dict:
+    # Throughput is over the measured window only, not process start-up and warm-up
+    wall_seconds = (max(r[4] for r in records) - min(r[4] - r[1] for r in records)) if records else 0.0
+    report = {"wall_seconds": wall_seconds, "operations": {}}
+    groups = {"all": records}
+    for record in records:
+        groups.setdefault(record[0], []).append(record)
+    for name, group in groups.items():
+        latencies = np.array([r[1] for r in group]) * 1000
+        outcomes = [r[2] for r in group]
+        report["operations"][name] = {
+            "count": len(group),
+            "throughput_per_s": len(group) / wall_seconds if wall_seconds else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(group) else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if len(group) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(group) else None,
+            "locked": outcomes.count("locked"),
+            "locked_rate": outcomes.count("locked") / len(group) if group else 0.0,
+            "errors": outcomes.count("error"),
+        }
+    report["sample_errors"] = sorted({r[3] for r in records if r[2] != "ok"})[:10]
+    return report
+
+def print_report(report: dict, args):
+    print(f"\n{args.sessions} {args.mode} session(s), {report['wall_seconds']:.1f}s measured, "
+          f"{args.tickets:,} synthetic tickets")
+    header = f"{'operation':<10} {'count':>6} {'ops/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'locked':>7} {'locked %':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report["operations"].items():
+        if not row["count"]:
+            continue
+        print(f"{name:<10} {row['count']:>6} {row['throughput_per_s']:>7.2f} {row['p50_ms']:>8.0f} "
+              f"{row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['locked']:>7} "
+              f"{row['locked_rate'] * 100:>8.1f}% {row['errors']:>7}")
+    for error in report["sample_errors"]:
+        print(f"  ! {error}")
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent operators against a synthetic ticket database.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent operator sessions")
+    parser.add_argument("--duration", type=float, default=60, help="seconds each session keeps working")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread",
+                        help="thread: one app process, shared write queue; process: one app process per session")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted operations (default {DEFAULT_MIX})")
+    parser.add_argument("--tickets", type=int, default=20000, help="synthetic tickets to preload")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory for inspection")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="ticket_load_")
+    try:
+        print(f"Building {args.tickets:,} synthetic tickets in {workdir} ...", flush=True)
+        # In a child: AppTest swaps sys.modules["__main__"], which would stop the pool pickling run_session
+        builder = multiprocessing.get_context("spawn").Process(target=build_database,
+                                                               args=(workdir, args.tickets, args.seed))
+        builder.start()
+        builder.join()
+        if builder.exitcode:
+            raise SystemExit(f"Building the synthetic database failed (exit code {builder.exitcode})")
+        print(f"Running {args.sessions} {args.mode} session(s) for {args.duration:.0f}s ...", flush=True)
+        records = run_sessions(args, args.mix, workdir)
+        report = summarize(records)
+        print_report(report, args)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if args.keep:
+            print(f"Scratch directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import pathlib
+import runpy
+import time
+
+import pytest
+
+APP_PATH = pathlib.Path(__file__).resolve().parents[1] / "App.py"
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """
+    App.py's module namespace, started against a fresh database in a temp
+    directory. Importing runs the migrations and starts the shared writer,
+    caches and indexes exactly as a server start would; main() is not run.
+    """
+    workdir = tmp_path_factory.mktemp("app")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        namespace = runpy.run_path(str(APP_PATH), run_name="app_under_test")
+        wait_for_jobs(namespace)
+        yield namespace
+    finally:
+        os.chdir(previous)
+
+
+def wait_for_jobs(app, timeout=30):
+    """Let the maintenance job scheduled at start (VACUUM, ANALYZE) finish so tests don't race it."""
+    deadline = time.monotonic() + timeout
+    settled = """SELECT EXISTS (SELECT 1 FROM jobs WHERE kind = 'maintenance')
+                    AND NOT EXISTS (SELECT 1 FROM jobs WHERE status IN ('queued', 'running'))"""
+    while not app["conn"].execute(settled).fetchone()[0]:
+        assert time.monotonic() < deadline, "startup jobs did not finish"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def write(app):
+    """Run fn(cursor) on the app's writer and return its result."""
+    def run(fn, transactional=True):
+        return app["write_queue"].submit(fn, transactional=transactional).result(timeout=app["WRITE_TIMEOUT"])
+    return run
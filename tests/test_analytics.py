@@ -0,0 +1,26 @@
+import sqlite3
+import time
+
+import pytest
+
+
+def snapshot_count(engine, batch_name):
+    return int(engine.query("SELECT COUNT(*) AS n FROM tickets WHERE batch_name = ?", [batch_name])["n"][0])
+
+
+def test_snapshot_refreshes_after_a_foreign_commit(app):
+    pytest.importorskip("duckdb")
+    engine = app["AnalyticsEngine"](app["DB_PATH"], refresh_seconds=0)
+    assert snapshot_count(engine, "AN-EXT") == 0
+
+    other = sqlite3.connect(app["DB_PATH"])
+    other.execute("INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, created_at) "
+                  "VALUES ('2024-06-15', 'AN-EXT', 'AN-EXT-1', 1, 'Intake', 5, strftime('%s', 'now'))")
+    other.commit()
+    other.close()
+
+    # The refresh runs in the background; the next queries pick it up
+    deadline = time.monotonic() + 10
+    while snapshot_count(engine, "AN-EXT") == 0:
+        assert time.monotonic() < deadline, "the snapshot never refreshed"
+        time.sleep(0.05)
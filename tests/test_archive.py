@@ -0,0 +1,48 @@
+import datetime
+import os
+import sqlite3
+
+CREATED_AT = int(datetime.datetime(2024, 6, 15, 12).timestamp())
+
+
+def insert_closed(cur, ticket_number):
+    cur.execute(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay, created_at, updated_at) "
+        "VALUES ('2024-06-15', ?, 1, 'Delivered', 5, ?, ?)",
+        (ticket_number, CREATED_AT, CREATED_AT),
+    )
+
+
+def test_same_number_archived_twice_keeps_both_rows(app, write):
+    archive = lambda cur: app["archive_closed_tickets"](cur, -1)
+
+    write(lambda cur: insert_closed(cur, "ARCH-1"))
+    assert write(archive, transactional=False) == {2024: 1}
+
+    # The number comes back, is closed again and archived into the same year
+    write(lambda cur: insert_closed(cur, "ARCH-1"))
+    assert write(archive, transactional=False) == {2024: 1}
+
+    assert app["conn"].execute("SELECT COUNT(*) FROM tickets WHERE ticket_number = 'ARCH-1'").fetchone()[0] == 0
+    archived = sqlite3.connect(os.path.join(app["ARCHIVE_DIR"], "tickets_2024.db"))
+    assert archived.execute("SELECT COUNT(*) FROM tickets WHERE ticket_number = 'ARCH-1'").fetchone()[0] == 2
+
+
+def test_id_collision_archives_nothing(app, write):
+    write(lambda cur: insert_closed(cur, "ARCH-2"))
+    ticket_id = app["conn"].execute("SELECT id FROM tickets WHERE ticket_number = 'ARCH-2'").fetchone()[0]
+    path = os.path.join(app["ARCHIVE_DIR"], "tickets_2024.db")
+    archived = sqlite3.connect(path)
+    archived.execute("INSERT INTO tickets (id, ticket_number, created_at) VALUES (?, 'OTHER', 1)", (ticket_id,))
+    archived.commit()
+
+    try:
+        write(lambda cur: app["archive_closed_tickets"](cur, -1), transactional=False)
+    except RuntimeError as e:
+        assert "already belong to other rows" in str(e)
+    else:
+        raise AssertionError("an id collision must not be archived")
+    assert app["conn"].execute("SELECT COUNT(*) FROM tickets WHERE ticket_number = 'ARCH-2'").fetchone()[0] == 1
+
+    archived.execute("DELETE FROM tickets WHERE ticket_number = 'OTHER'")
+    archived.commit()
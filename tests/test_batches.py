@@ -0,0 +1,46 @@
+import sqlite3
+
+
+def insert(cur, batch_name, ticket_number, created_at):
+    cur.execute("INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, created_at) "
+                "VALUES ('2024-06-15', ?, ?, 2, 'Intake', 5, ?)", (batch_name, ticket_number, created_at))
+
+
+def names(app, text, prefix="Batch-"):
+    return [name for name, _ in app["find_batches"](text, prefix, app["write_queue"].version())]
+
+
+def test_finder_matches_prefixes_most_recent_first(app, write):
+    def seed(cur):
+        insert(cur, "BF-Alpha", "BF-1", 1000)
+        insert(cur, "BF-Alpha", "BF-2", 4000)
+        insert(cur, "BF-Beta", "BF-3", 3000)
+        insert(cur, "BF-Alphabet", "BF-4", 2000)
+        insert(cur, "BFX", "BF-5", 5000)
+        insert(cur, "Batch-770", "BF-6", 6000)
+        insert(cur, "770 spare", "BF-7", 500)
+    write(seed)
+
+    assert names(app, "BF-Al") == ["BF-Alpha", "BF-Alphabet"]
+    assert names(app, "BF-") == ["BF-Alpha", "BF-Beta", "BF-Alphabet"]
+    # "_" and "%" are plain characters, not LIKE wildcards
+    assert names(app, "BF_") == [] and names(app, "BF%") == []
+    # A bare number also matches under the batch prefix
+    assert names(app, "770") == ["Batch-770", "770 spare"]
+    assert names(app, "BF-A", prefix="BF-") == ["BF-Alpha", "BF-Alphabet"]
+
+
+def test_finder_sees_batches_from_another_process(app, write):
+    write(lambda cur: insert(cur, "BF-Local", "BF-L1", 7000))
+    assert names(app, "BF-Remote") == []
+    summary = app["batch_summary"]("BF-Local", app["write_queue"].version())
+    assert summary["tickets"] == 1
+
+    other = sqlite3.connect(app["DB_PATH"])
+    insert(other.cursor(), "BF-Remote", "BF-R1", 8000)
+    other.execute("DELETE FROM tickets WHERE batch_name = 'BF-Local'")
+    other.commit()
+    other.close()
+
+    assert names(app, "BF-Remote") == ["BF-Remote"]
+    assert app["batch_summary"]("BF-Local", app["write_queue"].version())["tickets"] == 0
@@ -0,0 +1,83 @@
+import pytest
+
+
+def insert_batch(cur, batch, count):
+    cur.executemany(
+        "INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay) "
+        "VALUES ('2024-06-15', ?, ?, 1, 'Intake', 5)",
+        [(batch, f"{batch}-{i}") for i in range(count)],
+    )
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("UPDATE tickets SET pay = 1 WHERE batch_name = 'x';",
+     "SELECT COUNT(*) FROM tickets WHERE batch_name = 'x'"),
+    ("update or ignore tickets AS t SET pay = (SELECT 1 WHERE 1) WHERE t.id > 3 RETURNING id",
+     "SELECT COUNT(*) FROM tickets AS t WHERE t.id > 3"),
+    ("UPDATE tickets SET comment = 'where from'",
+     "SELECT COUNT(*) FROM tickets"),
+    ("INSERT INTO tickets (ticket_number) VALUES ('a'), ('b')",
+     "SELECT COUNT(*) FROM (VALUES ('a'), ('b'))"),
+    ("REPLACE INTO tickets (ticket_number) SELECT ticket_number FROM tickets t JOIN tickets u ON t.id = u.id "
+     "WHERE 1 ON CONFLICT DO NOTHING",
+     "SELECT COUNT(*) FROM (SELECT ticket_number FROM tickets t JOIN tickets u ON t.id = u.id WHERE 1)"),
+    ("INSERT INTO tickets DEFAULT VALUES", "SELECT 1"),
+    ("UPDATE tickets SET pay = s.pay FROM tickets s WHERE s.id = tickets.id", None),
+])
+def test_count_rows_sql(app, sql, expected):
+    count_sql = app["count_rows_sql"](sql)
+    assert (count_sql and " ".join(count_sql.replace("( ", "(").replace(" )", ")").split())) == expected
+
+
+def test_dry_run_matches_the_real_write(app, write):
+    write(lambda cur: insert_batch(cur, "DRY", 7))
+    update = "UPDATE tickets SET pay = 9 WHERE batch_name = 'DRY' AND ticket_number <> 'DRY-0'"
+
+    assert app["dry_run_sql"](update, 5) == 6
+    assert app["conn"].execute("SELECT COUNT(*) FROM tickets WHERE pay = 9").fetchone()[0] == 0
+    assert app["execute_guarded_write"](update, 5) == 6
+
+
+def test_dry_run_fallback_rolls_back_on_the_writer(app, write):
+    write(lambda cur: insert_batch(cur, "DRYFROM", 3))
+    update = ("UPDATE tickets SET pay = 11 FROM (SELECT id FROM tickets WHERE batch_name = 'DRYFROM') s "
+              "WHERE s.id = tickets.id")
+
+    assert app["dry_run_sql"](update, 5) == 3
+    assert app["conn"].execute("SELECT COUNT(*) FROM tickets WHERE pay = 11").fetchone()[0] == 0
+    # The writer is free again straight away
+    write(lambda cur: insert_batch(cur, "DRYAFTER", 1))
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT ticket_number FROM tickets WHERE batch_name = 'PAGE' -- newest first",
+    "SELECT ticket_number FROM tickets WHERE batch_name = 'PAGE'; -- done",
+    "SELECT ticket_number FROM tickets /* all */ WHERE batch_name = 'PAGE' /* of them */ ;",
+])
+def test_read_sql_page_wraps_queries_with_trailing_comments(app, write, sql):
+    if not app["conn"].execute("SELECT 1 FROM tickets WHERE batch_name = 'PAGE'").fetchone():
+        write(lambda cur: insert_batch(cur, "PAGE", 3))
+    df, has_more = app["read_sql_page"](sql, 0, 5)
+    assert len(df) == 3 and not has_more
+
+
+def test_statement_body_keeps_comment_markers_inside_strings(app):
+    assert app["statement_body"]("SELECT '-- not a comment' -- a comment\n;") == "SELECT '-- not a comment'"
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM tickets t WHERE t.comments LIKE '%x%'", "Full scan of `tickets`"),
+    ("SELECT * FROM tickets AS tk", "Full scan of `tickets`"),
+    ("SELECT t.* FROM ticket_events e JOIN tickets t ON t.id = e.ticket_id", "`ticket_events`"),
+    ("SELECT COUNT(*) FROM tickets", "through index"),
+])
+def test_explain_sql_names_the_table_behind_an_alias(app, sql, expected):
+    _, warnings = app["explain_sql"](sql)
+    assert any(expected in warning for warning in warnings), warnings
+    assert all("`t`" not in warning and "`e`" not in warning and "`tk`" not in warning for warning in warnings)
+
+
+def test_explain_sql_skips_subquery_and_cte_scans(app):
+    _, warnings = app["explain_sql"](
+        "WITH w AS MATERIALIZED (SELECT batch_name FROM tickets) SELECT * FROM w")
+    assert [w for w in warnings if "`w`" in w] == []
@@ -0,0 +1,49 @@
+import time
+
+import pandas as pd
+import pytest
+
+
+def hist(*bucket_counts):
+    return pd.DataFrame(bucket_counts, columns=["bucket", "n"])
+
+
+def test_percentiles_interpolate_inside_a_bucket(app):
+    # 10 tickets in 0-60 s, 10 in 60-300 s
+    result = app["histogram_percentiles"](hist((0, 10), (1, 10)))
+    assert result["count"] == 20
+    assert result["p50"] == pytest.approx(60.0)
+    assert result["p90"] == pytest.approx(60 + 0.8 * 240)
+    assert result["p95"] == pytest.approx(60 + 0.9 * 240)
+
+
+def test_percentiles_merge_rows_of_the_same_bucket(app):
+    split = app["histogram_percentiles"](hist((1, 4), (0, 2), (1, 4)))
+    merged = app["histogram_percentiles"](hist((0, 2), (1, 8)))
+    assert split == merged
+
+
+def test_catch_all_bucket_reports_its_lower_bound(app):
+    buckets = app["CYCLE_TIME_BUCKETS"]
+    result = app["histogram_percentiles"](hist((len(buckets) - 1, 3)))
+    assert result["p50"] == buckets[-2]
+
+
+def test_empty_histogram_has_no_percentiles(app):
+    assert app["histogram_percentiles"](hist()) == {"count": 0, "p50": None, "p90": None, "p95": None}
+
+
+def test_status_change_lands_in_the_histogram(app, write):
+    created_at = int(time.time()) - 5000  # 5000 s of lead time: the 1-2 h bucket
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, created_at, updated_at) "
+        "VALUES ('2024-06-15', 'HIST', 'HIST-1', 1, 'Intake', 5, ?, ?)", (created_at, created_at)))
+    write(lambda cur: cur.execute("UPDATE tickets SET status = 'Delivered' WHERE ticket_number = 'HIST-1'"))
+
+    df_hist = pd.read_sql(
+        "SELECT bucket, n FROM cycle_time_hist WHERE scope = 'batch' AND scope_key = 'HIST' "
+        "AND from_code = ? AND to_code = ?",
+        app["conn"], params=[app["LEAD_TIME_FROM_CODE"], app["STATUS_CODES"]["Delivered"]])
+    result = app["histogram_percentiles"](df_hist)
+    assert result["count"] == 1
+    assert 3600 <= result["p50"] <= 7200
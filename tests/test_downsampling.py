@@ -0,0 +1,34 @@
+import datetime
+
+import numpy as np
+import pytest
+
+
+def test_lttb_keeps_endpoints_order_and_spikes(app):
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[537] = 40.0  # a one-day spike must survive downsampling
+
+    picked = app["lttb_indices"](x, y, 100)
+
+    assert len(picked) == 100
+    assert picked[0] == 0 and picked[-1] == 999
+    assert np.all(np.diff(picked) > 0)
+    assert 537 in picked
+
+
+@pytest.mark.parametrize("threshold", [2, 5, 10])
+def test_lttb_returns_every_point_below_three_or_above_the_length(app, threshold):
+    x = np.arange(5)
+    assert app["lttb_indices"](x, x * 2.0, threshold).tolist() == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("days, expected", [(0, "Day"), (92, "Day"), (93, "Week"), (550, "Week"), (551, "Month")])
+def test_pick_resolution_by_span(app, days, expected):
+    start = datetime.date(2024, 1, 1)
+    assert app["pick_resolution"](start, start + datetime.timedelta(days=days)) == expected
+
+
+def test_pick_resolution_respects_an_explicit_choice(app):
+    start = datetime.date(2020, 1, 1)
+    assert app["pick_resolution"](start, datetime.date(2024, 1, 1), "Day") == "Day"
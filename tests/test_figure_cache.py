@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+import plotly.graph_objects as go
+
+
+def foreign_insert(app, ticket_number, batch_name="FOREIGN"):
+    """A commit from another process: a connection the writer knows nothing about."""
+    other = sqlite3.connect(app["DB_PATH"])
+    other.execute("INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, created_at) "
+                  "VALUES ('2024-06-15', ?, ?, 1, 'Intake', 5, strftime('%s', 'now'))", (batch_name, ticket_number))
+    other.commit()
+    other.close()
+
+
+def settle(get):
+    """Background jobs may still be committing through the writer; call get() until it is a cache hit."""
+    for _ in range(50):
+        if not get():
+            return
+        time.sleep(0.1)
+    raise AssertionError("the data version never settled")
+
+
+def test_figures_rebuild_after_a_foreign_commit(app):
+    cache = app["FigureCache"]()
+    builds = []
+
+    def get():
+        """Whether this call had to build."""
+        before = len(builds)
+        cache.get_or_build("chart", {"a": 1}, lambda: builds.append(1) or go.Figure())
+        return len(builds) > before
+
+    settle(get)
+    foreign_insert(app, "FIG-EXT")
+    assert get()
+    assert not get()
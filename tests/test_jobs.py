@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+
+def job_status(app, job_id):
+    return app["conn"].execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def wait_for_status(app, job_id, *statuses, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job_status(app, job_id) not in statuses:
+        assert time.monotonic() < deadline, f"job {job_id} is still {job_status(app, job_id)}"
+        time.sleep(0.02)
+    return job_status(app, job_id)
+
+
+@pytest.fixture
+def release():
+    """Set to let blocking jobs finish; always set at teardown so no worker is left waiting."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def blocking_job(release, ran=None):
+    def fn(job):
+        if ran is not None:
+            ran.append(job.job_id)
+        while not release.wait(0.02):
+            job.progress(0.5, "Waiting")
+        return {"ok": True}
+    return fn
+
+
+def test_new_runner_leaves_live_jobs_alone(app, release):
+    runner = app["job_runner"]
+    job_id = runner.submit("test", "blocks", blocking_job(release))
+    wait_for_status(app, job_id, "running")
+
+    # A second server process (or a rebuilt cache_resource) starts its own runner
+    app["JobRunner"]()
+    assert job_status(app, job_id) == "running"
+
+    release.set()
+    assert wait_for_status(app, job_id, "succeeded", "failed") == "succeeded"
+
+
+def test_only_orphaned_jobs_are_reaped(app, write):
+    now = int(time.time())
+
+    def seed(cur):
+        rows = [("gone", now - 3600), ("alive", now), (None, now)]
+        return [cur.execute("INSERT INTO jobs (kind, status, created_at, owner, heartbeat_at) "
+                            "VALUES ('test', 'running', ?, ?, ?)", (now, owner, beat)).lastrowid
+                for owner, beat in rows]
+    gone, alive, legacy = write(seed)
+
+    assert app["job_runner"].reap_orphans() == 2
+    assert [job_status(app, j) for j in (gone, alive, legacy)] == ["failed", "running", "failed"]
+    write(lambda cur: cur.execute("UPDATE jobs SET status = 'failed' WHERE id = ?", (alive,)))
+
+
+def test_cancel_from_another_process_stops_a_running_job(app, release):
+    runner = app["job_runner"]
+    job_id = runner.submit("test", "cancelled elsewhere", blocking_job(release))
+    wait_for_status(app, job_id, "running")
+
+    # The other process only has the database flag to go on
+    app["JobRunner"]().cancel(job_id)
+    runner.heartbeat()
+    assert wait_for_status(app, job_id, "cancelled", "succeeded") == "cancelled"
+
+
+def test_job_cancelled_while_queued_never_runs(app, write, release):
+    runner, ran = app["JobRunner"](max_workers=1), []
+    first = runner.submit("test", "holds the only worker", blocking_job(release))
+    wait_for_status(app, first, "running")
+    queued = runner.submit("test", "cancelled while queued", blocking_job(release, ran))
+    write(lambda cur: cur.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (queued,)))
+
+    release.set()
+    assert wait_for_status(app, queued, "cancelled", "succeeded", "failed") == "cancelled"
+    assert ran == []
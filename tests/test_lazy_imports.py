@@ -0,0 +1,19 @@
+import sys
+
+
+def test_lazy_module_imports_on_first_use_and_reports_it(app):
+    name = "tabnanny"
+    sys.modules.pop(name, None)
+    lazy = app["LazyModule"](name)
+    assert name not in sys.modules
+
+    assert callable(lazy.check)
+    assert name in sys.modules
+    report = app["get_startup_report"]()["imports"][name]
+    assert report["seconds"] >= 0 and report["page"]
+
+
+def test_page_times_keep_the_first_render_apart(app):
+    app["record_page_time"]("Lazy Test Page", 2.0)
+    app["record_page_time"]("Lazy Test Page", 0.5)
+    assert app["get_startup_report"]()["pages"]["Lazy Test Page"] == {"first": 2.0, "last": 0.5, "runs": 2}
@@ -0,0 +1,90 @@
+import datetime
+import sqlite3
+
+import pytest
+
+
+def balance(app):
+    return app["conn"].execute("SELECT earned_cents, pending_cents FROM ledger_balance WHERE id = 1").fetchone()
+
+
+def day(app, date):
+    return app["conn"].execute(
+        "SELECT earned_cents, sub_tickets FROM ledger_daily WHERE date = ?", (date,)).fetchone() or (0, 0)
+
+
+def insert(cur, ticket_number, date, status="Intake", subs=2, pay=5.5):
+    cur.execute("INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay) VALUES (?, ?, ?, ?, ?)",
+                (date, ticket_number, subs, status, pay))
+
+
+def test_postings_follow_the_ticket(app, write):
+    earned, pending = balance(app)
+
+    write(lambda cur: insert(cur, "LED-1", "2023-05-02"))
+    assert balance(app) == (earned, pending + 1100)
+    assert day(app, "2023-05-02") == (0, 0)
+
+    write(lambda cur: cur.execute("UPDATE tickets SET status = 'Delivered' WHERE ticket_number = 'LED-1'"))
+    assert balance(app) == (earned + 1100, pending)
+    assert day(app, "2023-05-02") == (1100, 2)
+
+    # Re-pricing and re-dating a delivered ticket moves its earnings
+    write(lambda cur: cur.execute(
+        "UPDATE tickets SET pay = 0.1, num_sub_tickets = 3, date = '2023-05-03' WHERE ticket_number = 'LED-1'"))
+    assert balance(app) == (earned + 30, pending)
+    assert day(app, "2023-05-02") == (0, 0)
+    assert day(app, "2023-05-03") == (30, 3)
+
+    write(lambda cur: cur.execute("DELETE FROM tickets WHERE ticket_number = 'LED-1'"))
+    assert balance(app) == (earned, pending)
+    assert day(app, "2023-05-03") == (0, 0)
+
+
+def test_archiving_keeps_earnings_on_the_books(app, write):
+    write(lambda cur: insert(cur, "LED-2", "2023-06-02", status="Delivered"))
+    earned, pending = balance(app)
+
+    def archive(cur):
+        cur.execute("INSERT INTO maintenance_flags (name) VALUES ('archiving')")
+        cur.execute("DELETE FROM tickets WHERE ticket_number = 'LED-2'")
+        cur.execute("DELETE FROM maintenance_flags WHERE name = 'archiving'")
+
+    write(archive)
+    assert balance(app) == (earned, pending)
+    assert day(app, "2023-06-02") == (1100, 2)
+
+
+def test_posting_sql_books_whole_cents(app):
+    scratch = sqlite3.connect(":memory:")
+    scratch.execute("CREATE TABLE ledger_balance (id INTEGER PRIMARY KEY, earned_cents INTEGER, pending_cents INTEGER)")
+    scratch.execute("CREATE TABLE ledger_daily (date TEXT PRIMARY KEY, earned_cents INTEGER, sub_tickets INTEGER)")
+    scratch.execute("CREATE TABLE t (date TEXT, created_at INTEGER, num_sub_tickets INTEGER, pay REAL, status_code INTEGER)")
+    scratch.execute("INSERT INTO ledger_balance VALUES (1, 0, 0)")
+    scratch.execute(f"CREATE TRIGGER t_ai AFTER INSERT ON t BEGIN{app['ledger_posting_sql']('NEW', '+', 3)} END")
+    scratch.executemany("INSERT INTO t VALUES ('2023-01-01', NULL, 1, 0.1, 3)", [()] * 10)
+    scratch.execute("INSERT INTO t VALUES (NULL, ?, 1, 1, 1)",
+                    (int(datetime.datetime(2023, 1, 2, 12).timestamp()),))
+
+    assert scratch.execute("SELECT earned_cents, pending_cents FROM ledger_balance").fetchone() == (100, 100)
+    assert scratch.execute("SELECT * FROM ledger_daily").fetchall() == [("2023-01-01", 100, 10)]
+
+
+def test_close_ledger_periods_snapshots_finished_months_once(app, write):
+    write(lambda cur: insert(cur, "LED-3", "2022-02-10", status="Delivered"))
+    this_month = datetime.date.today().isoformat()
+    write(lambda cur: insert(cur, "LED-4", this_month, status="Delivered"))
+
+    assert write(app["close_ledger_periods"]) >= 1
+    period = "SELECT earned_cents, sub_tickets FROM ledger_periods WHERE month = ?"
+    assert app["conn"].execute(period, ("2022-02",)).fetchone() == (1100, 2)
+    assert app["conn"].execute(period, (this_month[:7],)).fetchone() is None
+
+    # Later changes land in the daily ledger; the closed snapshot stays as it was
+    write(lambda cur: cur.execute("UPDATE tickets SET pay = 6 WHERE ticket_number = 'LED-3'"))
+    assert write(app["close_ledger_periods"]) == 0
+    assert app["conn"].execute(period, ("2022-02",)).fetchone() == (1100, 2)
+    assert day(app, "2022-02-10") == (1200, 2)
+
+    with pytest.raises(sqlite3.IntegrityError, match="immutable"):
+        write(lambda cur: cur.execute("DELETE FROM ledger_periods WHERE month = '2022-02'"))
@@ -0,0 +1,61 @@
+import sqlite3
+import time
+
+import pytest
+
+CREATED_AT = 1_500_000_000
+
+
+@pytest.fixture
+def dashboard(app):
+    session = app["st"].session_state
+    session.dashboard_cache = {}
+    yield session.dashboard_cache
+    session.dashboard_cache = {}
+
+
+def test_change_token_moves_on_our_commits_and_foreign_ones(app, write):
+    token = app["change_token"]()
+    assert app["change_token"]() == token
+
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, status) VALUES ('2024-06-15', 'LIVE-1', 'Intake')"))
+    moved = app["change_token"]()
+    assert moved != token
+
+    other = sqlite3.connect(app["DB_PATH"])
+    other.execute("UPDATE tickets SET comments = 'from elsewhere' WHERE ticket_number = 'LIVE-1'")
+    other.commit()
+    other.close()
+    assert app["change_token"]() != moved
+
+
+def wait_out_recent_deletes(app):
+    """dashboard_changes looks back a second, so deletes made by earlier tests would read as "everything"."""
+    recent = "SELECT 1 FROM ticket_events WHERE to_code IS NULL AND at >= ?"
+    while app["conn"].execute(recent, (int(time.time()) - 1,)).fetchone():
+        time.sleep(0.05)
+
+
+def test_dashboard_changes_report_the_span_that_moved(app, write, dashboard):
+    wait_out_recent_deletes(app)
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, status, created_at) VALUES ('2017-07-14', 'LIVE-2', 'Intake', ?)",
+        (CREATED_AT,)))
+    first = app["dashboard_changes"]()
+    assert first["everything"]
+    assert app["dashboard_changes"]() is None
+
+    write(lambda cur: cur.execute("UPDATE tickets SET status = 'Return' WHERE ticket_number = 'LIVE-2'"))
+    changes = app["dashboard_changes"]()
+    assert changes["any"] and not changes["everything"]
+    assert changes["min_created"] <= CREATED_AT <= changes["max_created"]
+    span_touched = app["span_touched"]
+    assert span_touched(changes, CREATED_AT - 10, CREATED_AT + 10)
+    assert not span_touched(changes, changes["max_created"] + 1)
+    assert not span_touched(None, 0)
+
+    # A delete can affect any widget, wherever the row was
+    write(lambda cur: cur.execute("DELETE FROM tickets WHERE ticket_number = 'LIVE-2'"))
+    changes = app["dashboard_changes"]()
+    assert changes["everything"] and span_touched(changes, 0, 1)
@@ -0,0 +1,55 @@
+import sqlite3
+
+
+class Job:
+    """Stands in for JobContext and records the progress a job reports."""
+    job_id = 0
+
+    def __init__(self):
+        self.updates = []
+
+    def progress(self, fraction, message=""):
+        self.updates.append((fraction, message))
+
+
+def pragma(app, name):
+    return app["conn"].execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_chunked_delete_removes_every_match_and_frees_its_pages(app, write):
+    chunk = app["JOB_CHUNK_SIZE"]
+    count = chunk * 2 + chunk // 2
+    write(lambda cur: cur.executemany(
+        "INSERT INTO tickets (date, batch_name, ticket_number, status, comments) "
+        "VALUES ('2024-06-15', 'DEL-BULK', ?, 'Intake', ?)",
+        [(f"DEL-{i}", "x" * 400) for i in range(count)]))
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, batch_name, ticket_number, status) VALUES ('2024-06-15', 'DEL-KEEP', 'DEL-K', 'Intake')"))
+    assert pragma(app, "auto_vacuum") == 2  # INCREMENTAL
+    pages = pragma(app, "page_count")
+
+    job = Job()
+    assert app["delete_tickets_job"](job, "batch_name = ?", ("DEL-BULK",)) == {"deleted": count}
+
+    # One progress step per chunk, then the page reclaim
+    assert [round(f, 2) for f, _ in job.updates] == [0.4, 0.8, 1.0, 1.0]
+    assert app["conn"].execute("SELECT batch_name, COUNT(*) FROM tickets WHERE batch_name LIKE 'DEL-%' "
+                               "GROUP BY 1").fetchall() == [("DEL-KEEP", 1)]
+    assert pragma(app, "freelist_count") == 0
+    assert pragma(app, "page_count") < pages
+
+
+def test_reclaim_free_pages_stops_at_its_page_budget(app, tmp_path):
+    scratch = sqlite3.connect(tmp_path / "vacuum.db", isolation_level=None)
+    scratch.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    scratch.execute("CREATE TABLE t (v TEXT)")
+    scratch.executemany("INSERT INTO t VALUES (?)", [("y" * 1000,)] * 200)
+    scratch.execute("DELETE FROM t")
+    free = scratch.execute("PRAGMA freelist_count").fetchone()[0]
+    assert free > 10
+
+    assert app["reclaim_free_pages"](scratch.cursor(), max_pages=10) == 10
+    assert scratch.execute("PRAGMA freelist_count").fetchone()[0] == free - 10
+    assert app["reclaim_free_pages"](scratch.cursor()) == free - 10
+    assert app["reclaim_free_pages"](scratch.cursor()) == 0
+    scratch.close()
@@ -0,0 +1,36 @@
+import json
+import os
+
+
+def test_only_the_newest_profiles_per_page_are_kept(app):
+    profile_dir, keep = app["PROFILE_DIR"], app["PROFILE_KEEP_PER_PAGE"]
+    os.makedirs(profile_dir, exist_ok=True)
+    old = [f"Prune_Me_20200101-0000{n:02d}" for n in range(keep + 3)]
+    for stem in old + ["Prune_Me_Too_20200101-000000"]:
+        for suffix in (".pstats", ".speedscope.json"):
+            open(os.path.join(profile_dir, stem + suffix), "w").close()
+
+    profile = app["profile_page"]("Prune Me", lambda: sum(range(100)))
+
+    left = sorted(name for name in os.listdir(profile_dir) if name.startswith("Prune_Me_2"))
+    newest = sorted(old)[-(keep - 1):] + [os.path.basename(profile["pstats"]).split(".")[0]]
+    assert left == sorted(stem + suffix for stem in newest for suffix in (".pstats", ".speedscope.json"))
+    # Another page whose name shares the prefix is left alone
+    assert os.path.exists(os.path.join(profile_dir, "Prune_Me_Too_20200101-000000.pstats"))
+
+
+def test_profile_summary_and_speedscope_file(app):
+    def render():
+        return sorted(str(n) for n in range(20_000))
+
+    profile = app["profile_page"]("Summary Check", render)
+    assert profile["seconds"] > 0 and profile["peak_bytes"] > 0
+    assert any("render" in row["function"] for row in profile["top"])
+
+    with open(profile["speedscope"]) as f:
+        speedscope = json.load(f)
+    sampled = speedscope["profiles"][0]
+    frames = speedscope["shared"]["frames"]
+    assert len(sampled["samples"]) == len(sampled["weights"]) > 0
+    assert all(0 <= index < len(frames) for stack in sampled["samples"] for index in stack)
+    assert os.path.getsize(profile["pstats"]) > 0
@@ -0,0 +1,154 @@
+import sqlite3
+
+import pandas
+import pytest
+
+
+@pytest.fixture
+def cache(app):
+    app["query_cache"].invalidate(None)
+    return app["query_cache"]
+
+
+def add_ticket(cur, ticket_number, school=None, status="Intake"):
+    cur.execute(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay, ticket_school) "
+        "VALUES (date('now'), ?, 1, ?, 5, ?)",
+        (ticket_number, status, school),
+    )
+
+
+def count(app, sql, params=()):
+    return app["conn"].execute(sql, params).fetchone()[0]
+
+
+def test_normalize_sql_keeps_string_literals(app):
+    normalize = app["normalize_sql"]
+    assert normalize("SELECT  a,\n   b\tFROM t ") == "SELECT a, b FROM t"
+    assert normalize("SELECT 'two  spaces'  FROM t") == "SELECT 'two  spaces' FROM t"
+    assert normalize("SELECT 'it''s   ok' ,  1") == "SELECT 'it''s   ok' , 1"
+
+
+def test_repeated_reads_hit_and_params_are_separate(app, cache):
+    sql = "SELECT COUNT(*) AS n FROM tickets WHERE status_code = ?"
+    hits = cache.hits
+    first = app["cached_read_sql"](sql, [1])
+    again = app["cached_read_sql"]("SELECT COUNT(*) AS n\n  FROM tickets WHERE status_code = ?", [1])
+    assert cache.hits == hits + 1
+    assert first.equals(again)
+    app["cached_read_sql"](sql, [2])
+    assert cache.hits == hits + 1
+
+
+def test_writes_by_triggers_invalidate(app, cache, write):
+    sql = "SELECT TOTAL(tickets) AS n FROM school_daily WHERE school = 'QC School'"
+    assert app["cached_read_sql"](sql)["n"][0] == 0
+    # The ticket insert only writes school_daily through a trigger
+    write(lambda cur: add_ticket(cur, "QC-1", school="QC School"))
+    assert app["cached_read_sql"](sql)["n"][0] == 1
+
+
+def test_unrelated_write_keeps_entry(app, cache, write):
+    sql = "SELECT COUNT(*) AS n FROM tickets"
+    app["cached_read_sql"](sql)
+    hits = cache.hits
+    write(lambda cur: cur.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('qc_test')"))
+    write(lambda cur: cur.execute("DELETE FROM maintenance_flags WHERE name = 'qc_test'"))
+    app["cached_read_sql"](sql)
+    assert cache.hits == hits + 1
+
+
+def test_rolled_back_mutation_leaves_results_correct(app, cache, write):
+    sql = "SELECT COUNT(*) AS n FROM tickets WHERE ticket_number = 'QC-ROLLBACK'"
+    assert app["cached_read_sql"](sql)["n"][0] == 0
+
+    def failing(cur):
+        add_ticket(cur, "QC-ROLLBACK")
+        raise RuntimeError("fail after writing")
+
+    with pytest.raises(RuntimeError):
+        write(failing)
+    assert app["cached_read_sql"](sql)["n"][0] == 0 == count(app, sql)
+
+
+def test_commit_during_query_is_not_cached(app, cache, write, monkeypatch):
+    sql = "SELECT COUNT(*) AS n FROM tickets WHERE ticket_number LIKE 'QC-RACE%'"
+    original = pandas.read_sql
+    calls = []
+
+    def read_then_commit(*args, **kwargs):
+        frame = original(*args, **kwargs)
+        if not calls:
+            calls.append(1)
+            write(lambda cur: add_ticket(cur, "QC-RACE-1"))
+        return frame
+
+    monkeypatch.setattr(pandas, "read_sql", read_then_commit)
+    assert app["cached_read_sql"](sql)["n"][0] == 0
+    monkeypatch.setattr(pandas, "read_sql", original)
+    assert app["cached_read_sql"](sql)["n"][0] == 1
+
+
+def test_commit_from_another_connection_invalidates(app, cache):
+    sql = "SELECT COUNT(*) AS n FROM tickets WHERE ticket_number = 'QC-EXTERNAL'"
+    assert app["cached_read_sql"](sql)["n"][0] == 0
+    other = sqlite3.connect(app["DB_PATH"])
+    add_ticket(other.cursor(), "QC-EXTERNAL")
+    other.commit()
+    other.close()
+    assert app["cached_read_sql"](sql)["n"][0] == 1
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT COUNT(*) AS n FROM tickets WHERE date <= date('now')", ()),
+    ("SELECT COUNT(*) AS n FROM tickets WHERE date <= date()", ()),
+    ("SELECT COUNT(*) AS n FROM tickets WHERE created_at <= strftime('%s')", ()),
+    ("SELECT COUNT(*) AS n FROM tickets WHERE created_at <= unixepoch()", ()),
+    ("SELECT COUNT(*) AS n FROM tickets WHERE date <= CURRENT_DATE", ()),
+    ("SELECT CURRENT_TIMESTAMP AS n FROM tickets LIMIT 1", ()),
+    ("SELECT COUNT(*) AS n FROM tickets WHERE date <= date(?)", ("now",)),
+    ("SELECT random() AS n", ()),
+    ("PRAGMA page_count", ()),
+])
+def test_volatile_reads_are_not_cached(app, cache, sql, params):
+    uncacheable = cache.uncacheable
+    app["cached_read_sql"](sql, params)
+    assert cache.uncacheable == uncacheable + 1
+
+
+def test_date_functions_on_columns_are_cached(app, cache):
+    sql = "SELECT strftime('%w', date) AS weekday, COUNT(*) AS n FROM tickets WHERE date >= date(?) GROUP BY 1"
+    uncacheable, hits = cache.uncacheable, cache.hits
+    app["cached_read_sql"](sql, ["2020-01-01"])
+    app["cached_read_sql"](sql, ["2020-01-01"])
+    assert cache.uncacheable == uncacheable
+    assert cache.hits == hits + 1
+
+
+def test_archive_union_reads_on_the_callers_connection(app, cache, write):
+    # Archived in a year of its own, like tickets 400 days back
+    created_at = int(pandas.Timestamp("2019-03-01 12:00").timestamp())
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay, created_at) "
+        "VALUES ('2019-03-01', 'QC-ARCH', 1, 'Delivered', 5, ?)", (created_at,)))
+    write(lambda cur: app["archive_closed_tickets"](cur, -1), transactional=False)
+
+    # A later script run has its own connection; the union view and ATTACH exist only there
+    later_run = app["get_db_connection"]()
+    source = app["tickets_source"](later_run, created_at - 1, created_at + 1)
+    assert source.startswith("tickets_with_archive_")
+    sql = f"SELECT COUNT(*) AS n FROM {source} WHERE created_at >= ? AND created_at < ?"
+    uncacheable = cache.uncacheable
+
+    for _ in range(2):
+        assert cache.read_sql(later_run, sql, [created_at - 1, created_at + 1])["n"][0] == 1
+    assert cache.uncacheable == uncacheable + 2
+    assert cache.read_sql(later_run, "SELECT COUNT(*) AS n FROM archive_2019.tickets")["n"][0] >= 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_bare_count_is_invalidated(app, cache, write):
+    sql = "SELECT COUNT(*) AS n FROM tickets"
+    before = app["cached_read_sql"](sql)["n"][0]
+    write(lambda cur: add_ticket(cur, "QC-COUNT-1"))
+    assert app["cached_read_sql"](sql)["n"][0] == before + 1
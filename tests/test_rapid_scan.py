@@ -0,0 +1,63 @@
+from concurrent.futures import Future
+
+import pytest
+
+
+@pytest.fixture
+def scan(app):
+    session = app["st"].session_state
+    session.scan_session = app["new_scan_session"]("SCAN-A")
+    yield session.scan_session
+    session.scan_session = None
+
+
+def wait_for_pending(app, scan):
+    for future, *_ in scan["pending"]:
+        future.result(timeout=app["WRITE_TIMEOUT"])
+    app["flush_scans"]()
+
+
+def batch_of(app, ticket_number):
+    return app["conn"].execute("SELECT batch_name FROM tickets WHERE ticket_number = ?", (ticket_number,)).fetchone()
+
+
+def test_forced_flush_saves_a_short_buffer(app, scan):
+    scan["buffer"].append(("SCAN-1", *app["ticket_timestamp"](), None))
+
+    app["flush_scans"]()
+    assert scan["buffer"] and not scan["pending"]
+
+    app["flush_scans"](force=True)
+    assert not scan["buffer"]
+    wait_for_pending(app, scan)
+    assert scan["saved"] == 1 and not scan["pending"]
+    assert batch_of(app, "SCAN-1") == ("SCAN-A",)
+
+
+def failed_future(message):
+    future = Future()
+    future.set_exception(RuntimeError(message))
+    return future
+
+
+def test_failed_write_is_sent_again_under_its_own_batch(app, scan):
+    rows = [("SCAN-2", *app["ticket_timestamp"](), None)]
+    scan["pending"].append((failed_future("database is locked"), rows, "SCAN-OLD", 1))
+    scan["batch_name"] = "SCAN-NEW"
+
+    app["flush_scans"]()
+    assert scan["error"] == "database is locked"
+    assert len(scan["pending"]) == 1
+    wait_for_pending(app, scan)
+    assert scan["saved"] == 1
+    assert batch_of(app, "SCAN-2") == ("SCAN-OLD",)
+
+
+def test_write_that_keeps_failing_is_listed_as_unsaved(app, scan):
+    rows = [("SCAN-3", *app["ticket_timestamp"](), None)]
+    scan["pending"].append((failed_future("disk I/O error"), rows, "SCAN-A", app["SCAN_MAX_ATTEMPTS"]))
+
+    app["flush_scans"]()
+    assert scan["pending"] == []
+    assert scan["failed"] == [(rows, "SCAN-A", "disk I/O error")]
+    assert batch_of(app, "SCAN-3") is None
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+
+def test_recent_failure_stops_automatic_reruns(app, write):
+    now = int(time.time())
+    job_id = write(lambda cur: cur.execute(
+        "INSERT INTO jobs (kind, status, created_at, finished_at, error) "
+        "VALUES ('school_report', 'failed', ?, ?, 'boom')", (now, now)).lastrowid)
+    try:
+        *_, running, failure = app["school_report_status"]()
+        assert not running and failure == "boom"
+
+        # Once the back-off has passed the page may try again
+        write(lambda cur: cur.execute("UPDATE jobs SET finished_at = ? WHERE id = ?",
+                                      (now - app["SCHOOL_REPORT_RETRY_SECONDS"] - 1, job_id)))
+        assert app["school_report_status"]()[3] is None
+    finally:
+        write(lambda cur: cur.execute("DELETE FROM jobs WHERE id = ?", (job_id,)))
+
+
+def test_report_from_the_same_second_as_the_last_change_is_current(app, write):
+    changed_at = app["conn"].execute("""
+        SELECT MAX(COALESCE((SELECT MAX(local_changed_at) FROM tickets), 0),
+                   COALESCE((SELECT MAX(local_changed_at) FROM ticket_tombstones), 0))
+    """).fetchone()[0]
+    previous = app["conn"].execute("SELECT MAX(generated_at) FROM school_report").fetchone()[0]
+
+    def report(generated_at):
+        return lambda cur: cur.execute(
+            "INSERT OR REPLACE INTO school_report (school, generated_at) VALUES ('SR-TEST', ?)", (generated_at,))
+    try:
+        write(report(changed_at))
+        if previous is None or previous <= changed_at:
+            assert app["school_report_status"]()[1] is False
+        write(report(changed_at - 1))
+        if previous is None or previous < changed_at:
+            assert app["school_report_status"]()[1] is True
+    finally:
+        write(lambda cur: cur.execute("DELETE FROM school_report WHERE school = 'SR-TEST'"))
+
+
+def test_backfill_counts_tickets_archived_before_the_migration(app, tmp_path):
+    copy = sqlite3.connect(tmp_path / "copy.db")
+    source = sqlite3.connect(app["DB_PATH"])
+    source.backup(copy)
+    source.close()
+    delivered = copy.execute("SELECT code FROM statuses WHERE name = 'Delivered'").fetchone()[0]
+
+    archive_path = str(tmp_path / "archive_1987.db")
+    copy.execute("ATTACH DATABASE ? AS old", (archive_path,))
+    copy.execute("CREATE TABLE old.tickets AS SELECT * FROM main.tickets WHERE 0")
+    copy.execute("INSERT INTO old.tickets (id, date, ticket_number, num_sub_tickets, pay, status_code, ticket_school) "
+                 "VALUES (1, '1987-03-04', 'SR-ARCH-1', 4, 2.5, ?, 'Backfill High')", (delivered,))
+    copy.commit()
+    copy.execute("DETACH DATABASE old")
+    copy.execute("INSERT INTO archive_files (year, path, min_created_at, max_created_at, row_count) "
+                 "VALUES (1987, ?, 0, 0, 1)", (archive_path,))
+    copy.execute("INSERT INTO maintenance_flags (name) VALUES ('school_archive_backfill')")
+    copy.commit()
+
+    app["finish_school_backfill"](copy)
+    assert copy.execute(
+        "SELECT tickets, sub_tickets, delivered_sub_tickets, earned_cents FROM school_daily "
+        "WHERE school = 'Backfill High' AND date = '1987-03-04'").fetchone() == (1, 4, 4, 1000)
+    total = copy.execute("SELECT SUM(tickets) FROM school_daily").fetchone()[0]
+
+    # Rebuilt, not added to: a second run changes nothing
+    copy.execute("INSERT INTO maintenance_flags (name) VALUES ('school_archive_backfill')")
+    copy.commit()
+    app["finish_school_backfill"](copy)
+    assert copy.execute("SELECT SUM(tickets) FROM school_daily").fetchone()[0] == total
+    assert copy.execute("SELECT 1 FROM maintenance_flags WHERE name = 'school_archive_backfill'").fetchone() is None
+    copy.close()
@@ -0,0 +1,62 @@
+import pytest
+
+
+def found(app, text):
+    return sorted(app["search_tickets"](text).get("ticket_number", []))
+
+
+@pytest.fixture(scope="module")
+def tickets(app):
+    def seed(cur):
+        cur.executemany(
+            "INSERT INTO tickets (date, ticket_number, ticket_school, status, comments) VALUES ('2024-06-15', ?, ?, 'Intake', ?)",
+            [("SRCH-125633", "Eastport-South Manor", 'screen "cracked" (AND hinge) -- see photo'),
+             ("SRCH-125634", "Riverhead", "O'Brien's spare * charger"),
+             ("SRCH-777", "Sachem", "keyboard")])
+    app["write_queue"].submit(seed).result(timeout=app["WRITE_TIMEOUT"])
+
+
+@pytest.mark.parametrize("trigram, text, expected", [
+    (True, 'say "hi" to x', '"say" AND """hi"""'),
+    (True, "ab", None),
+    (False, "ab c", '"ab"* AND "c"*'),
+])
+def test_build_fts_query(app, trigram, text, expected):
+    assert app["build_fts_query"](text, trigram) == expected
+
+
+def test_trigram_search_matches_substrings(app, tickets):
+    if not app["FTS_TRIGRAM"]:
+        pytest.skip("this SQLite has no trigram tokenizer")
+    assert found(app, "5633") == ["SRCH-125633"]
+    assert found(app, "south man") == ["SRCH-125633"]
+    assert found(app, "riverhead 12563") == ["SRCH-125634"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('"cracked"', ["SRCH-125633"]),
+    ("(AND hinge)", ["SRCH-125633"]),
+    ("-- see", ["SRCH-125633"]),
+    ("O'Brien's", ["SRCH-125634"]),
+    ("* charger", ["SRCH-125634"]),
+    ("NOT OR NEAR", []),
+])
+def test_search_treats_query_syntax_as_text(app, tickets, text, expected):
+    assert found(app, text) == expected
+
+
+def test_search_follows_updates_and_deletes(app, write, tickets):
+    write(lambda cur: cur.execute(
+        "UPDATE tickets SET comments = 'trackpad replaced' WHERE ticket_number = 'SRCH-777'"))
+    assert found(app, "keyboard") == []
+    assert found(app, "trackpad") == ["SRCH-777"]
+
+    write(lambda cur: cur.execute("DELETE FROM tickets WHERE ticket_number = 'SRCH-777'"))
+    assert found(app, "trackpad") == []
+
+
+def test_short_text_falls_back_to_a_number_prefix(app, tickets):
+    assert {"SRCH-125633", "SRCH-125634"} <= set(found(app, "SR"))
+    assert app["search_tickets"]("SR")["ticket_number"].str.startswith("SR").all()
+    # Below three characters it is a prefix match, not a substring one
+    assert "SRCH-125633" not in found(app, "RC")
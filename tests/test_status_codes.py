@@ -0,0 +1,25 @@
+def test_hand_written_status_gets_its_own_code(app, write):
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, status) VALUES ('2024-06-15', 'STAT-1', 'Lost In Transit')"))
+    code, name, label = app["conn"].execute("""
+        SELECT s.code, s.name, s.label FROM tickets t JOIN statuses s ON s.code = t.status_code
+        WHERE t.ticket_number = 'STAT-1'
+    """).fetchone()
+    assert (name, label) == ("Lost In Transit", "Lost In Transit")
+    assert code not in app["STATUS_CODES"].values()
+
+    # Moving it back to a known status follows the text column
+    write(lambda cur: cur.execute("UPDATE tickets SET status = 'Return' WHERE ticket_number = 'STAT-1'"))
+    assert app["conn"].execute("SELECT status_code FROM tickets WHERE ticket_number = 'STAT-1'").fetchone()[0] == \
+        app["STATUS_CODES"]["Return"]
+
+    codes, categories, positions = app["load_status_dimension"](app["conn"])
+    assert categories[positions[code]] == "Lost In Transit"
+
+
+def test_status_categorical_leaves_unknown_codes_empty(app):
+    codes = app["STATUS_CODES"]
+    labels = app["status_categorical"]([codes["Return"], codes["Delivered"], None, -3, 10_000, "x"])
+    assert list(labels[:2]) == ["Ready to Deliver", "Delivered"]
+    assert labels.isna().tolist() == [False, False, True, True, True, True]
+    assert list(labels.categories) == app["STATUS_CATEGORIES"]
@@ -0,0 +1,196 @@
+import datetime
+import os
+import sqlite3
+import time
+
+import pytest
+
+
+class Job:
+    """Stands in for JobContext when a job function is called directly."""
+    job_id = 0
+
+    def progress(self, fraction, message=""):
+        pass
+
+
+def test_archived_rows_keep_their_sync_origin(app, write):
+    created_at = int(datetime.datetime(2023, 6, 15, 12).timestamp())
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay, created_at) "
+        "VALUES ('2023-06-15', 'SYNC-ARCH', 1, 'Delivered', 5, ?)", (created_at,)))
+    write(lambda cur: app["archive_closed_tickets"](cur, -1), transactional=False)
+
+    archived = sqlite3.connect(os.path.join(app["ARCHIVE_DIR"], "tickets_2023.db"))
+    origin, local_changed_at = archived.execute(
+        "SELECT origin, local_changed_at FROM tickets WHERE ticket_number = 'SYNC-ARCH'").fetchone()
+    assert origin == app["local_station"](app["conn"])
+    assert local_changed_at is not None
+
+
+def test_old_archive_files_gain_the_new_columns(app, tmp_path):
+    path = str(tmp_path / "tickets_1999.db")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE tickets (id INTEGER, ticket_number TEXT, created_at INTEGER, updated_at INTEGER)")
+    old.commit()
+    old.close()
+    conn = app["conn"]
+    with conn:
+        conn.execute("INSERT INTO archive_files (year, path, min_created_at, max_created_at, row_count) "
+                     "VALUES (1999, ?, 0, 0, 0)", (path,))
+        conn.execute("INSERT OR IGNORE INTO maintenance_flags (name) VALUES ('archive_columns_upgrade')")
+    try:
+        app["finish_archive_columns"](conn)
+        columns = {row[1] for row in sqlite3.connect(path).execute("PRAGMA table_info(tickets)")}
+        assert set(app["ARCHIVE_COLUMNS"]) <= columns
+        assert conn.execute("SELECT 1 FROM maintenance_flags WHERE name = 'archive_columns_upgrade'").fetchone() is None
+    finally:
+        with conn:
+            conn.execute("DELETE FROM archive_files WHERE year = 1999")
+
+
+def test_excel_export_restores_sync_versions(app, write):
+    write(lambda cur: cur.execute("DELETE FROM tickets"))
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay, comments, created_at) "
+        "VALUES ('2024-01-02', 'SYNC-XLS', 2, 'Intake', 5, 'from the north site', 1704200000)"))
+    # Make the row look like it was merged from another station
+    def as_remote(cur):
+        cur.execute("INSERT INTO maintenance_flags (name) VALUES ('syncing')")
+        cur.execute("UPDATE tickets SET origin = 'other-station', updated_at = 1704200001 "
+                    "WHERE ticket_number = 'SYNC-XLS'")
+        cur.execute("DELETE FROM maintenance_flags WHERE name = 'syncing'")
+    write(as_remote)
+    columns = ", ".join(app["ARCHIVE_COLUMNS"])
+    sql = f"SELECT {columns} FROM tickets WHERE ticket_number = 'SYNC-XLS'"
+    before = app["conn"].execute(sql).fetchone()
+
+    exported = app["export_excel_job"](Job())
+    with open(exported["path"], "rb") as f:
+        started = int(time.time())
+        assert app["restore_excel_job"](Job(), f.read()) == {"restored": 1}
+
+    after = app["conn"].execute(sql).fetchone()
+    changed_index = app["ARCHIVE_COLUMNS"].index("local_changed_at")
+    assert after[:changed_index] == before[:changed_index]
+    assert after[changed_index] >= started
+
+
+def feed_row(app, ticket_number, updated_at, origin, batch_name="REMOTE"):
+    values = {"ticket_number": ticket_number, "date": "2024-02-01", "time": "10:00:00", "batch_name": batch_name,
+              "num_sub_tickets": 1, "status": "Intake", "pay": 5, "comments": None, "ticket_day": "Thursday",
+              "ticket_school": None, "created_at": 1706780000, "updated_at": updated_at, "origin": origin}
+    return [values[c] for c in app["SYNC_COLUMNS"]]
+
+
+def change_feed(app, rows=(), deletes=(), station="station-remote"):
+    return {"format": app["SYNC_FORMAT"], "station": station, "since": 0, "until": 1706790000,
+            "columns": app["SYNC_COLUMNS"], "rows": [list(r) for r in rows], "deletes": [list(d) for d in deletes]}
+
+
+def local_row(write, ticket_number, updated_at, origin):
+    """A local ticket carrying a chosen sync version."""
+    def insert(cur):
+        cur.execute("INSERT INTO maintenance_flags (name) VALUES ('syncing')")
+        cur.execute("INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, "
+                    "created_at, updated_at, origin) VALUES ('2024-02-01', 'LOCAL', ?, 1, 'Intake', 5, 1706780000, ?, ?)",
+                    (ticket_number, updated_at, origin))
+        cur.execute("DELETE FROM maintenance_flags WHERE name = 'syncing'")
+    write(insert)
+
+
+def batch_of(app, ticket_number):
+    row = app["conn"].execute("SELECT batch_name FROM tickets WHERE ticket_number = ?", (ticket_number,)).fetchone()
+    return row and row[0]
+
+
+def test_change_feed_last_writer_wins(app, write):
+    local_row(write, "FEED-NEW", 1706785000, "station-a")
+    local_row(write, "FEED-OLD", 1706785000, "station-a")
+    local_row(write, "FEED-TIE", 1706785000, "station-m")
+    feed = change_feed(app, rows=[
+        feed_row(app, "FEED-NEW", 1706785001, "station-a"),
+        feed_row(app, "FEED-OLD", 1706784999, "station-z"),
+        # Same second: the larger station id wins, on every station alike
+        feed_row(app, "FEED-TIE", 1706785000, "station-z"),
+        feed_row(app, "FEED-ADD", 1706785000, "station-z"),
+    ])
+
+    counts = write(lambda cur: app["apply_change_feed"](cur, feed))
+
+    assert counts == {"updated": 2, "inserted": 1, "deleted": 0, "skipped": 1}
+    assert [batch_of(app, n) for n in ("FEED-NEW", "FEED-OLD", "FEED-TIE", "FEED-ADD")] == \
+           ["REMOTE", "LOCAL", "REMOTE", "REMOTE"]
+    # The merged version is kept as is, so applying the feed again changes nothing
+    assert app["conn"].execute("SELECT updated_at, origin FROM tickets WHERE ticket_number = 'FEED-TIE'"
+                               ).fetchone() == (1706785000, "station-z")
+    assert write(lambda cur: app["apply_change_feed"](cur, feed))["skipped"] == 4
+
+
+def test_change_feed_deletes_and_tombstones(app, write):
+    local_row(write, "FEED-DEL", 1706785000, "station-a")
+    local_row(write, "FEED-KEEP", 1706785000, "station-a")
+    deletes = [["FEED-DEL", 1706785000, "station-b"], ["FEED-KEEP", 1706784000, "station-b"],
+               ["FEED-GONE", 1706785000, "station-b"]]
+
+    counts = write(lambda cur: app["apply_change_feed"](cur, change_feed(app, deletes=deletes)))
+
+    assert counts == {"updated": 0, "inserted": 0, "deleted": 1, "skipped": 1}
+    assert batch_of(app, "FEED-DEL") is None and batch_of(app, "FEED-KEEP") == "LOCAL"
+    tombstoned = {n for (n,) in app["conn"].execute("SELECT ticket_number FROM ticket_tombstones")}
+    assert {"FEED-DEL", "FEED-GONE"} <= tombstoned and "FEED-KEEP" not in tombstoned
+
+    # A row older than the tombstone stays deleted; a newer one brings the ticket back
+    stale = change_feed(app, rows=[feed_row(app, "FEED-DEL", 1706784999, "station-z")])
+    assert write(lambda cur: app["apply_change_feed"](cur, stale))["skipped"] == 1
+    fresh = change_feed(app, rows=[feed_row(app, "FEED-DEL", 1706785001, "station-c")])
+    assert write(lambda cur: app["apply_change_feed"](cur, fresh))["inserted"] == 1
+    assert batch_of(app, "FEED-DEL") == "REMOTE"
+
+
+def test_change_feed_from_this_station_is_refused(app, write):
+    feed = change_feed(app, station=app["local_station"](app["conn"]))
+    with pytest.raises(ValueError):
+        write(lambda cur: app["apply_change_feed"](cur, feed))
+
+
+def copy_database(app, path):
+    copy = sqlite3.connect(path)
+    source = sqlite3.connect(app["DB_PATH"])
+    source.backup(copy)
+    source.close()
+    return copy
+
+
+def test_copied_database_gets_its_own_station(app, tmp_path):
+    station = app["local_station"](app["conn"])
+    path = str(tmp_path / "copy.db")
+    copy = copy_database(app, path)
+
+    copied = app["claim_station"](copy, path)
+    assert copied != station
+    assert copy.execute("SELECT exported_until FROM sync_station").fetchone()[0] == 0
+    assert app["claim_station"](copy, path) == copied
+    # Writes on the copy are stamped with its own id
+    copy.execute("INSERT INTO tickets (date, ticket_number, status) VALUES ('2024-01-02', 'SYNC-COPY', 'Intake')")
+    assert copy.execute("SELECT origin FROM tickets WHERE ticket_number = 'SYNC-COPY'").fetchone()[0] == copied
+    copy.close()
+
+
+def test_restored_database_keeps_only_its_own_station(app, tmp_path):
+    here_path, there_path = str(tmp_path / "here.db"), str(tmp_path / "there.db")
+    here, there = copy_database(app, here_path), copy_database(app, there_path)
+    here_station, there_station = app["claim_station"](here, here_path), app["claim_station"](there, there_path)
+    backup = sqlite3.connect(str(tmp_path / "here-backup.db"))
+    here.backup(backup)
+
+    # Restoring another station's file over this one, as the Settings page does
+    there.backup(here)
+    restored = app["claim_station"](here, here_path)
+    assert restored not in (here_station, there_station)
+
+    # Restoring this station's own backup keeps the id it was saved with
+    backup.backup(here)
+    assert app["claim_station"](here, here_path) == here_station
+    for connection in (here, there, backup):
+        connection.close()
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+
+def insert(cur, *ticket_numbers):
+    cur.executemany(
+        "INSERT INTO tickets (date, ticket_number, num_sub_tickets, status, pay) VALUES ('2024-06-15', ?, 1, 'Intake', 5)",
+        [(n,) for n in ticket_numbers],
+    )
+
+
+def assert_exact(app, *probes):
+    """numbers() equals the table and contains() agrees with it for every probe."""
+    index = app["ticket_index"]
+    live = sorted(n for (n,) in app["conn"].execute("SELECT ticket_number FROM tickets WHERE ticket_number IS NOT NULL"))
+    assert index.numbers().tolist() == live
+    assert index.contains(list(probes)).tolist() == [p in set(live) for p in probes]
+
+
+def test_insert_delete_and_renumber(app, write):
+    write(lambda cur: insert(cur, "IDX-1", "IDX-2"))
+    assert_exact(app, "IDX-1", "IDX-2", "IDX-3")
+
+    write(lambda cur: cur.execute("DELETE FROM tickets WHERE ticket_number = 'IDX-1'"))
+    assert_exact(app, "IDX-1", "IDX-2")
+
+    write(lambda cur: cur.execute("UPDATE tickets SET ticket_number = 'IDX-3' WHERE ticket_number = 'IDX-2'"))
+    assert_exact(app, "IDX-2", "IDX-3")
+    # Renumbered back within one commit: only the last change counts
+    write(lambda cur: [cur.execute("UPDATE tickets SET ticket_number = ? WHERE ticket_number = ?", pair)
+                       for pair in (("IDX-2", "IDX-3"), ("IDX-3", "IDX-2"))])
+    assert_exact(app, "IDX-2", "IDX-3")
+
+
+def test_rolled_back_mutation_leaves_no_trace(app, write):
+    def insert_then_fail(cur):
+        insert(cur, "IDX-RB")
+        raise ValueError("rejected")
+
+    queue = app["write_queue"]
+    failing = queue.submit(insert_then_fail)
+    kept = queue.submit(lambda cur: insert(cur, "IDX-KEPT"))
+    with pytest.raises(ValueError):
+        failing.result(timeout=app["WRITE_TIMEOUT"])
+    kept.result(timeout=app["WRITE_TIMEOUT"])
+    assert_exact(app, "IDX-RB", "IDX-KEPT")
+
+
+def test_deltas_merge_into_the_sorted_array(app, write):
+    index = app["ticket_index"]
+    index.contains(["warm"])
+    many = [f"IDX-M{i:05d}" for i in range(app["TICKET_INDEX_MERGE_AT"] + 1)]
+    write(lambda cur: insert(cur, *many))
+    assert index.stats()["pending"] == 0
+    assert_exact(app, many[0], many[-1], "IDX-M99999")
+
+    write(lambda cur: cur.execute("DELETE FROM tickets WHERE ticket_number LIKE 'IDX-M%'"))
+    assert_exact(app, many[0], many[-1])
+
+
+def test_commit_from_another_connection(app):
+    other = sqlite3.connect(app["DB_PATH"])
+    insert(other.cursor(), "IDX-EXT")
+    other.commit()
+    other.close()
+    assert_exact(app, "IDX-EXT")
+
+
+def test_failing_listener_drops_derived_state(app, write):
+    queue = app["write_queue"]
+    query_cache = app["query_cache"]
+    app["cached_read_sql"]("SELECT COUNT(*) FROM tickets")
+    assert query_cache.stats()["entries"]
+
+    def broken(cur, tables):
+        if tables is not None:
+            raise RuntimeError("listener bug")
+
+    queue.add_commit_listener(broken)
+    try:
+        failures = queue.metrics()["listener_failures"]
+        assert write(lambda cur: insert(cur, "IDX-LF")) is None
+        assert queue.metrics()["listener_failures"] == failures + 1
+    finally:
+        queue._commit_listeners.remove(broken)
+    assert query_cache.stats()["entries"] == 0
+    assert app["ticket_index"].stats()["indexed"] == 0
+    assert_exact(app, "IDX-LF")
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def seed(cur):
+    cur.executemany(
+        "INSERT INTO tickets (date, batch_name, ticket_number, num_sub_tickets, status, pay, comments) "
+        "VALUES ('2024-06-15', 'LOAD', ?, ?, ?, 5.5, 'long comment that is never shown')",
+        [(f"LOAD-{i}", i % 3 + 1, "Return" if i % 2 else "Intake") for i in range(5)])
+
+
+def test_load_tickets_projects_and_tunes_columns(app, write):
+    write(seed)
+    df = app["load_tickets"](app["TICKET_VIEW_COLUMNS"], "batch_name = ?", ("LOAD",), order_by="ticket_number")
+
+    assert "comments" not in df.columns and "status_code" not in df.columns
+    assert df["num_sub_tickets"].dtype == np.int32
+    assert df["pay"].dtype == np.float32
+    assert str(df["date"].dtype).startswith("datetime64")
+    assert df["batch_name"].dtype == "category" and df["status"].dtype == "category"
+    assert list(df["status"]) == ["Intake", "Ready to Deliver", "Intake", "Ready to Deliver", "Intake"]
+
+
+def test_load_tickets_streams_tuned_chunks(app, write):
+    if not app["conn"].execute("SELECT 1 FROM tickets WHERE batch_name = 'LOAD'").fetchone():
+        write(seed)
+    chunks = list(app["load_tickets"](["ticket_number", "pay"], "batch_name = ?", ("LOAD",), chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert all(chunk["pay"].dtype == np.float32 for chunk in chunks)
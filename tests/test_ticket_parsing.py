@@ -0,0 +1,40 @@
+import pytest
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("125633 - Eastport-South Manor / Acer R752T", ("125633", "Eastport-South Manor")),
+    ("  125634 - Riverhead  ", ("125634", "Riverhead")),
+    ("125635 - Sachem / Dell 3100 / spare", ("125635", "Sachem")),
+    ("125636 -  / Dell 3100", ("125636", None)),
+    ("125637", ("125637", None)),
+    ("125638 trailing words", ("125638", None)),
+    ("   ", None),
+    ("", None),
+])
+def test_parse_ticket_line(app, line, expected):
+    assert app["parse_ticket_line"](line) == expected
+
+
+def test_parse_ticket_entries_mixes_described_lines_and_bare_numbers(app):
+    text = "A1 A2\n125633 - Eastport-South Manor / Acer R752T\n\n  A3  "
+    assert app["parse_ticket_entries"](text) == [
+        ("A1", None), ("A2", None), ("125633", "Eastport-South Manor"), ("A3", None)]
+
+
+def test_ticket_weekday(app):
+    assert app["ticket_weekday"]("2024-06-15") == "Saturday"
+    assert app["ticket_weekday"]("2024-06-17 09:30:00") == "Monday"
+    assert app["ticket_weekday"](None) is None
+
+
+def test_ingest_records_school_and_weekday(app, write):
+    rows = [("PARSE-1", "2024-06-15", "10:00:00", 1718445600, "Riverhead"),
+            ("PARSE-2", "2024-06-15", "10:01:00", 1718445660, "Riverhead")]
+    assert write(lambda cur: app["insert_intake_tickets"](cur, rows, "PARSE", 5.0)) == (2, [])
+
+    assert app["conn"].execute(
+        "SELECT DISTINCT ticket_school, ticket_day FROM tickets WHERE batch_name = 'PARSE'").fetchall() == \
+        [("Riverhead", "Saturday")]
+    assert app["conn"].execute(
+        "SELECT tickets, sub_tickets FROM school_daily WHERE school = 'Riverhead' AND date = '2024-06-15'"
+    ).fetchone() == (2, 2)
@@ -0,0 +1,30 @@
+import datetime
+
+
+def test_ticket_timestamp_reads_the_clock_once(app):
+    date, time_of_day, epoch = app["ticket_timestamp"]()
+    assert datetime.datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S") == f"{date} {time_of_day}"
+
+
+def test_epoch_range_covers_whole_local_days(app):
+    start, end = app["epoch_range"](datetime.date(2024, 3, 9), datetime.date(2024, 3, 10))
+    assert datetime.datetime.fromtimestamp(start) == datetime.datetime(2024, 3, 9)
+    assert datetime.datetime.fromtimestamp(end) == datetime.datetime(2024, 3, 11)
+
+
+def test_rows_written_without_timestamps_get_them(app, write):
+    write(lambda cur: cur.execute(
+        "INSERT INTO tickets (date, time, ticket_number, status) VALUES ('2024-06-15', '10:30:00', 'TS-1', 'Intake')"))
+    created_at = app["conn"].execute("SELECT created_at FROM tickets WHERE ticket_number = 'TS-1'").fetchone()[0]
+    # date/time are local wall-clock values
+    assert created_at == int(datetime.datetime(2024, 6, 15, 10, 30).timestamp())
+
+    write(lambda cur: cur.execute("UPDATE tickets SET updated_at = 0 WHERE ticket_number = 'TS-1'"))
+    write(lambda cur: cur.execute("UPDATE tickets SET comments = 'touched' WHERE ticket_number = 'TS-1'"))
+    assert app["conn"].execute("SELECT updated_at FROM tickets WHERE ticket_number = 'TS-1'").fetchone()[0] > 0
+
+
+def test_latest_tickets_come_off_the_created_at_index(app):
+    plan = " ".join(row[3] for row in app["conn"].execute(
+        "EXPLAIN QUERY PLAN SELECT ticket_number FROM tickets ORDER BY created_at DESC LIMIT 10"))
+    assert "idx_tickets_created_at" in plan and "TEMP B-TREE" not in plan
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def queue(app, tmp_path):
+    path = str(tmp_path / "writes.db")
+    setup = sqlite3.connect(path)
+    setup.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT UNIQUE)")
+    setup.commit()
+    setup.close()
+    return app["WriteQueue"](path), path
+
+
+def rows(path):
+    reader = sqlite3.connect(path)
+    try:
+        return [v for (v,) in reader.execute("SELECT v FROM t ORDER BY id")]
+    finally:
+        reader.close()
+
+
+def hold_writer(write_queue):
+    """Occupy the writer thread until the returned event is set, so later submits pile up."""
+    started, release = threading.Event(), threading.Event()
+
+    def block(cur):
+        started.set()
+        release.wait(10)
+    write_queue.submit(block)
+    assert started.wait(10)
+    return release
+
+
+def test_mutations_queued_behind_a_commit_land_in_one_group(queue):
+    write_queue, path = queue
+    release = hold_writer(write_queue)
+    commits = write_queue.metrics()["commits"]
+
+    futures = [write_queue.execute("INSERT INTO t (v) VALUES (?)", (f"g{i}",)) for i in range(5)]
+    release.set()
+    assert [f.result(timeout=10) for f in futures] == [1] * 5
+
+    # The held mutation's commit, then one commit for all five
+    assert write_queue.metrics()["commits"] == commits + 2
+    assert rows(path) == [f"g{i}" for i in range(5)]
+
+
+def test_a_failing_mutation_only_fails_itself(queue):
+    write_queue, path = queue
+    release = hold_writer(write_queue)
+
+    def half_then_fail(cur):
+        cur.execute("INSERT INTO t (v) VALUES ('partial')")
+        cur.execute("INSERT INTO t (v) VALUES ('a')")  # duplicate of the first mutation
+
+    first = write_queue.execute("INSERT INTO t (v) VALUES ('a')")
+    bad = write_queue.submit(half_then_fail)
+    last = write_queue.execute("INSERT INTO t (v) VALUES ('b')")
+    release.set()
+
+    assert first.result(timeout=10) == 1 and last.result(timeout=10) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result(timeout=10)
+    # Its savepoint is rolled back, so nothing it wrote before failing survives
+    assert rows(path) == ["a", "b"]
+    assert write_queue.metrics()["failures"] == 1
+
+
+def test_listeners_see_written_tables_and_a_failing_one_resets_all(queue):
+    write_queue, _ = queue
+    seen = []
+
+    def broken(cur, tables):
+        if tables is not None:
+            raise RuntimeError("listener bug")
+    write_queue.add_commit_listener(lambda cur, tables: seen.append(tables))
+    write_queue.add_commit_listener(broken)
+
+    write_queue.execute("INSERT INTO t (v) VALUES ('x')").result(timeout=10)
+    assert seen == [{"main.t"}, None]
+    assert write_queue.metrics()["listener_failures"] == 1
+
+    # Standalone mutations can't report their tables
+    seen.clear()
+    write_queue.submit(lambda cur: cur.execute("DELETE FROM t"), transactional=False).result(timeout=10)
+    assert seen == [None]